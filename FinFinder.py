@@ -1,46 +1,36 @@
 import streamlit as st
-import pandas as pd
-import openai
 import os
 
 from dotenv import load_dotenv
 
+from catalog import MERKMALE, Katalog, load_catalog
+from glossary import begriffe_in
+from llm_client import make_client, needs_api_key
+from metrics import InstrumentedClient
+from question_bank import QuestionBank
+from sitzung import Sitzung
+
 load_dotenv()
 
 # Load OpenAI API key on Streamlit Cloud
 api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
+if not api_key and needs_api_key():
     st.error("❌ Kein OpenAI API Key gefunden. Bitte setze die Umgebungsvariable OPENAI_API_KEY.")
     st.stop()
 
-client = openai.Client(api_key=api_key)
-
-# CSV laden
-@st.cache_data
-def load_data():
-    return pd.read_csv("fishdata/finfinderbasedata.csv")
-
-data = load_data()
-
-# Alle Merkmale, die wir abfragen wollen
-MERKMALE = [
-    "Lebensraum",
-    "Futter",
-    "Flossenformen",
-    "Farbe und besondere Farbmerkmale",
-    "Augenfarbe",
-    "Schuppen",
-    "Form"
-]
-
-# Fachbegriffe einfach erklärt (kann erweitert werden)
-ERKLAERUNGEN = {
-    "bauchständig": "Die Bauchflossen sitzen unter dem Bauch.",
-    "torpedoförmig": "Der Körper ist lang und spindelförmig wie ein Torpedo.",
-    "oberständig": "Das Maul zeigt schräg nach oben.",
-    "unterständig": "Das Maul zeigt nach unten.",
-    "endständig": "Das Maul ist vorne am Kopf und zeigt gerade nach vorne."
-}
+client = InstrumentedClient(make_client(api_key=api_key), app="FinFinder")
+
+# Katalog samt Bitset-Index einmal pro Prozess laden, alle Sitzungen lesen nur daraus
+@st.cache_resource
+def load_katalog():
+    return Katalog(load_catalog())
+
+katalog = load_katalog()
+
+# Fragenbank einmal pro Prozess laden
+@st.cache_resource
+def load_question_bank():
+    return QuestionBank()
 
 # GPT-4: Frage generieren lassen
 def frage_mit_llm(merkmal, werte):
@@ -63,11 +53,31 @@ def frage_mit_llm(merkmal, werte):
     )
     return response.choices[0].message.content.strip()
 
-# Session State initialisieren
-if "filtered_data" not in st.session_state:
-    st.session_state.filtered_data = data.copy()
-if "step" not in st.session_state:
-    st.session_state.step = 0
+# GPT-4: Hilfe nur, wenn für die Optionsmenge nichts gespeichert ist
+def hilfe_mit_llm(merkmal, werte):
+    hilfe_prompt = f"""
+    Der Nutzer ist sich beim Merkmal '{merkmal}' unsicher. Gib eine einfache, interaktive Erklärung,
+    die hilft, sich zu entscheiden. Nutze Beispiele, Bilder (symbolisch), Vergleiche oder Fragen.
+    Mache es so, dass der Nutzer danach nochmal eine fundierte Wahl treffen kann. 
+    Optionen: {werte}
+    """
+    response = client.chat.completions.create(
+        model="gpt-4",
+        messages=[
+            {"role": "system",
+             "content": "Du bist ein geduldiger Fisch-Experte, der Anfängern hilft, "
+                        "Fischmerkmale zu verstehen um eine Einordnung des Merkmals passend zu dem "
+                        "Fisch vorzunehmen. Halt dich hierbei kurz und beachte immer, dass es sich um "
+                        "Fische und Gewässer handelt, die in Deutschland auch vorkommen."},
+            {"role": "user", "content": hilfe_prompt}
+        ]
+    )
+    return response.choices[0].message.content.strip()
+
+# Session State initialisieren: nur Kandidaten-Bitset, Antworten und Schritt
+if "sitzung" not in st.session_state:
+    st.session_state.sitzung = Sitzung.neu(katalog)
+sitzung = st.session_state.sitzung
 
 # Titel
 st.title("🐟 FinFinder – Finde deinen Fisch")
@@ -78,37 +88,35 @@ Beantworte Fragen zu Merkmalen deines beobachteten Fisches, und der Agent grenzt
 
 # Neue Bestimmung starten
 if st.button("🔄 Neue Bestimmung starten"):
-    st.session_state.filtered_data = data.copy()
-    st.session_state.step = 0
+    st.session_state.sitzung = Sitzung.neu(katalog)
     st.rerun()
 
 # Wenn nur noch ein Fisch übrig ist
-if len(st.session_state.filtered_data) == 1:
+if sitzung.anzahl() == 1:
     st.success("✅ Ich bin mir sehr sicher: Es handelt sich um diesen Fisch:")
-    st.write(st.session_state.filtered_data.iloc[0])
+    st.write(katalog.treffer(sitzung.kandidaten).iloc[0])
     st.stop()
 
 # Wenn kein Fisch übrig ist
-if len(st.session_state.filtered_data) == 0:
+if sitzung.anzahl() == 0:
     st.error("❌ Leider passt kein Fisch mehr zu deinen Angaben.")
     st.stop()
 
 # Nächste Frage stellen
-if st.session_state.step < len(MERKMALE):
-    merkmal = MERKMALE[st.session_state.step]
-    options = st.session_state.filtered_data[merkmal].dropna().unique().tolist()
+if sitzung.step < len(MERKMALE):
+    merkmal = MERKMALE[sitzung.step]
+    options = katalog.optionen(merkmal, sitzung.kandidaten)
     options.append("Ich bin nicht sicher")
 
-    # GPT-4 formuliert die Frage
-    frage = frage_mit_llm(merkmal, options)
+    # Frage aus der Fragenbank, GPT-4 nur für unbekannte Optionsmengen
+    frage = load_question_bank().frage(merkmal, options, frage_mit_llm)
 
-    st.subheader(f"Frage {st.session_state.step + 1}")
+    st.subheader(f"Frage {sitzung.step + 1}")
     st.markdown(frage)
 
     with st.expander("Was bedeutet das?"):
-        for begriff, erklaerung in ERKLAERUNGEN.items():
-            if begriff.lower() in merkmal.lower():
-                st.markdown(f"**{begriff}**: {erklaerung}")
+        for begriff, erklaerung in begriffe_in(options[:-1]):
+            st.markdown(f"**{begriff}**: {erklaerung}")
 
     antwort = st.radio("Wähle die passende Option:", options)
 
@@ -116,36 +124,16 @@ if st.session_state.step < len(MERKMALE):
         if antwort == "Ich bin nicht sicher":
             st.warning("Kein Problem – ich helfe dir weiter, das Merkmal besser zu verstehen!")
 
-            hilfe_prompt = f"""
-            Der Nutzer ist sich beim Merkmal '{merkmal}' unsicher. Gib eine einfache, interaktive Erklärung,
-            die hilft, sich zu entscheiden. Nutze Beispiele, Bilder (symbolisch), Vergleiche oder Fragen.
-            Mache es so, dass der Nutzer danach nochmal eine fundierte Wahl treffen kann. 
-            Optionen: {options[:-1]}
-            """
-
-            hilfe_response = client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system",
-                     "content": "Du bist ein geduldiger Fisch-Experte, der Anfängern hilft, "
-                                "Fischmerkmale zu verstehen um eine Einordnung des Merkmals passend zu dem "
-                                "Fisch vorzunehmen. Halt dich hierbei kurz und beachte immer, dass es sich um "
-                                "Fische und Gewässer handelt, die in Deutschland auch vorkommen."},
-                    {"role": "user", "content": hilfe_prompt}
-                ]
-            )
+            hilfe = load_question_bank().hilfe(merkmal, options[:-1], hilfe_mit_llm)
 
             st.markdown("💬 **Interaktive Hilfe:**")
-            st.info(hilfe_response.choices[0].message.content.strip())
+            st.info(hilfe)
 
             st.stop()  # Nutzer soll nach Hilfe nochmal bewusst wählen
         else:
-            st.session_state.filtered_data = st.session_state.filtered_data[
-                st.session_state.filtered_data[merkmal] == antwort
-                ]
-            st.session_state.step += 1
+            sitzung.beantworten(katalog, merkmal, antwort)
             st.rerun()
 
 else:
     st.info("🔍 Keine weiteren Merkmale mehr – hier ist die eingegrenzte Auswahl:")
-    st.dataframe(st.session_state.filtered_data)
+    st.dataframe(katalog.treffer(sitzung.kandidaten))
@@ -1,43 +1,34 @@
 import streamlit as st
-import pandas as pd
-import openai
 import os
 from dotenv import load_dotenv
+from catalog import MERKMALE, Katalog, load_catalog
+from glossary import begriffe_in
+from llm_client import make_client, needs_api_key
+from metrics import InstrumentedClient
+from question_planner import ersparnis, naechstes_merkmal
+from question_bank import QuestionBank
+from sitzung import Sitzung
 
 # 🔐 Load API Key
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
+if not api_key and needs_api_key():
     st.error("❌ Kein OpenAI API Key gefunden. Bitte setze die Umgebungsvariable OPENAI_API_KEY.")
     st.stop()
 
-client = openai.Client(api_key=api_key)
-
-# 📦 Daten laden
-@st.cache_data
-def load_data():
-    return pd.read_csv("fishdata/finfinderbasedata.csv")
-
-data = load_data()
-
-# 🎯 Merkmale definieren
-MERKMALE = [
-    "Lebensraum",
-    "Futter",
-    "Flossenformen",
-    "Farbe und besondere Farbmerkmale",
-    "Augenfarbe",
-    "Schuppen",
-    "Form"
-]
-
-ERKLAERUNGEN = {
-    "bauchständig": "Die Bauchflossen sitzen unter dem Bauch.",
-    "torpedoförmig": "Der Körper ist lang und spindelförmig wie ein Torpedo.",
-    "oberständig": "Das Maul zeigt schräg nach oben.",
-    "unterständig": "Das Maul zeigt nach unten.",
-    "endständig": "Das Maul ist vorne am Kopf und zeigt gerade nach vorne."
-}
+client = InstrumentedClient(make_client(api_key=api_key), app="FinFinderV2")
+
+# 📦 Katalog samt Bitset-Index einmal pro Prozess laden, alle Sitzungen lesen nur daraus
+@st.cache_resource
+def load_katalog():
+    return Katalog(load_catalog())
+
+katalog = load_katalog()
+
+# 📚 Fragenbank einmal pro Prozess laden
+@st.cache_resource
+def load_question_bank():
+    return QuestionBank()
 
 # 🤖 GPT-Frage generieren
 def frage_mit_llm(merkmal, werte):
@@ -57,13 +48,35 @@ def frage_mit_llm(merkmal, werte):
     )
     return response.choices[0].message.content.strip()
 
-# 🧠 Session State initialisieren
-if "filtered_data" not in st.session_state:
-    st.session_state.filtered_data = data.copy()
-if "step" not in st.session_state:
-    st.session_state.step = 0
-if "unsicher" not in st.session_state:
-    st.session_state.unsicher = False
+# 💡 Fallback, wenn für die Optionsmenge kein Hilfetext gespeichert ist
+def hilfe_mit_llm(merkmal, werte):
+    hilfe_prompt = f"""
+    Ein Nutzer ist sich beim Merkmal '{merkmal}' unsicher. Gib eine einfache, interaktive Erklärung,
+    damit er sich anschließend besser entscheiden kann. Nutze Vergleiche, Beispiele und einfache Sprache.
+    Mögliche Optionen: {werte}
+    """
+    response = client.chat.completions.create(
+        model="gpt-4",
+        messages=[
+            {"role": "system",
+             "content": "Du bist ein geduldiger Fisch-Experte, der Anfängern hilft, "
+                            "Fischmerkmale zu verstehen um eine Einordnung des Merkmals passend zu dem "
+                            "Fisch vorzunehmen. Halt dich hierbei kurz und beachte immer, dass es sich um "
+                            "Fische und Gewässer handelt, die in Deutschland auch vorkommen."},
+            {"role": "user", "content": hilfe_prompt}
+        ]
+    )
+    return response.choices[0].message.content.strip()
+
+# 🧮 Erwartete Anzahl Fragen mit fester und adaptiver Reihenfolge
+@st.cache_resource
+def erwartete_fragen():
+    return ersparnis(load_katalog().index)
+
+# 🧠 Session State initialisieren: nur Kandidaten-Bitset, Antworten und Schritt
+if "sitzung" not in st.session_state:
+    st.session_state.sitzung = Sitzung.neu(katalog)
+sitzung = st.session_state.sitzung
 
 # 🐟 Titel
 st.title("🐟 FinFinder – Finde deinen Fisch")
@@ -71,87 +84,66 @@ st.markdown("Diese App hilft dir, Fische der Nord- und Ostsee zu bestimmen. Bean
 
 # 🔁 Reset-Button
 if st.button("🔄 Neue Bestimmung starten"):
-    st.session_state.filtered_data = data.copy()
-    st.session_state.step = 0
-    st.session_state.unsicher = False
+    st.session_state.sitzung = Sitzung.neu(katalog)
     st.rerun()
 
 # ✅ Endzustände
-if len(st.session_state.filtered_data) == 1:
+if sitzung.anzahl() == 1:
     st.success("✅ Ich bin mir sehr sicher: Es handelt sich um diesen Fisch:")
-    st.write(st.session_state.filtered_data.iloc[0])
+    st.write(katalog.treffer(sitzung.kandidaten).iloc[0])
     st.stop()
 
-if len(st.session_state.filtered_data) == 0:
+if sitzung.anzahl() == 0:
     st.error("❌ Leider passt kein Fisch mehr zu deinen Angaben.")
     st.stop()
 
-# 🧭 Fragefluss
-if st.session_state.step < len(MERKMALE):
-    merkmal = MERKMALE[st.session_state.step]
-    options = st.session_state.filtered_data[merkmal].dropna().unique().tolist()
+# 🧭 Fragefluss: als Nächstes das Merkmal, das die verbleibenden Fische am besten aufteilt
+offen = [m for m in MERKMALE if m not in sitzung.antworten]
+merkmal = naechstes_merkmal(katalog.index, sitzung.kandidaten, offen)
+
+if merkmal is not None:
+    options = katalog.optionen(merkmal, sitzung.kandidaten)
     if "Ich bin nicht sicher" not in options:
         options.append("Ich bin nicht sicher")
 
-    frage = frage_mit_llm(merkmal, options[:-1])  # ohne "nicht sicher" für die Formulierung
+    # ohne "nicht sicher" für die Formulierung, GPT-4 nur für unbekannte Optionsmengen
+    frage = load_question_bank().frage(merkmal, options[:-1], frage_mit_llm)
 
-    st.markdown(f"### ❓ Frage {st.session_state.step + 1}")
+    st.markdown(f"### ❓ Frage {sitzung.step + 1}")
     st.markdown(f"**{frage}**")
+    if sitzung.step == 0:
+        fest, adaptiv, _ = erwartete_fragen()
+        st.caption(f"🧮 Voraussichtlich {adaptiv:.1f} statt {fest:.1f} Fragen bis zum Ergebnis")
 
     with st.expander("ℹ️ Was bedeutet das?", expanded=False):
-        for begriff, erklaerung in ERKLAERUNGEN.items():
-            if begriff.lower() in merkmal.lower():
-                st.markdown(f"**{begriff}**: {erklaerung}")
+        for begriff, erklaerung in begriffe_in(options[:-1]):
+            st.markdown(f"**{begriff}**: {erklaerung}")
 
     # 👇 Nur wenn nicht in Unsicherheitsmodus
-    if not st.session_state.unsicher:
-        antwort = st.radio("Wähle die passende Option:", options, key=f"wahl_{merkmal}_{st.session_state.step}")
-        if st.button("✅ Antwort bestätigen", key=f"confirm_{merkmal}_{st.session_state.step}"):
+    if not sitzung.unsicher:
+        antwort = st.radio("Wähle die passende Option:", options, key=f"wahl_{merkmal}_{sitzung.step}")
+        if st.button("✅ Antwort bestätigen", key=f"confirm_{merkmal}_{sitzung.step}"):
             if antwort == "Ich bin nicht sicher":
-                st.session_state.unsicher = True
+                sitzung.unsicher = True
                 st.rerun()
             else:
-                st.session_state.filtered_data = st.session_state.filtered_data[
-                    st.session_state.filtered_data[merkmal] == antwort
-                ]
-                st.session_state.step += 1
-                st.session_state.unsicher = False
+                sitzung.beantworten(katalog, merkmal, antwort)
                 st.rerun()
 
     # 💬 Hilfe anzeigen + erneute Auswahl
-    if st.session_state.unsicher:
+    if sitzung.unsicher:
         st.warning("🤔 Kein Problem – ich helfe dir weiter, das Merkmal besser zu verstehen!")
 
-        hilfe_prompt = f"""
-        Ein Nutzer ist sich beim Merkmal '{merkmal}' unsicher. Gib eine einfache, interaktive Erklärung,
-        damit er sich anschließend besser entscheiden kann. Nutze Vergleiche, Beispiele und einfache Sprache.
-        Mögliche Optionen: {options[:-1]}
-        """
-
-        hilfe_response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system",
-                 "content": "Du bist ein geduldiger Fisch-Experte, der Anfängern hilft, "
-                                "Fischmerkmale zu verstehen um eine Einordnung des Merkmals passend zu dem "
-                                "Fisch vorzunehmen. Halt dich hierbei kurz und beachte immer, dass es sich um "
-                                "Fische und Gewässer handelt, die in Deutschland auch vorkommen."},
-                {"role": "user", "content": hilfe_prompt}
-            ]
-        )
+        hilfe = load_question_bank().hilfe(merkmal, options[:-1], hilfe_mit_llm)
 
         st.markdown("### 💡 Interaktive Hilfe:")
-        st.info(hilfe_response.choices[0].message.content.strip())
+        st.info(hilfe)
 
         st.markdown("### ✅ Und jetzt: Wähle nochmal")
-        neue_antwort = st.radio("Was trifft am besten zu?", options[:-1], key=f"erneut_{merkmal}_{st.session_state.step}")
-        if st.button("➡️ Bestätigen und fortfahren", key=f"erneut_confirm_{merkmal}_{st.session_state.step}"):
-            st.session_state.filtered_data = st.session_state.filtered_data[
-                st.session_state.filtered_data[merkmal] == neue_antwort
-            ]
-            st.session_state.step += 1
-            st.session_state.unsicher = False
+        neue_antwort = st.radio("Was trifft am besten zu?", options[:-1], key=f"erneut_{merkmal}_{sitzung.step}")
+        if st.button("➡️ Bestätigen und fortfahren", key=f"erneut_confirm_{merkmal}_{sitzung.step}"):
+            sitzung.beantworten(katalog, merkmal, neue_antwort)
             st.rerun()
 else:
     st.info("🔍 Keine weiteren Merkmale mehr – hier ist die eingegrenzte Auswahl:")
-    st.dataframe(st.session_state.filtered_data)
+    st.dataframe(katalog.treffer(sitzung.kandidaten))
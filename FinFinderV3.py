@@ -1,185 +1,250 @@
 import streamlit as st
-import pandas as pd
-import openai
 import os
+import uuid
 from dotenv import load_dotenv
-from sklearn.metrics.pairwise import cosine_similarity
 
-# Setup
+# .env vor den eigenen Modulen laden, damit auch Einstellungen gelten, die beim Import gelesen werden
 load_dotenv()
+import startup
+from catalog import MERKMALE
+from embedding_ingest import EMBEDDING_MODEL
+from engine import beschreibung as beschreibung_aus
+from llm_client import needs_api_key
+from metrics import METRICS, InstrumentedClient
+from sitzung import Sitzung
+
+# Setup
 api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
+if not api_key and needs_api_key():
     st.error("❌ Kein OpenAI API Key gefunden.")
     st.stop()
 
-client = openai.Client(api_key=api_key)
-
-MERKMALE = [
-    "Lebensraum",
-    "Futter",
-    "Flossenformen",
-    "Farbe und besondere Farbmerkmale",
-    "Augenfarbe",
-    "Schuppen",
-    "Form"
-]
-
-ERKLAERUNGEN = {
-    "bauchständig": "Die Bauchflossen sitzen unter dem Bauch.",
-    "torpedoförmig": "Der Körper ist lang und spindelförmig wie ein Torpedo.",
-    "oberständig": "Das Maul zeigt schräg nach oben.",
-    "unterständig": "Das Maul zeigt nach unten.",
-    "endständig": "Das Maul ist vorne am Kopf und zeigt gerade nach vorne."
-}
-
-@st.cache_data
-def load_data():
-    df = pd.read_csv("fishdata/finfinderbasedata.csv")
-    df["Beschreibung"] = df.apply(lambda row: f"""
-        Lebensraum: {row['Lebensraum']}, 
-        Futter: {row['Futter']}, 
-        Flossenform: {row['Flossenformen']}, 
-        Farbe: {row['Farbe und besondere Farbmerkmale']}, 
-        Augenfarbe: {row['Augenfarbe']}, 
-        Schuppen: {row['Schuppen']}, 
-        Form: {row['Form']}
-    """, axis=1)
-    return df
-
-@st.cache_data
-def generate_embeddings(df):
-    embeddings = []
-    for beschreibung in df["Beschreibung"]:
-        response = client.embeddings.create(
-            input=beschreibung,
-            model="text-embedding-3-small"
-        )
-        embeddings.append(response.data[0].embedding)
-    df["embedding"] = embeddings
-    return df
-
-# Daten vorbereiten
-data = generate_embeddings(load_data())
-
-# App-State
-if "step" not in st.session_state:
-    st.session_state.step = 0
-if "antworten" not in st.session_state:
-    st.session_state.antworten = {}
-if "unsicher" not in st.session_state:
-    st.session_state.unsicher = False
-
-# UI
-st.title("🐟 FinFinder – V3")
+# Debug-Panel mit den Metriken dieser Sitzung, mit FINFINDER_DEBUG=1 von Anfang an offen
+DEBUG = os.getenv("FINFINDER_DEBUG") == "1"
 
-st.markdown("Beantworte ein paar Fragen zum Fisch. Wenn du dir unsicher bist, hilft dir GPT weiter. Am Ende findest du deinen Fische.")
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex[:8]
+session_id = st.session_state.session_id
 
-# Reset
-if st.button("🔄 Neue Bestimmung starten"):
-    st.session_state.step = 0
-    st.session_state.antworten = {}
-    st.session_state.unsicher = False
-    st.rerun()
+# Jeder LLM- und Embedding-Aufruf wird mit Dauer, Modell und Tokens erfasst
+client = InstrumentedClient(startup.get_client(api_key), session=session_id)
 
-# Hauptlogik: geführte Auswahl
-if st.session_state.step < len(MERKMALE):
-    merkmal = MERKMALE[st.session_state.step]
-    options = data[merkmal].dropna().unique().tolist()
-    if "Ich bin nicht sicher" not in options:
-        options.append("Ich bin nicht sicher")
+# Fertige Bestimmungen für alle Sitzungen des Prozesses
+@st.cache_resource
+def load_result_cache():
+    from result_cache import ResultCache
+    return ResultCache()
 
-    st.markdown(f"### ❓ {merkmal}")
+# Fallback, wenn die Optionsmenge nicht in der Fragenbank steht
+def frage_mit_llm(merkmal, werte):
     frage_prompt = f"""
     Stelle eine einfache Frage an einen Laien zur Erkennung des Merkmals '{merkmal}' 
-    basierend auf den möglichen Optionen: {options[:-1]}.
+    basierend auf den möglichen Optionen: {werte}.
     Füge am Ende immer die Option 'Ich bin nicht sicher' hinzu.
     """
-    frage = client.chat.completions.create(
+    return client.chat.completions.create(
         model="gpt-4",
         messages=[
             {"role": "system", "content": "Du bist ein hilfsbereiter Fischbestimmungs-Assistent."},
             {"role": "user", "content": frage_prompt}
         ]
     ).choices[0].message.content.strip()
+
+# Fallback, wenn für die Optionsmenge kein Hilfetext gespeichert ist
+def hilfe_mit_llm(merkmal, werte):
+    hilfe_prompt = f"""
+    Ein Nutzer ist unsicher beim Fisch-Merkmal '{merkmal}'.
+    Erkläre einfach mit Beispielen und Vergleichen die Unterschiede der Optionen: {werte}.
+    Antworte so, dass er danach entscheiden kann.
+    """
+    return client.chat.completions.create(
+        model="gpt-4",
+        messages=[
+            {"role": "system",
+             "content": "Du bist ein geduldiger Fisch-Experte, der Anfängern hilft, "
+                            "Fischmerkmale zu verstehen um eine Einordnung des Merkmals passend zu dem "
+                            "Fisch vorzunehmen. Halt dich hierbei kurz und beachte immer, dass es sich um "
+                            "Fische und Gewässer handelt, die in Deutschland auch vorkommen."},
+            {"role": "user", "content": hilfe_prompt}
+        ]
+    ).choices[0].message.content.strip()
+
+# UI: Titel zuerst, damit die Seite schon steht, während ein kalter Prozess noch lädt
+st.title("🐟 FinFinder – V3")
+
+st.markdown("Beantworte ein paar Fragen zum Fisch. Wenn du dir unsicher bist, hilft dir GPT weiter. Am Ende findest du deinen Fische.")
+
+# Daten vorbereiten: Katalog und Embeddings einmal pro Prozess aus dem kompilierten Katalog,
+# bei "python startup.py serve" schon beim Serverstart geladen
+with st.spinner("Lade Fischkatalog..."):
+    engine = startup.get_engine(client)
+katalog = engine.katalog
+
+# App-State: nur Antworten und Schritt, der Katalog wird nie kopiert oder verändert
+if "sitzung" not in st.session_state:
+    st.session_state.sitzung = Sitzung.neu(katalog)
+sitzung = st.session_state.sitzung
+
+# Reset
+if st.button("🔄 Neue Bestimmung starten"):
+    st.session_state.sitzung = Sitzung.neu(katalog)
+    # Sonst zeigt eine neue Bestimmung mit denselben Antworten das alte Ergebnis ohne Cache-Abfrage
+    st.session_state.pop("ergebnis_angezeigt", None)
+    st.rerun()
+
+# Zuerst die Größe: schließt unpassende Fische aus, bevor Embeddings oder GPT gebraucht werden
+if katalog.groessen is not None and not sitzung.groesse_gefragt:
+    st.markdown("### 📏 Wie groß ist der Fisch ungefähr?")
+    groesse = st.number_input("Länge in cm", min_value=1, max_value=500, value=30, step=1)
+    weiter, unbekannt = st.columns(2)
+    if weiter.button("➡️ Weiter", key="weiter_groesse"):
+        sitzung.groesse_angeben(katalog, float(groesse))
+        st.rerun()
+    if unbekannt.button("🤷 Weiß ich nicht", key="groesse_unbekannt"):
+        sitzung.groesse_angeben(katalog, None)
+        st.rerun()
+
+# Hauptlogik: geführte Auswahl
+elif sitzung.step < len(MERKMALE):
+    merkmal = MERKMALE[sitzung.step]
+    options = katalog.optionen(merkmal)
+    if "Ich bin nicht sicher" not in options:
+        options.append("Ich bin nicht sicher")
+
+    st.markdown(f"### ❓ {merkmal}")
+    with METRICS.stage("frage", merkmal=merkmal, session=session_id):
+        frage = startup.get_question_bank().frage(merkmal, options, frage_mit_llm)
     st.markdown(frage)
 
     antwort = st.radio("Wähle eine Option:", options, key=f"antwort_{merkmal}")
 
     if st.button("➡️ Weiter", key=f"weiter_{merkmal}"):
         if antwort == "Ich bin nicht sicher":
-            st.session_state.unsicher = True
+            sitzung.unsicher = True
             st.rerun()
         else:
-            st.session_state.antworten[merkmal] = antwort
-            st.session_state.step += 1
-            st.session_state.unsicher = False
+            sitzung.beantworten(katalog, merkmal, antwort, filtern=False)
             st.rerun()
 
-    if st.session_state.unsicher:
-        hilfe_prompt = f"""
-        Ein Nutzer ist unsicher beim Fisch-Merkmal '{merkmal}'.
-        Erkläre einfach mit Beispielen und Vergleichen die Unterschiede der Optionen: {options[:-1]}.
-        Antworte so, dass er danach entscheiden kann.
-        """
-        hilfe = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system",
-                 "content": "Du bist ein geduldiger Fisch-Experte, der Anfängern hilft, "
-                                "Fischmerkmale zu verstehen um eine Einordnung des Merkmals passend zu dem "
-                                "Fisch vorzunehmen. Halt dich hierbei kurz und beachte immer, dass es sich um "
-                                "Fische und Gewässer handelt, die in Deutschland auch vorkommen."},
-                {"role": "user", "content": hilfe_prompt}
-            ]
-        ).choices[0].message.content.strip()
-
+    if sitzung.unsicher:
+        with METRICS.stage("hilfe", merkmal=merkmal, session=session_id):
+            hilfe = startup.get_question_bank().hilfe(merkmal, options[:-1], hilfe_mit_llm)
         st.info(hilfe)
+        from glossary import begriffe_in
+        for begriff, erklaerung in begriffe_in(options[:-1]):
+            st.markdown(f"**{begriff}**: {erklaerung}")
         neue_antwort = st.radio("Wähle jetzt erneut:", options[:-1], key=f"erneut_{merkmal}")
         if st.button("✅ Antwort bestätigen", key=f"confirm_{merkmal}"):
-            st.session_state.antworten[merkmal] = neue_antwort
-            st.session_state.step += 1
-            st.session_state.unsicher = False
+            sitzung.beantworten(katalog, merkmal, neue_antwort, filtern=False)
             st.rerun()
 
 # Wenn fertig: Embedding-Vergleich starten
-elif st.session_state.step >= len(MERKMALE):
+elif sitzung.step >= len(MERKMALE):
     st.success("✅ Danke! Ich analysiere deine Angaben und finde die ähnlichsten Fische...")
+    from explanations import stream_parallel
+    from result_cache import Ergebnis, answer_key
 
     # Erstelle Beschreibung aus Antworten
-    beschreibung = ", ".join([f"{merkmal}: {antwort}" for merkmal, antwort in st.session_state.antworten.items()])
-
-    # User-Embedding
-    response = client.embeddings.create(
-        input=beschreibung,
-        model="text-embedding-3-small"
-    )
-    user_embedding = response.data[0].embedding
-
-    # Ähnlichkeit berechnen
-    data["similarity"] = data["embedding"].apply(
-        lambda x: cosine_similarity([x], [user_embedding])[0][0]
-    )
-
-    top_matches = data.sort_values("similarity", ascending=False).head(3)
+    beschreibung = beschreibung_aus(sitzung.antworten, sitzung.groesse)
+
+    # Nach der Größe vorgefilterte Kandidaten, nur diese werden bewertet
+    kandidaten_ids = None
+    if sitzung.kandidaten != katalog.index.alle:
+        kandidaten_ids = katalog.index.ids(sitzung.kandidaten)
+        if len(kandidaten_ids) == 0:
+            st.warning("⚠️ Kein Fisch passt zur angegebenen Größe – ich vergleiche mit allen Fischen.")
+            kandidaten_ids = None
+
+    # User-Embedding, nur wenn die gleichen Antworten noch nicht im Ergebnis-Cache stehen
+    def user_embedding_erstellen():
+        response = client.embeddings.create(
+            input=beschreibung,
+            model=EMBEDDING_MODEL
+        )
+        return response.data[0].embedding
+
+    result_cache = load_result_cache()
+    cache_key = answer_key(sitzung.antworten, sitzung.groesse, katalog.version)
+    gruppe = (katalog.version, sitzung.kandidaten)
+    top_indices = top_scores = None
+    # Pro Bestimmung wird nur einmal nachgeschlagen, ein Rerun der Ergebnisseite zeigt das Ergebnis der Sitzung
+    angezeigt = st.session_state.get("ergebnis_angezeigt")
+    if angezeigt is not None and angezeigt[0] == cache_key:
+        ergebnis = angezeigt[1]
+    else:
+        with METRICS.stage("ergebnis.lookup", session=session_id):
+            ergebnis, user_embedding, art = result_cache.lookup(cache_key, user_embedding_erstellen, gruppe)
+        if art == "aehnlich":
+            # Das fast gleiche Ergebnis stammt von anderen Antworten: mit den eigenen Antworten neu ranken und
+            # die Erklärungen nur bei denselben Treffern übernehmen, dann auch unter dem eigenen Schlüssel ablegen
+            with METRICS.stage("similarity", session=session_id):
+                top_indices, top_scores = engine.rank(sitzung.antworten, user_embedding, 3, ids=kandidaten_ids)
+            ergebnis = result_cache.uebernehmen(ergebnis, top_indices, top_scores, user_embedding)
+            if ergebnis is not None:
+                result_cache.put(cache_key, ergebnis)
+        if ergebnis is not None:
+            st.session_state.ergebnis_angezeigt = (cache_key, ergebnis)
+
+    if ergebnis is not None:
+        top_indices, top_scores = ergebnis.ids, ergebnis.scores
+    elif top_indices is None:
+        # Ähnlichkeit berechnen: Embedding-Ähnlichkeit gemischt mit dem strukturellen Vergleich der Antworten,
+        # beides vektorisiert, nur die besten 3 werden sortiert
+        with METRICS.stage("similarity", session=session_id):
+            top_indices, top_scores = engine.rank(sitzung.antworten, user_embedding, 3, ids=kandidaten_ids)
+    top_matches = katalog.zeilen(top_indices)
 
     st.markdown("### 🎯 Am besten passende Fische:")
 
-    for _, row in top_matches.iterrows():
+    # Erst alle Treffer anzeigen, dann die Erklärungen gleichzeitig anfragen und in ihre Platzhalter streamen
+    platzhalter = []
+    erklär_messages = []
+    for (_, row), similarity in zip(top_matches.iterrows(), top_scores):
         st.markdown(f"#### 🐟 {row.get('Name', 'Unbekannter Fisch')}")
         st.markdown(f"**Beschreibung:** {row['Beschreibung']}")
-        st.markdown(f"**Ähnlichkeit:** {row['similarity']:.2f}")
+        st.markdown(f"**Ähnlichkeit:** {similarity:.2f}")
+        platzhalter.append(st.empty())
+        if ergebnis is not None:
+            continue
 
         erklär_prompt = f"""
         Ein Nutzer hat diese Beschreibung eines Fisches gegeben: {beschreibung}
         Ein möglicher Treffer ist: {row['Beschreibung']}
         Warum passt dieser Fisch gut zur Nutzerbeschreibung?
         """
-        erklärung = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Du bist ein Fisch-Experte für Anfänger. Erkläre kurz und verständlich."},
-                {"role": "user", "content": erklär_prompt}
-            ]
-        ).choices[0].message.content.strip()
-
-        st.info(erklärung)
+        erklär_messages.append([
+            {"role": "system", "content": "Du bist ein Fisch-Experte für Anfänger. Erkläre kurz und verständlich."},
+            {"role": "user", "content": erklär_prompt}
+        ])
+
+    if ergebnis is not None:
+        for i, erklärung in enumerate(ergebnis.erklaerungen):
+            platzhalter[i].info(erklärung)
+    else:
+        erklaerungen = [""] * len(erklär_messages)
+        with METRICS.stage("explanations", session=session_id):
+            for i, erklärung in stream_parallel(client, erklär_messages, model="gpt-4"):
+                platzhalter[i].info(erklärung)
+                erklaerungen[i] = erklärung
+        ergebnis = Ergebnis(
+            ids=tuple(int(i) for i in top_indices),
+            scores=tuple(float(score) for score in top_scores),
+            erklaerungen=tuple(erklaerungen),
+            embedding=user_embedding,
+            gruppe=gruppe,
+        )
+        result_cache.put(cache_key, ergebnis)
+        st.session_state.ergebnis_angezeigt = (cache_key, ergebnis)
+
+    stats = result_cache.stats()
+    st.caption(f"Ergebnis-Cache: {stats['eintraege']} Einträge, Trefferquote {stats['hit_rate']:.0%}")
+
+# Debug-Panel: Zusammenfassung aller Sitzungen des Prozesses und die letzten Ereignisse dieser Sitzung
+if st.sidebar.checkbox("🔧 Debug-Metriken", value=DEBUG):
+    st.sidebar.markdown("**Alle Sitzungen**")
+    st.sidebar.dataframe(METRICS.summary(), use_container_width=True)
+    st.sidebar.markdown("**Diese Sitzung**")
+    st.sidebar.dataframe(METRICS.summary(session=session_id), use_container_width=True)
+    st.sidebar.json([event for event in METRICS.events if event.get("session") == session_id][-20:])
+    st.sidebar.markdown("**Start des Prozesses (s)**")
+    st.sidebar.json({phase: round(sekunden, 3) for phase, sekunden in startup.TIMINGS.items()})
@@ -0,0 +1,221 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from similarity import SimilarityIndex, normalize_rows, top_k
+
+# Approximative Suche (IVF) für große Kataloge. Aktivierung über FINFINDER_ANN=1,
+# sonst bleibt es beim exakten Scan in similarity.py.
+ANN_ENABLED = os.getenv("FINFINDER_ANN", "0")
+ANN_PATH = os.getenv("FINFINDER_ANN_INDEX", "fishdata/embeddings.ivf.npz")
+ANN_NPROBE = os.getenv("FINFINDER_ANN_NPROBE", "8")
+
+ASSIGN_CHUNK = 8192
+
+
+# Erst beim Aufruf lesen, damit auch Werte aus der .env (load_dotenv nach dem Import) gelten
+def ann_enabled() -> bool:
+    return os.getenv("FINFINDER_ANN", ANN_ENABLED) == "1"
+
+
+def ann_path() -> str:
+    return os.getenv("FINFINDER_ANN_INDEX", ANN_PATH)
+
+
+def ann_nprobe() -> int:
+    return int(os.getenv("FINFINDER_ANN_NPROBE", ANN_NPROBE))
+
+
+def _assign(vectors, centroids):
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_CHUNK):
+        chunk = vectors[start:start + ASSIGN_CHUNK]
+        assignments[start:start + ASSIGN_CHUNK] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def _spherical_kmeans(vectors, n_lists, iterations, rng):
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = _assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        empty = ~sums.any(axis=1)
+        # Leere Listen bekommen einen zufälligen Vektor als neuen Mittelpunkt
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    # Invertierte Listen: jeder Vektor gehört zum nächsten Mittelpunkt, gesucht wird nur in den nprobe besten Listen
+    def __init__(self, centroids, vectors, ids, offsets, fingerprint="", nprobe=None):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.ids = ids
+        self.offsets = offsets
+        self.fingerprint = fingerprint
+        self.nprobe = nprobe or ann_nprobe()
+        # Zeile im Katalog -> Position in vectors
+        self.positionen = np.argsort(ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, embeddings, n_lists=None, iterations=10, sample_size=None, fingerprint="", seed=0):
+        matrix = normalize_rows(embeddings)
+        rng = np.random.default_rng(seed)
+        n_lists = n_lists or max(1, int(np.sqrt(len(matrix))))
+        n_lists = min(n_lists, len(matrix))
+        sample_size = min(len(matrix), sample_size or n_lists * 64)
+        sample = matrix[rng.choice(len(matrix), sample_size, replace=False)]
+        centroids = _spherical_kmeans(sample, n_lists, iterations, rng)
+
+        assignments = _assign(matrix, centroids)
+        ids = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_lists)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        # Vektoren nach Liste sortiert ablegen, damit jede Liste ein zusammenhängender Block ist
+        return cls(centroids, np.ascontiguousarray(matrix[ids]), ids, offsets, fingerprint)
+
+    def save(self, path=None):
+        path = path or ann_path()
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, centroids=self.centroids, vectors=self.vectors, ids=self.ids,
+                 offsets=self.offsets, fingerprint=np.array(self.fingerprint))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=None, nprobe=None):
+        with np.load(path or ann_path(), allow_pickle=False) as data:
+            return cls(data["centroids"], data["vectors"], data["ids"], data["offsets"],
+                       str(data["fingerprint"]), nprobe)
+
+    def search(self, query, k: int = 3, nprobe=None) -> tuple[np.ndarray, np.ndarray]:
+        query = normalize_rows(query)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        lists, _ = top_k(self.centroids @ query, nprobe)
+        ids, scores = [], []
+        for list_id in lists:
+            start, end = self.offsets[list_id], self.offsets[list_id + 1]
+            if start == end:
+                continue
+            scores.append(self.vectors[start:end] @ query)
+            ids.append(self.ids[start:end])
+        if sum(map(len, ids)) < k and nprobe < len(self.centroids):
+            # Zu wenige (oder gar keine) Treffer in den besuchten Listen: weitere Listen dazunehmen
+            return self.search(query, k, nprobe * 2)
+        if not ids:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+        positions, best = top_k(scores, k)
+        return ids[positions], best
+
+    def scores_for(self, query, ids) -> np.ndarray:
+        # Exakte Ähnlichkeit für ausgewählte Katalogzeilen, z.B. zum Mischen mit anderen Scores
+        return self.vectors[self.positionen[ids]] @ normalize_rows(query)
+
+    def search_many(self, queries, k: int = 3, nprobe=None) -> tuple[np.ndarray, np.ndarray]:
+        # Gleiche Form wie SimilarityIndex.search_many: (m, min(k, n)); fehlende Treffer als id -1 mit Score -inf
+        k = min(k, len(self.ids))
+        ids = np.full((len(queries), k), -1, dtype=np.intp)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for zeile, query in enumerate(normalize_rows(queries)):
+            gefunden, best = self.search(query, k, nprobe)
+            ids[zeile, :len(gefunden)] = gefunden
+            scores[zeile, :len(best)] = best
+        return ids, scores
+
+
+def load_or_build(embeddings, fingerprint, path=None):
+    # Gespeicherten Index nur verwenden, wenn er zum aktuellen Katalog gehört
+    path = path or ann_path()
+    if os.path.exists(path):
+        index = IVFIndex.load(path)
+        if index.fingerprint == fingerprint:
+            return index
+    index = IVFIndex.build(embeddings, fingerprint=fingerprint)
+    index.save(path)
+    return index
+
+
+def make_index(embeddings, fingerprint, normalized=False):
+    if ann_enabled():
+        return load_or_build(embeddings, fingerprint)
+    return SimilarityIndex(embeddings, normalized)
+
+
+def evaluate(embeddings, queries, k=10, n_lists=None, nprobes=(1, 2, 4, 8, 16, 32)):
+    # Recall@k und Latenz des IVF-Index gegenüber dem exakten Scan
+    exact = SimilarityIndex(embeddings)
+    start = time.perf_counter()
+    ivf = IVFIndex.build(embeddings, n_lists=n_lists)
+    build_seconds = time.perf_counter() - start
+
+    def timed(search):
+        latencies, results = [], []
+        for query in queries:
+            start = time.perf_counter()
+            results.append(search(query)[0])
+            latencies.append((time.perf_counter() - start) * 1000)
+        return results, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+    truth, p50, p99 = timed(lambda q: exact.search(q, k))
+    report = [{"method": "exact", "recall": 1.0, "p50_ms": p50, "p99_ms": p99}]
+    for nprobe in nprobes:
+        found, p50, p99 = timed(lambda q: ivf.search(q, k, nprobe))
+        recall = np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)])
+        report.append({"method": f"ivf nprobe={nprobe}", "recall": recall, "p50_ms": p50, "p99_ms": p99})
+    return len(ivf.centroids), build_seconds, report
+
+
+def synthetic_embeddings(rows, dim, rng, clusters=None, spread=1.0):
+    # Viele schwache Cluster: das Rauschen (spread) ist größer als der Abstand der Mittelpunkte, sonst findet
+    # schon nprobe=1 alle Nachbarn und der Bericht taugt nicht zur Wahl von nprobe
+    centers = rng.normal(size=(clusters or max(1, rows // 10), dim)).astype(np.float32)
+    embeddings = centers[rng.integers(len(centers), size=rows)]
+    embeddings += spread * rng.normal(size=embeddings.shape).astype(np.float32)
+    return embeddings
+
+
+def held_out(embeddings, n_queries, rng):
+    # Anfragen sind Zeilen, die nicht im Index stehen, sonst ist der nächste Nachbar immer die Anfrage selbst
+    n_queries = min(n_queries, len(embeddings) // 2)
+    order = rng.permutation(len(embeddings))
+    return embeddings[order[n_queries:]], embeddings[order[:n_queries]]
+
+
+if __name__ == "__main__":
+    # Beispiel: python ann_index.py --rows 100000 --dim 1536 --k 10
+    #           python ann_index.py --embeddings fishdata/embeddings.npz --queries 500
+    parser = argparse.ArgumentParser(description="Vergleicht den IVF-Index mit dem exakten Scan.")
+    parser.add_argument("--embeddings", help="Gespeicherte Embeddings (.npz mit 'vectors', z.B. "
+                                             "FINFINDER_EMBEDDING_STORE) statt synthetischer Daten")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=None, help="Synthetische Cluster (Standard: rows / 10)")
+    parser.add_argument("--spread", type=float, default=1.0, help="Rauschen um die synthetischen Cluster")
+    parser.add_argument("--queries", type=int, default=200, help="Zurückgehaltene Zeilen als Anfragen")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=None)
+    parser.add_argument("--nprobes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.embeddings:
+        with np.load(args.embeddings, allow_pickle=False) as data:
+            embeddings = data["vectors"].astype(np.float32)
+        quelle = f"'{args.embeddings}'"
+    else:
+        # Synthetische Cluster statt echter Embeddings, damit der Test ohne API läuft
+        embeddings = synthetic_embeddings(args.rows + args.queries, args.dim, rng, args.clusters, args.spread)
+        quelle = "synthetisch"
+    embeddings, queries = held_out(embeddings, args.queries, rng)
+
+    n_lists, build_seconds, report = evaluate(embeddings, queries, args.k, args.lists, args.nprobes)
+    print(f"{len(embeddings)} Zeilen ({quelle}), {len(queries)} Anfragen, {n_lists} Listen, Aufbau {build_seconds:.1f}s")
+    for row in report:
+        print(f"{row['method']:<16} recall@{args.k}={row['recall']:.3f}  p50={row['p50_ms']:.3f}ms  p99={row['p99_ms']:.3f}ms")
@@ -0,0 +1,39 @@
+import numpy as np
+
+# Invertierter Index: (Merkmal, Wert) -> Bitset der Fisch-IDs (Zeilenposition im Katalog).
+# Ein Kandidatenstand ist ein einzelnes int, Filtern ist ein bitweises UND ohne DataFrame-Kopien.
+
+
+class AttributIndex:
+    def __init__(self, df, merkmale):
+        self.anzahl_fische = len(df)
+        self.alle = (1 << self.anzahl_fische) - 1
+        self.bits = {}
+        for merkmal in merkmale:
+            werte = {}
+            for position, wert in enumerate(df[merkmal].tolist()):
+                if isinstance(wert, str) or not np.isnan(wert):
+                    werte[wert] = werte.get(wert, 0) | (1 << position)
+            self.bits[merkmal] = werte
+
+    def filtern(self, kandidaten: int, merkmal: str, wert) -> int:
+        return kandidaten & self.bits[merkmal].get(wert, 0)
+
+    def optionen(self, kandidaten: int, merkmal: str) -> list:
+        # Nur Werte, die bei mindestens einem verbleibenden Fisch vorkommen
+        return [wert for wert, bits in self.bits[merkmal].items() if bits & kandidaten]
+
+    def verteilung(self, kandidaten: int, merkmal: str) -> list[int]:
+        # Anzahl Kandidaten je Wert, Fische ohne Angabe als eigene Gruppe
+        anzahlen = [(bits & kandidaten).bit_count() for bits in self.bits[merkmal].values()]
+        anzahlen = [anzahl for anzahl in anzahlen if anzahl]
+        ohne_angabe = kandidaten.bit_count() - sum(anzahlen)
+        return anzahlen + [ohne_angabe] if ohne_angabe else anzahlen
+
+    @staticmethod
+    def anzahl(kandidaten: int) -> int:
+        return kandidaten.bit_count()
+
+    def ids(self, kandidaten: int) -> np.ndarray:
+        raw = np.frombuffer(kandidaten.to_bytes((self.anzahl_fische + 7) // 8 or 1, "little"), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(raw, bitorder="little"))
@@ -0,0 +1,119 @@
+import os
+
+import numpy as np
+from scipy import sparse
+
+from similarity import normalize_rows, top_k
+
+# Strukturierter Vergleich ohne Netzwerkaufruf: jeder Fisch wird als dünn besetzter Multi-Hot-Vektor
+# aus (Merkmal, Token) kodiert, z.B. Schuppen "klein, rau" -> {Schuppen=klein, Schuppen=rau}.
+# Die Antworten eines Nutzers werden mit einem einzigen Sparse-Matrixprodukt gegen alle Fische bewertet.
+EMBEDDING_GEWICHT = float(os.getenv("FINFINDER_EMBEDDING_WEIGHT", "0.5"))
+KANDIDATEN = 50
+
+
+def embedding_gewicht() -> float:
+    # Erst beim Aufruf lesen, damit auch ein Gewicht aus der .env (load_dotenv nach dem Import) gilt
+    return float(os.getenv("FINFINDER_EMBEDDING_WEIGHT", EMBEDDING_GEWICHT))
+
+
+def tokens(merkmal: str, wert) -> list[str]:
+    if not isinstance(wert, str):
+        return []
+    return [f"{merkmal}={token.strip().lower()}" for token in wert.split(",") if token.strip()]
+
+
+class AttributScorer:
+    def __init__(self, df, merkmale):
+        self.merkmale = tuple(merkmale)
+        self.vokabular = {}
+        zeilen, spalten, werte = [], [], []
+        for merkmal in self.merkmale:
+            for position, wert in enumerate(df[merkmal].tolist()):
+                wert_tokens = tokens(merkmal, wert)
+                # 1/sqrt(n) je Token: ein exakt gleicher Wert ergibt pro Merkmal genau 1
+                for token in wert_tokens:
+                    zeilen.append(position)
+                    spalten.append(self.vokabular.setdefault(token, len(self.vokabular)))
+                    werte.append(1 / np.sqrt(len(wert_tokens)))
+        self.matrix = sparse.csr_matrix(
+            (np.array(werte, dtype=np.float32), (zeilen, spalten)),
+            shape=(len(df), len(self.vokabular)),
+        )
+
+    def _anfragen(self, antworten_liste):
+        zeilen, spalten, werte = [], [], []
+        anzahl_merkmale = np.zeros(len(antworten_liste), dtype=np.float32)
+        for zeile, antworten in enumerate(antworten_liste):
+            for merkmal, antwort in antworten.items():
+                antwort_tokens = [t for t in tokens(merkmal, antwort) if t in self.vokabular]
+                if not antwort_tokens:
+                    continue
+                anzahl_merkmale[zeile] += 1
+                for token in antwort_tokens:
+                    zeilen.append(zeile)
+                    spalten.append(self.vokabular[token])
+                    werte.append(1 / np.sqrt(len(antwort_tokens)))
+        anfragen = sparse.csr_matrix(
+            (np.array(werte, dtype=np.float32), (zeilen, spalten)),
+            shape=(len(antworten_liste), len(self.vokabular)),
+        )
+        return anfragen, np.maximum(anzahl_merkmale, 1)
+
+    def scores(self, antworten: dict) -> np.ndarray:
+        return self.scores_many([antworten])[0]
+
+    def scores_many(self, antworten_liste) -> np.ndarray:
+        # (n, t) @ (t, m) -> (n, m), danach auf den Anteil übereinstimmender Merkmale normiert
+        anfragen, anzahl_merkmale = self._anfragen(antworten_liste)
+        treffer = (self.matrix @ anfragen.T).toarray().T
+        return treffer / anzahl_merkmale[:, None]
+
+
+def rank_blended(index, attribut_scores, query=None, k=3, gewicht=None, kandidaten=KANDIDATEN, ids=None):
+    # Ohne Query-Embedding (oder gewicht=0) rein strukturell, sonst gemischt mit der Embedding-Ähnlichkeit.
+    # Gemischt wird nur auf den besten Kandidaten beider Verfahren, damit auch der IVF-Index passt.
+    # Mit ids (z.B. nach der Größe vorgefiltert) werden nur diese Zeilen bewertet.
+    gewicht = embedding_gewicht() if gewicht is None else gewicht
+    if ids is not None:
+        gemischt = attribut_scores[ids]
+        if query is not None and gewicht > 0:
+            gemischt = gewicht * index.scores_for(query, ids) + (1 - gewicht) * gemischt
+        positionen, scores = top_k(gemischt, k)
+        return ids[positionen], scores
+    if query is None or gewicht <= 0:
+        return top_k(attribut_scores, k)
+    emb_ids, _ = index.search(query, kandidaten)
+    attr_ids, _ = top_k(attribut_scores, kandidaten)
+    ids = np.union1d(emb_ids, attr_ids)
+    gemischt = gewicht * index.scores_for(query, ids) + (1 - gewicht) * attribut_scores[ids]
+    positionen, scores = top_k(gemischt, k)
+    return ids[positionen], scores
+
+
+def rank_blended_many(index, attribut_scores, queries=None, k=3, gewicht=None, ids_liste=None):
+    # Wie rank_blended für viele Anfragen auf einmal: attribut_scores ist (m, n), queries (m, d).
+    # Mit dem exakten Index ist das ein einziges Matrixprodukt, beim IVF-Index wird je Anfrage gesucht.
+    gewicht = embedding_gewicht() if gewicht is None else gewicht
+    if queries is not None and gewicht > 0 and not hasattr(index, "matrix"):
+        ergebnisse = [
+            rank_blended(index, scores, query, k, gewicht, ids=None if ids_liste is None else ids_liste[zeile])
+            for zeile, (scores, query) in enumerate(zip(attribut_scores, queries))
+        ]
+        return [r[0] for r in ergebnisse], [r[1] for r in ergebnisse]
+
+    gemischt = np.asarray(attribut_scores, dtype=np.float32)
+    if queries is not None and gewicht > 0:
+        gemischt = gewicht * (normalize_rows(queries) @ index.matrix.T) + (1 - gewicht) * gemischt
+    if ids_liste is not None:
+        # Vorgefilterte Anfragen: alle anderen Fische kommen nicht in Frage
+        erlaubt = np.ones(gemischt.shape, dtype=bool)
+        for zeile, ids in enumerate(ids_liste):
+            if ids is not None:
+                erlaubt[zeile] = False
+                erlaubt[zeile, ids] = True
+        gemischt = np.where(erlaubt, gemischt, -np.inf)
+    positionen, scores = top_k(gemischt, k)
+    # Bei weniger erlaubten Fischen als k fallen die ausgeschlossenen wieder heraus
+    return ([p[np.isfinite(s)] for p, s in zip(positionen, scores)],
+            [s[np.isfinite(s)] for s in scores])
@@ -0,0 +1,228 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from catalog import CATALOG_CSV, GROESSE, MERKMALE, Katalog, compile_catalog, load_catalog
+from question_planner import naechstes_merkmal
+from similarity import SimilarityIndex
+
+# Misst Laden, Indexaufbau, Filtern und Top-k-Suche auf synthetischen Katalogen mit dem Schema von
+# finfinderbasedata.csv, damit sichtbar wird, ab welcher Größe das aktuelle Design nicht mehr trägt.
+# Beispiel: python benchmark.py --sizes 1000 10000 100000 --output benchmark.json
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DIM = 256
+QUERIES = 200
+TIMEOUT = 1800
+
+
+def synthetic_catalog(n: int, seed: int = 0, vorlage: str = CATALOG_CSV) -> pd.DataFrame:
+    # Werte werden aus den Teilangaben des echten Katalogs kombiniert ("klein, fest" -> "klein", "fest"),
+    # so entstehen viele verschiedene, aber realistische Optionen je Merkmal
+    rng = np.random.default_rng(seed)
+    echt = pd.read_csv(vorlage)
+    df = pd.DataFrame({"Name": [f"Art {i:07d}" for i in range(n)]})
+    for merkmal in MERKMALE:
+        teile = sorted({teil.strip() for wert in echt[merkmal].dropna() for teil in str(wert).split(",") if teil.strip()})
+        erster = rng.integers(len(teile), size=n)
+        zweiter = rng.integers(len(teile), size=n)
+        mit_zweitem = rng.random(n) < 0.5
+        df[merkmal] = [
+            f"{teile[a]}, {teile[b]}" if zwei and a != b else teile[a]
+            for a, b, zwei in zip(erster, zweiter, mit_zweitem)
+        ]
+    minima = rng.integers(3, 120, size=n)
+    df[GROESSE] = [f"{a}-{a + b}" for a, b in zip(minima, rng.integers(5, 100, size=n))]
+    return df
+
+
+def latenzen(funktion, argumente) -> dict:
+    zeiten = []
+    for argument in argumente:
+        start = time.perf_counter()
+        funktion(argument)
+        zeiten.append(time.perf_counter() - start)
+    zeiten = np.array(zeiten) * 1000
+    return {
+        "p50_ms": float(np.percentile(zeiten, 50)),
+        "p99_ms": float(np.percentile(zeiten, 99)),
+        "ops_per_s": float(len(zeiten) / max(zeiten.sum() / 1000, 1e-12)),
+    }
+
+
+def dauer(funktion):
+    start = time.perf_counter()
+    ergebnis = funktion()
+    return ergebnis, time.perf_counter() - start
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss ist unter Linux in KiB, unter macOS in Bytes
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_size(n: int, dim: int = DIM, queries: int = QUERIES, seed: int = 0) -> dict:
+    # Läuft in einem eigenen Prozess, damit der Speicher-Peak zu genau einer Katalog-Größe gehört
+    rng = np.random.default_rng(seed)
+    ergebnis = {"n": n, "dim": dim, "stages": {}}
+    stages = ergebnis["stages"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "catalog.csv")
+        arrow_path = os.path.join(tmp, "catalog.arrow")
+        synthetic_catalog(n, seed).to_csv(csv_path, index=False)
+
+        _, stages["load_csv_s"] = dauer(lambda: load_catalog(csv_path))
+        try:
+            _, stages["compile_arrow_s"] = dauer(lambda: compile_catalog(csv_path, arrow_path))
+            df, stages["load_arrow_s"] = dauer(lambda: load_catalog(arrow_path))
+        except (ImportError, AttributeError):
+            # Ohne pyarrow nur der CSV-Pfad
+            df = load_catalog(csv_path)
+
+    katalog, stages["katalog_build_s"] = dauer(lambda: Katalog(df))
+    embeddings = rng.standard_normal((n, dim), dtype=np.float32)
+    index, stages["similarity_build_s"] = dauer(lambda: SimilarityIndex(embeddings))
+    del embeddings
+
+    # Filtern wie in FinFinder.py/FinFinderV2.py: Antworten eines zufälligen Fisches Merkmal für Merkmal
+    zeilen = [katalog.zeile(i) for i in rng.integers(n, size=queries)]
+
+    def bestimmen_fest(zeile):
+        kandidaten = katalog.index.alle
+        for merkmal in MERKMALE:
+            katalog.optionen(merkmal, kandidaten)
+            kandidaten = katalog.index.filtern(kandidaten, merkmal, zeile[merkmal])
+
+    def bestimmen_adaptiv(zeile):
+        kandidaten, offen = katalog.index.alle, list(MERKMALE)
+        while offen and katalog.index.anzahl(kandidaten) > 1:
+            merkmal = naechstes_merkmal(katalog.index, kandidaten, offen)
+            if merkmal is None:
+                break
+            kandidaten = katalog.index.filtern(kandidaten, merkmal, zeile[merkmal])
+            offen.remove(merkmal)
+
+    stages["filter_fixed"] = latenzen(bestimmen_fest, zeilen)
+    stages["filter_adaptive"] = latenzen(bestimmen_adaptiv, zeilen[:max(1, queries // 10)])
+    if katalog.groessen is not None:
+        stages["size_prune"] = latenzen(katalog.groessen.ids_fuer, rng.uniform(5, 150, size=queries))
+
+    # Ähnlichkeitsschritt aus FinFinderV3.py
+    anfragen = rng.standard_normal((queries, dim), dtype=np.float32)
+    antworten = [{merkmal: zeile[merkmal] for merkmal in MERKMALE} for zeile in zeilen]
+    stages["topk_search"] = latenzen(lambda q: index.search(q, 3), anfragen)
+    stages["attribute_scores"] = latenzen(katalog.scorer.scores, antworten)
+    _, batch_s = dauer(lambda: index.search_many(anfragen, 3))
+    stages["topk_search_many"] = {"queries": queries, "seconds": batch_s, "ops_per_s": queries / max(batch_s, 1e-12)}
+
+    ergebnis["peak_rss_mb"] = peak_rss_mb()
+    return ergebnis
+
+
+def _ausfuehren(verbindung, funktion, argumente):
+    try:
+        verbindung.send((True, funktion(*argumente)))
+    except BaseException as e:
+        verbindung.send((False, e))
+    finally:
+        verbindung.close()
+
+
+def in_prozess(funktion, argumente, timeout):
+    # Führt funktion(*argumente) in einem eigenen, frisch gestarteten Prozess aus; bei Zeitüberschreitung
+    # wird genau dieser Prozess beendet und TimeoutError ausgelöst
+    context = get_context("spawn")
+    empfang, senden = context.Pipe(duplex=False)
+    prozess = context.Process(target=_ausfuehren, args=(senden, funktion, argumente), daemon=True)
+    prozess.start()
+    senden.close()
+    try:
+        if not empfang.poll(timeout):
+            raise TimeoutError(f"timeout nach {timeout:.0f}s")
+        try:
+            ok, ergebnis = empfang.recv()
+        except EOFError:
+            raise RuntimeError(f"Prozess beendet mit Code {prozess.exitcode}") from None
+        if not ok:
+            raise ergebnis
+        return ergebnis
+    finally:
+        if prozess.is_alive():
+            prozess.terminate()
+        prozess.join()
+        empfang.close()
+
+
+def compare(alt: dict, neu: dict):
+    # Verhältnis neu/alt je Größe und Stufe, < 1 heißt schneller
+    alte = {lauf["n"]: lauf for lauf in alt["results"] if "stages" in lauf}
+    for lauf in neu["results"]:
+        if lauf["n"] not in alte or "stages" not in lauf:
+            continue
+        print(f"n={lauf['n']}")
+        for name, wert in lauf["stages"].items():
+            alter_wert = alte[lauf["n"]]["stages"].get(name)
+            if alter_wert is None:
+                continue
+            schluessel = "p50_ms" if isinstance(wert, dict) and "p50_ms" in wert else None
+            if isinstance(wert, dict) and schluessel is None:
+                continue
+            a = alter_wert[schluessel] if schluessel else alter_wert
+            b = wert[schluessel] if schluessel else wert
+            print(f"  {name:<20} {a:>10.3f} -> {b:>10.3f}  ({b / a if a else float('nan'):.2f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark von Katalog, Filtern und Top-k-Suche auf synthetischen Daten.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--dim", type=int, default=DIM)
+    parser.add_argument("--queries", type=int, default=QUERIES)
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help="Sekunden je Katalog-Größe")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", help="Früheres Ergebnis, mit dem verglichen wird")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "dim": args.dim,
+            "queries": args.queries,
+        },
+        "results": [],
+    }
+    for n in args.sizes:
+        # Ein frischer Prozess je Größe; bei Zeitüberschreitung wird abgebrochen und das Ergebnis vermerkt
+        try:
+            lauf = in_prozess(run_size, (n, args.dim, args.queries), args.timeout)
+            print(f"n={n}: Katalog {lauf['stages']['katalog_build_s']:.2f}s, "
+                  f"Filtern p50 {lauf['stages']['filter_fixed']['p50_ms']:.2f}ms, "
+                  f"Top-k p50 {lauf['stages']['topk_search']['p50_ms']:.2f}ms, Peak {lauf['peak_rss_mb']:.0f} MB")
+        except TimeoutError:
+            lauf = {"n": n, "error": f"timeout nach {args.timeout:.0f}s"}
+            print(f"n={n}: {lauf['error']}")
+        except Exception as e:
+            lauf = {"n": n, "error": repr(e)}
+            print(f"n={n}: Fehler {e!r}")
+        report["results"].append(lauf)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    print(f"✅ Ergebnis in '{args.output}'")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
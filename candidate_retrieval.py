@@ -0,0 +1,108 @@
+import os
+import re
+
+import numpy as np
+from scipy import sparse
+
+from catalog import GROESSE, load_catalog, parse_groesse
+from similarity import top_k
+from size_index import GroessenIndex, groesse_aus_text
+
+# Statt alle Steckbriefe in den Prompt zu schreiben, werden pro Nutzerbeitrag nur die passendsten Fische
+# per BM25 gesucht und eingefügt. Die Promptgröße hängt so von TOP_N ab, nicht von der Größe des Katalogs.
+STECKBRIEFE_PATH = os.getenv("FINFINDER_STECKBRIEFE", "fishdata/steckbriefe.txt")
+TOP_N = int(os.getenv("FINFINDER_RAG_TOP_N", "5"))
+
+_ENDUNGEN = ("ern", "en", "er", "es", "em", "e", "n", "s")
+
+
+def woerter(text: str) -> list[str]:
+    # Kleinschreibung und grobes Abschneiden deutscher Endungen: "roten Flossen" -> ["rot", "floss"]
+    ergebnis = []
+    for wort in re.findall(r"[a-zäöüß]+", text.lower()):
+        if len(wort) < 3:
+            continue
+        for endung in _ENDUNGEN:
+            if len(wort) - len(endung) >= 3 and wort.endswith(endung):
+                wort = wort[:-len(endung)]
+                break
+        ergebnis.append(wort)
+    return ergebnis
+
+
+def lade_steckbriefe(path=STECKBRIEFE_PATH, df=None) -> list[tuple[str, str]]:
+    # (Name, Steckbrief) aus der Textdatei (Blöcke durch ----- getrennt) und aus dem Katalog
+    steckbriefe = []
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for block in re.split(r"^-{3,}\s*$", f.read(), flags=re.MULTILINE):
+                name = re.search(r"^Name:\s*(.+)$", block, flags=re.MULTILINE)
+                if name:
+                    steckbriefe.append((name.group(1).strip(), block.strip()))
+    if df is None:
+        df = load_catalog()
+    bekannt = {name for name, _ in steckbriefe}
+    for name, groesse, text in zip(df["Name"], df[GROESSE], df["Beschreibung"]):
+        if name not in bekannt:
+            steckbriefe.append((name, f"Name: {name}\nGröße: {groesse} cm\n{text}"))
+    return steckbriefe
+
+
+class BM25Index:
+    def __init__(self, texte, k1=1.5, b=0.75):
+        self.vokabular = {}
+        zeilen, spalten, haeufigkeit = [], [], []
+        laengen = np.zeros(len(texte), dtype=np.float32)
+        for position, text in enumerate(texte):
+            zaehler = {}
+            for wort in woerter(text):
+                spalte = self.vokabular.setdefault(wort, len(self.vokabular))
+                zaehler[spalte] = zaehler.get(spalte, 0) + 1
+            laengen[position] = sum(zaehler.values())
+            zeilen.extend([position] * len(zaehler))
+            spalten.extend(zaehler.keys())
+            haeufigkeit.extend(zaehler.values())
+
+        zeilen = np.array(zeilen, dtype=np.int64)
+        spalten = np.array(spalten, dtype=np.int64)
+        tf = np.array(haeufigkeit, dtype=np.float32)
+        anzahl = len(texte)
+        df = np.bincount(spalten, minlength=len(self.vokabular)).astype(np.float32)
+        idf = np.log(1 + (anzahl - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * laengen / max(laengen.mean(), 1))
+        # BM25-Gewicht je (Dokument, Wort) vorab berechnet, eine Anfrage ist dann ein Sparse-Matrixprodukt
+        gewichte = idf[spalten] * tf * (k1 + 1) / (tf + norm[zeilen])
+        self.matrix = sparse.csr_matrix((gewichte, (zeilen, spalten)), shape=(anzahl, len(self.vokabular)))
+
+    def scores(self, query: str) -> np.ndarray:
+        spalten = sorted({self.vokabular[wort] for wort in woerter(query) if wort in self.vokabular})
+        if not spalten:
+            return np.zeros(self.matrix.shape[0], dtype=np.float32)
+        return np.asarray(self.matrix[:, spalten].sum(axis=1)).ravel()
+
+
+class KandidatenSuche:
+    def __init__(self, steckbriefe, top_n=TOP_N):
+        self.namen = [name for name, _ in steckbriefe]
+        self.texte = [text for _, text in steckbriefe]
+        self.top_n = top_n
+        self.bm25 = BM25Index(self.texte)
+        groessen = [parse_groesse(re.search(r"Größe:\s*(.*)", text).group(1)) if "Größe:" in text
+                    else (float("nan"), float("nan")) for text in self.texte]
+        self.groessen = GroessenIndex([g[0] for g in groessen], [g[1] for g in groessen])
+
+    def suchen(self, query: str, top_n=None) -> np.ndarray:
+        scores = self.bm25.scores(query)
+        # Eine genannte Länge schließt unpassende Fische aus, solange noch einer übrig bleibt
+        groesse = groesse_aus_text(query)
+        if groesse is not None:
+            ids = self.groessen.ids_fuer(groesse)
+            if len(ids):
+                positionen, _ = top_k(scores[ids], top_n or self.top_n)
+                return ids[positionen]
+        positionen, _ = top_k(scores, top_n or self.top_n)
+        return positionen
+
+    def kontext(self, query: str, top_n=None) -> str:
+        bloecke = [self.texte[position] for position in self.suchen(query, top_n)]
+        return "# Liste von Fischen\n\n" + "\n\n---------------------------\n".join(bloecke)
@@ -0,0 +1,210 @@
+import argparse
+import hashlib
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from attribute_index import AttributIndex
+from attribute_scoring import AttributScorer
+from size_index import GroessenIndex
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+CATALOG_CSV = "fishdata/finfinderbasedata.csv"
+# Kompilierter Katalog (Arrow IPC), wird bevorzugt geladen, wenn er existiert
+CATALOG_ARROW = os.getenv("FINFINDER_CATALOG", "fishdata/finfinderbasedata.arrow")
+GROESSE = "Größen (cm)"
+# Optionale Spalte im kompilierten Katalog mit den normierten Embeddings der Beschreibungen
+EMBEDDING_SPALTE = "embedding"
+
+# Alle Merkmale, die wir abfragen wollen
+MERKMALE = [
+    "Lebensraum",
+    "Futter",
+    "Flossenformen",
+    "Farbe und besondere Farbmerkmale",
+    "Augenfarbe",
+    "Schuppen",
+    "Form"
+]
+
+# Spalte im Katalog -> Bezeichnung in der Beschreibung
+BESCHREIBUNG_FELDER = [
+    ("Lebensraum", "Lebensraum"),
+    ("Futter", "Futter"),
+    ("Flossenformen", "Flossenform"),
+    ("Farbe und besondere Farbmerkmale", "Farbe"),
+    ("Augenfarbe", "Augenfarbe"),
+    ("Schuppen", "Schuppen"),
+    ("Form", "Form"),
+]
+
+
+def normalize_text(text: str) -> str:
+    # Zeilenumbrüche und Einrückungen kosten nur Tokens
+    return " ".join(str(text).split())
+
+
+def beschreibung(row) -> str:
+    return normalize_text(", ".join(f"{label}: {row[spalte]}" for spalte, label in BESCHREIBUNG_FELDER))
+
+
+def parse_groesse(text):
+    # "40-150" -> (40.0, 150.0), "bis 30" -> (30.0, 30.0), ohne Zahl -> (nan, nan)
+    zahlen = [float(zahl.replace(",", ".")) for zahl in re.findall(r"\d+(?:[.,]\d+)?", str(text))]
+    if not zahlen:
+        return float("nan"), float("nan")
+    return min(zahlen), max(zahlen)
+
+
+def prepare_catalog(df: pd.DataFrame) -> pd.DataFrame:
+    # Spaltenweise statt df.apply, damit auch große Kataloge schnell vorbereitet sind
+    teile = [f"{label}: " + df[spalte].astype(str) for spalte, label in BESCHREIBUNG_FELDER]
+    df["Beschreibung"] = teile[0].str.cat(teile[1:], sep=", ").str.replace(r"\s+", " ", regex=True).str.strip()
+    if GROESSE in df.columns:
+        groessen = [parse_groesse(text) for text in df[GROESSE]]
+        df["Größe min (cm)"] = pd.Series([g[0] for g in groessen], dtype="float32", index=df.index)
+        df["Größe max (cm)"] = pd.Series([g[1] for g in groessen], dtype="float32", index=df.index)
+    return df
+
+
+def compile_catalog(csv_path: str = CATALOG_CSV, arrow_path: str = CATALOG_ARROW, embeddings=None,
+                    embedding_meta=None) -> pd.DataFrame:
+    # Mit embeddings (normierte (n, d)-Matrix in Katalogreihenfolge) enthält die Datei alles, was die App
+    # beim Start braucht; embedding_meta z.B. {"embedding_model": ..., "embedding_fingerprint": ...}
+    df = prepare_catalog(pd.read_csv(csv_path))
+    # Spalten mit vielen Wiederholungen (Lebensraum, Futter, ...) als Kategorien, also dictionary-encoded
+    for spalte in df.columns:
+        if pd.api.types.is_string_dtype(df[spalte]) and df[spalte].nunique() <= len(df) / 2:
+            df[spalte] = df[spalte].astype("category")
+
+    with open(csv_path, "rb") as f:
+        version = hashlib.sha256(f.read()).hexdigest()[:16]
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), b"finfinder_version": version.encode()}
+    if embeddings is not None:
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        spalte = pa.FixedSizeListArray.from_arrays(pa.array(embeddings.reshape(-1)), embeddings.shape[1])
+        table = table.append_column(EMBEDDING_SPALTE, spalte)
+        metadata.update({f"finfinder_{key}".encode(): str(value).encode() for key, value in (embedding_meta or {}).items()})
+    table = table.replace_schema_metadata(metadata)
+    # Unkomprimiert schreiben, damit die Datei per Memory-Mapping gelesen werden kann
+    tmp_path = f"{arrow_path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, arrow_path)
+    return df
+
+
+def load_artifact(path: str = CATALOG_ARROW):
+    # Liefert (df, embeddings oder None, metadaten). Nur die Embeddings bleiben eine schreibgeschützte Sicht auf
+    # die per Memory-Mapping geöffnete Datei; der Katalog selbst wird für pandas einmal in den Speicher kopiert
+    # (ohne CSV-Parsing, kategoriale Spalten als pandas.Categorical).
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    metadata = {
+        key.decode()[len("finfinder_"):]: value.decode()
+        for key, value in (table.schema.metadata or {}).items()
+        if key.startswith(b"finfinder_")
+    }
+    embeddings = None
+    if EMBEDDING_SPALTE in table.column_names:
+        spalte = table.column(EMBEDDING_SPALTE).combine_chunks()
+        embeddings = spalte.flatten().to_numpy(zero_copy_only=True).reshape(len(spalte), spalte.type.list_size)
+        table = table.drop_columns([EMBEDDING_SPALTE])
+    df = table.to_pandas()
+    if "version" in metadata:
+        df.attrs["version"] = metadata["version"]
+    return df, embeddings, metadata
+
+
+def vorhandene_embeddings(arrow_path: str, texte) -> tuple:
+    # (embeddings, embedding_meta) eines mit "startup.py build" gebauten Artefakts, damit ein erneutes Kompilieren
+    # sie nicht stillschweigend verliert. (None, {}) ohne Datei oder ohne Embeddings; ValueError, wenn sich die
+    # Beschreibungen seitdem geändert haben und die Embeddings nicht mehr passen.
+    if pa is None or not os.path.exists(arrow_path):
+        return None, {}
+    alt, embeddings, meta = load_artifact(arrow_path)
+    if embeddings is None:
+        return None, {}
+    if alt["Beschreibung"].astype(str).tolist() != list(texte):
+        raise ValueError(f"'{arrow_path}' enthält Embeddings zu anderen Beschreibungen")
+    # Kopie, die Datei wird gleich ersetzt
+    return np.array(embeddings), {key: meta[key] for key in ("embedding_model", "embedding_fingerprint") if key in meta}
+
+
+def _load_arrow(path: str) -> pd.DataFrame:
+    return load_artifact(path)[0]
+
+
+def _arrow_aktuell(arrow_path: str = CATALOG_ARROW) -> bool:
+    # Eine nach dem Kompilieren geänderte CSV hat Vorrang, bis neu kompiliert wurde
+    if pa is None or not os.path.exists(arrow_path):
+        return False
+    return not os.path.exists(CATALOG_CSV) or os.path.getmtime(arrow_path) >= os.path.getmtime(CATALOG_CSV)
+
+
+def load_catalog(path: str = None) -> pd.DataFrame:
+    if path is None:
+        path = CATALOG_ARROW if _arrow_aktuell() else CATALOG_CSV
+    if path.endswith(".arrow"):
+        return _load_arrow(path)
+    return prepare_catalog(pd.read_csv(path))
+
+
+class Katalog:
+    # Wird einmal pro Prozess geladen und von allen Sitzungen nur gelesen.
+    # Nach außen gehen nur Kopien einzelner Zeilen, Sitzungen speichern lediglich Positionen.
+    def __init__(self, df: pd.DataFrame, merkmale=MERKMALE):
+        self._df = df
+        self.merkmale = tuple(merkmale)
+        self.index = AttributIndex(df, merkmale)
+        self.scorer = AttributScorer(df, merkmale)
+        self.groessen = GroessenIndex(df["Größe min (cm)"], df["Größe max (cm)"]) if GROESSE in df.columns else None
+        self.namen = tuple(df["Name"].tolist())
+        self.beschreibungen = tuple(df["Beschreibung"].tolist())
+        self.version = df.attrs.get("version") or hashlib.sha256(df.to_csv(index=False).encode("utf-8")).hexdigest()[:16]
+
+    def __len__(self):
+        return len(self._df)
+
+    def zeile(self, position) -> pd.Series:
+        return self._df.iloc[int(position)].copy()
+
+    def zeilen(self, positionen) -> pd.DataFrame:
+        return self._df.iloc[list(positionen)].copy()
+
+    def treffer(self, kandidaten: int) -> pd.DataFrame:
+        return self.zeilen(self.index.ids(kandidaten))
+
+    def optionen(self, merkmal: str, kandidaten=None) -> list:
+        return self.index.optionen(self.index.alle if kandidaten is None else kandidaten, merkmal)
+
+
+if __name__ == "__main__":
+    # Katalog nach jeder Änderung der CSV neu kompilieren: python catalog.py
+    # Embeddings eines mit "python startup.py build" gebauten Artefakts bleiben erhalten, solange die Beschreibungen
+    # gleich sind; sonst muss das Artefakt mit startup.py neu gebaut werden.
+    parser = argparse.ArgumentParser(description="Kompiliert den Fischkatalog in das Arrow-IPC-Format.")
+    parser.add_argument("--csv", default=CATALOG_CSV)
+    parser.add_argument("--output", default=CATALOG_ARROW)
+    parser.add_argument("--ohne-embeddings", action="store_true",
+                        help="Embeddings in einer vorhandenen Ausgabedatei verwerfen statt zu übernehmen")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    embeddings, embedding_meta = None, {}
+    if not args.ohne_embeddings:
+        try:
+            embeddings, embedding_meta = vorhandene_embeddings(args.output, load_catalog(args.csv)["Beschreibung"].tolist())
+        except ValueError as e:
+            raise SystemExit(f"❌ {e}. Mit Embeddings neu bauen: python startup.py build --csv {args.csv} "
+                             f"--output {args.output} (oder --ohne-embeddings, um sie zu verwerfen)")
+    df = compile_catalog(args.csv, args.output, embeddings, embedding_meta)
+    print(f"✅ {len(df)} Fische in {time.perf_counter() - start:.2f}s nach '{args.output}' kompiliert"
+          + (", Embeddings übernommen" if embeddings is not None else ""))
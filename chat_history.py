@@ -0,0 +1,89 @@
+import os
+
+from token_count import count_message_tokens
+
+# Token-Budget für den Gesprächsverlauf ohne den festen Prompt am Anfang
+HISTORY_TOKEN_BUDGET = int(os.getenv("FINFINDER_HISTORY_TOKENS", "1500"))
+# Die letzten Nachrichten bleiben immer wörtlich erhalten, damit Rückfragen ihren Kontext behalten
+KEEP_MESSAGES = int(os.getenv("FINFINDER_HISTORY_KEEP", "4"))
+# Beim Kürzen bis auf diesen Anteil des Budgets verdichten, damit nicht jede Runde erneut gekürzt wird
+COMPACT_TARGET = 0.5
+
+ZUSAMMENFASSUNG_PREFIX = "Zusammenfassung des bisherigen Gesprächs:\n"
+
+
+class ChatHistory:
+    # Hält den ganzen Verlauf für die Anzeige, schickt aber nur ein Fenster innerhalb des Budgets.
+    # Der System-Prompt steht immer unverändert vorne, damit der Anbieter den Prompt-Prefix cachen kann;
+    # ältere Nachrichten landen in einer Zusammenfassung direkt dahinter oder fallen weg.
+    def __init__(self, system_prompt, budget=HISTORY_TOKEN_BUDGET, keep=KEEP_MESSAGES, summarize=None,
+                 role="developer"):
+        self.system = {"role": role, "content": system_prompt}
+        self.system_tokens = count_message_tokens(self.system)
+        self.budget = budget
+        self.keep = keep
+        # summarize(bisherige_zusammenfassung, nachrichten) -> str, ohne Funktion werden alte Nachrichten verworfen
+        self.summarize = summarize
+        self.verlauf = []
+        self._tokens = []
+        self.start = 0
+        self.zusammenfassung = ""
+        self.zusammenfassung_tokens = 0
+        self.verdichtet = 0
+
+    def append(self, role, content):
+        message = {"role": role, "content": content}
+        self.verlauf.append(message)
+        self._tokens.append(count_message_tokens(message))
+
+    def history_tokens(self):
+        return self.zusammenfassung_tokens + sum(self._tokens[self.start:])
+
+    def token_count(self):
+        # Tokens des nächsten Requests, lokal gezählt
+        return self.system_tokens + self.history_tokens()
+
+    def _compact(self):
+        if self.history_tokens() <= self.budget:
+            return
+        ziel = self.budget * COMPACT_TARGET
+        ende = self.start
+        rest = self.history_tokens()
+        # Von vorne Nachrichten aus dem Fenster nehmen, bis das Ziel erreicht ist oder nur noch keep übrig sind
+        while ende < len(self.verlauf) - self.keep and rest > ziel:
+            rest -= self._tokens[ende]
+            ende += 1
+        if ende == self.start:
+            return
+
+        alt = self.verlauf[self.start:ende]
+        self.start = ende
+        self.verdichtet += len(alt)
+        if self.summarize is None:
+            return
+        try:
+            zusammenfassung = self.summarize(self.zusammenfassung, alt)
+        except Exception:
+            # Ohne Zusammenfassung geht es mit der alten weiter, die Anfrage selbst soll nicht scheitern
+            return
+        self.zusammenfassung = zusammenfassung.strip()
+        self.zusammenfassung_tokens = count_message_tokens(self._zusammenfassung_message())
+
+    def _zusammenfassung_message(self):
+        return {"role": self.system["role"], "content": ZUSAMMENFASSUNG_PREFIX + self.zusammenfassung}
+
+    def nutzer_text(self):
+        # Alle Beiträge des Nutzers, auch die schon verdichteten, z.B. als Suchanfrage
+        return "\n".join(m["content"] for m in self.verlauf if m["role"] == "user")
+
+    def messages(self, kontext=None):
+        # Nachrichten für den nächsten API-Aufruf: fester Prefix, Zusammenfassung, letzte Nachrichten.
+        # Wechselnder Kontext pro Anfrage kommt ans Ende, damit der Prefix davor gleich bleibt.
+        self._compact()
+        messages = [self.system]
+        if self.zusammenfassung:
+            messages.append(self._zusammenfassung_message())
+        messages.extend(self.verlauf[self.start:])
+        if kontext:
+            messages.append({"role": self.system["role"], "content": kontext})
+        return messages
@@ -0,0 +1,148 @@
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from catalog import CATALOG_CSV, load_catalog, normalize_text
+from embedding_store import EmbeddingStore, catalog_fingerprint
+from token_count import count_tokens
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Limits aus der .env, Standardwerte entsprechen einem kleinen OpenAI-Tier
+REQUESTS_PER_MINUTE = int(os.getenv("FINFINDER_EMBED_RPM", "3000"))
+TOKENS_PER_MINUTE = int(os.getenv("FINFINDER_EMBED_TPM", "1000000"))
+BATCH_SIZE = int(os.getenv("FINFINDER_EMBED_BATCH_SIZE", "256"))
+BATCH_TOKENS = int(os.getenv("FINFINDER_EMBED_BATCH_TOKENS", "100000"))
+MAX_WORKERS = int(os.getenv("FINFINDER_EMBED_WORKERS", "4"))
+MAX_RETRIES = 5
+
+
+def _limit(name: str, standard: int) -> int:
+    # Erst beim Aufruf lesen, damit auch Werte aus der .env (load_dotenv nach dem Import) gelten
+    return int(os.getenv(name, standard))
+
+
+def wiederholbar(fehler: Exception) -> bool:
+    # Nur Rate-Limit (429), Serverfehler (5xx), Timeouts und Verbindungsabbrüche werden wiederholt.
+    # Falscher Schlüssel oder ungültige Anfrage (übrige 4xx) scheitern beim nächsten Versuch genauso.
+    status = getattr(fehler, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return (isinstance(fehler, (TimeoutError, ConnectionError))
+            or type(fehler).__name__ in ("APITimeoutError", "APIConnectionError"))
+
+
+class TokenBucket:
+    # Füllt sich kontinuierlich mit rate_per_minute / 60 pro Sekunde bis zur Kapazität einer Minute
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute or _limit("FINFINDER_EMBED_RPM", REQUESTS_PER_MINUTE))
+        self.tokens = TokenBucket(tokens_per_minute or _limit("FINFINDER_EMBED_TPM", TOKENS_PER_MINUTE))
+
+    def acquire(self, tokens: int):
+        self.requests.acquire(1)
+        self.tokens.acquire(tokens)
+
+
+def make_batches(texts, batch_size=None, batch_tokens=None):
+    # Packt Texte in Batches, die weder die Anzahl noch das Token-Budget pro Request überschreiten
+    batch_size = batch_size or _limit("FINFINDER_EMBED_BATCH_SIZE", BATCH_SIZE)
+    batch_tokens = batch_tokens or _limit("FINFINDER_EMBED_BATCH_TOKENS", BATCH_TOKENS)
+    batch, batch_indices, tokens = [], [], 0
+    for index, text in enumerate(texts):
+        text_tokens = count_tokens(text)
+        if batch and (len(batch) >= batch_size or tokens + text_tokens > batch_tokens):
+            yield batch_indices, batch, tokens
+            batch, batch_indices, tokens = [], [], 0
+        batch.append(text)
+        batch_indices.append(index)
+        tokens += text_tokens
+    if batch:
+        yield batch_indices, batch, tokens
+
+
+def embed_batched(client, limiter=None, max_workers=None, batch_size=None):
+    # embed_fn für den EmbeddingStore: viele Texte pro Request, mehrere Requests parallel
+    limiter = limiter or RateLimiter()
+    max_workers = max_workers or _limit("FINFINDER_EMBED_WORKERS", MAX_WORKERS)
+
+    def embed_batch(batch, tokens, model):
+        for attempt in range(MAX_RETRIES):
+            limiter.acquire(tokens)
+            try:
+                response = client.embeddings.create(input=batch, model=model)
+                return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            except Exception as e:
+                if attempt == MAX_RETRIES - 1 or not wiederholbar(e):
+                    raise
+                time.sleep(2 ** attempt)
+
+    def embed_fn(texts, model):
+        texts = [normalize_text(text) for text in texts]
+        vectors = [None] * len(texts)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                (indices, pool.submit(embed_batch, batch, tokens, model))
+                for indices, batch, tokens in make_batches(texts, batch_size)
+            ]
+            for indices, future in futures:
+                for index, vector in zip(indices, future.result()):
+                    vectors[index] = vector
+        return vectors
+
+    return embed_fn
+
+
+if __name__ == "__main__":
+    # Katalog vorab einbetten, z.B. nach einem Update der CSV:
+    # python embedding_ingest.py --catalog fishdata/finfinderbasedata.csv
+    from dotenv import load_dotenv
+
+    from llm_client import embedding_store_path, make_client
+
+    parser = argparse.ArgumentParser(description="Bettet alle Beschreibungen des Fischkatalogs ein.")
+    parser.add_argument("--catalog", default=CATALOG_CSV)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--workers", type=int, help="Parallele Requests (Standard: FINFINDER_EMBED_WORKERS, 4)")
+    parser.add_argument("--ann", action="store_true", help="IVF-Index für die approximative Suche mit aufbauen")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = make_client()
+    df = load_catalog(args.catalog)
+    store = EmbeddingStore(embedding_store_path())
+    before = len(store)
+    start = time.perf_counter()
+    texts = df["Beschreibung"].tolist()
+    embeddings = store.embed(texts, args.model, embed_batched(client, max_workers=args.workers))
+    print(f"✅ {len(store) - before} neue Embeddings, {len(store)} im Speicher ({time.perf_counter() - start:.1f}s)")
+
+    if args.ann:
+        from ann_index import IVFIndex, ann_path
+
+        index = IVFIndex.build(embeddings, fingerprint=catalog_fingerprint(texts, args.model))
+        index.save()
+        print(f"✅ IVF-Index mit {len(index.centroids)} Listen gespeichert als '{ann_path()}'")
@@ -0,0 +1,83 @@
+import hashlib
+import os
+
+import numpy as np
+
+from metrics import METRICS
+
+# Persistenter Embedding-Speicher: Schlüssel ist ein Hash aus Modellname und Beschreibungstext.
+# So werden nur neue oder geänderte Zeilen neu eingebettet, alles andere kommt direkt von der Platte.
+STORE_PATH = os.getenv("FINFINDER_EMBEDDING_STORE", "fishdata/embeddings.npz")
+
+
+def store_path() -> str:
+    # Erst beim Aufruf lesen, damit auch ein Pfad aus der .env (load_dotenv nach dem Import) gilt
+    return os.getenv("FINFINDER_EMBEDDING_STORE", STORE_PATH)
+
+
+def content_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\n{text}".encode("utf-8")).hexdigest()
+
+
+def catalog_fingerprint(texts, model: str) -> str:
+    # Identifiziert Reihenfolge und Inhalt aller Zeilen, damit abgeleitete Indizes veralten können
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(content_key(text, model).encode("ascii"))
+    return digest.hexdigest()
+
+
+class EmbeddingStore:
+    def __init__(self, path: str = None):
+        self.path = path or store_path()
+        self._vectors: dict[str, np.ndarray] = {}
+        self._loaded = False
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        with np.load(self.path, allow_pickle=False) as store:
+            keys = store["keys"]
+            vectors = store["vectors"]
+        self._vectors = {str(key): vector for key, vector in zip(keys, vectors)}
+
+    def save(self):
+        if not self._vectors:
+            return
+        keys = np.array(list(self._vectors.keys()))
+        vectors = np.stack(list(self._vectors.values())).astype(np.float32)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Erst in eine temporäre Datei schreiben, damit ein Abbruch den Speicher nicht zerstört
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez(tmp_path, keys=keys, vectors=vectors)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        self._load()
+        return len(self._vectors)
+
+    # Liefert eine (n, d)-Matrix; embed_fn(texts, model) wird nur für fehlende Texte aufgerufen
+    def embed(self, texts, model, embed_fn) -> np.ndarray:
+        self._load()
+        keys = [content_key(text, model) for text in texts]
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self._vectors and key not in missing:
+                missing[key] = text
+
+        METRICS.cache("embedding_store", hits=sum(key not in missing for key in keys),
+                      misses=sum(key in missing for key in keys))
+        if missing:
+            new_vectors = embed_fn(list(missing.values()), model)
+            for key, vector in zip(missing.keys(), new_vectors):
+                self._vectors[key] = np.asarray(vector, dtype=np.float32)
+            self.save()
+
+        return np.stack([self._vectors[key] for key in keys])
+
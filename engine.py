@@ -0,0 +1,266 @@
+import argparse
+import csv
+import json
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ann_index import make_index
+from attribute_scoring import rank_blended, rank_blended_many
+from catalog import MERKMALE, Katalog, load_catalog
+from embedding_ingest import EMBEDDING_MODEL, embed_batched
+from embedding_store import EmbeddingStore, catalog_fingerprint
+from size_index import groesse_aus_text
+
+# Bestimmung ohne Streamlit: Katalog und Embedding-Index laden, Antworten bewerten und ranken.
+# FinFinderV3.py nutzt dieselben Bausteine, die Batch-CLI bewertet ganze Dateien mit Fangmeldungen:
+#   python engine.py fangmeldungen.csv --output ergebnisse.jsonl --workers 4
+BATCH_SIZE = int(os.getenv("FINFINDER_ENGINE_BATCH_SIZE", "256"))
+WORKERS = int(os.getenv("FINFINDER_ENGINE_WORKERS", "4"))
+TOP_K = 3
+
+GROESSE_FELDER = ("Größe (cm)", "Größe", "groesse", "size_cm")
+TEXT_FELDER = ("Beschreibung", "beschreibung", "text")
+
+
+def beschreibung(antworten: dict, groesse=None) -> str:
+    # Freitext aus den Antworten, so wie er auch für das Query-Embedding verwendet wird
+    teile = [f"{merkmal}: {antwort}" for merkmal, antwort in antworten.items()]
+    if groesse is not None:
+        teile.append(f"Größe: {groesse:.0f} cm")
+    return ", ".join(teile)
+
+
+def query_text(observation: dict) -> str:
+    # Antworten und, falls vorhanden, der Freitext der Meldung
+    return ", ".join(teil for teil in (beschreibung(observation["antworten"], observation["groesse"]),
+                                       observation.get("text")) if teil)
+
+
+def _leer(wert) -> bool:
+    return wert is None or (isinstance(wert, float) and math.isnan(wert)) or str(wert).strip() == ""
+
+
+def beobachtung(zeile: dict, merkmale=MERKMALE) -> dict:
+    # Eine Fangmeldung (CSV-Zeile oder JSON-Objekt) -> {"id", "antworten", "groesse", "text"}
+    antworten = zeile.get("antworten") or {m: zeile[m] for m in merkmale if m in zeile and not _leer(zeile[m])}
+    text = next((str(zeile[f]) for f in TEXT_FELDER if f in zeile and not _leer(zeile[f])), None)
+    groesse = next((zeile[f] for f in GROESSE_FELDER if f in zeile and not _leer(zeile[f])), None)
+    if isinstance(groesse, str):
+        groesse = groesse_aus_text(groesse) or groesse_aus_text(f"{groesse} cm")
+    if groesse is None and text:
+        groesse = groesse_aus_text(text)
+    return {
+        "id": zeile.get("id"),
+        "antworten": antworten,
+        "groesse": None if groesse is None else float(groesse),
+        "text": text,
+    }
+
+
+def embedding_index(katalog: Katalog, client, model=EMBEDDING_MODEL, store_path=None):
+    # Nur neue oder geänderte Beschreibungen werden eingebettet, der Rest kommt aus dem Speicher
+    store = EmbeddingStore(store_path) if store_path else EmbeddingStore()
+    texte = list(katalog.beschreibungen)
+    embeddings = store.embed(texte, model, embed_batched(client))
+    # Exakter Scan oder, mit FINFINDER_ANN=1, der gespeicherte IVF-Index
+    return make_index(embeddings, catalog_fingerprint(texte, model))
+
+
+class Engine:
+    def __init__(self, katalog: Katalog, index=None, client=None, model=EMBEDDING_MODEL):
+        # Ohne index/client wird rein strukturell über die Antworten gerankt
+        self.katalog = katalog
+        self.index = index
+        self.client = client
+        self.model = model
+
+    @classmethod
+    def laden(cls, client=None, store_path=None):
+        katalog = Katalog(load_catalog())
+        index = embedding_index(katalog, client, store_path=store_path) if client is not None else None
+        return cls(katalog, index, client)
+
+    def kandidaten_ids(self, groesse=None):
+        # Nach der Größe vorgefilterte Katalogzeilen oder None, wenn nichts (oder alles) ausgeschlossen würde
+        if groesse is None or self.katalog.groessen is None:
+            return None
+        ids = self.katalog.groessen.ids_fuer(groesse)
+        return ids if 0 < len(ids) < len(self.katalog) else None
+
+    def embed(self, texte) -> np.ndarray:
+        response = self.client.embeddings.create(input=list(texte), model=self.model)
+        return np.array([item.embedding for item in sorted(response.data, key=lambda item: item.index)],
+                        dtype=np.float32)
+
+    def rank(self, antworten: dict, query=None, k=TOP_K, ids=None):
+        attribut_scores = self.katalog.scorer.scores(antworten)
+        return rank_blended(self.index, attribut_scores, query if self.index is not None else None, k, ids=ids)
+
+    def _treffer(self, positionen, scores) -> list[dict]:
+        return [
+            {"name": self.katalog.namen[position], "position": int(position), "score": round(float(score), 4)}
+            for position, score in zip(positionen, scores)
+        ]
+
+    def identify(self, antworten: dict, groesse=None, k=TOP_K, query=None) -> list[dict]:
+        return self.identify_many([{"antworten": antworten, "groesse": groesse}], k, [query] if query is not None
+                                  else None)[0]["treffer"]
+
+    def identify_many(self, observations, k=TOP_K, queries=None) -> list[dict]:
+        # Ein Batch: ein Embedding-Request, ein Sparse-Produkt für die Antworten, ein Matrixprodukt für das Ranking
+        observations = [beobachtung(o, self.katalog.merkmale) for o in observations]
+        if not observations:
+            return []
+        if queries is None and self.index is not None and self.client is not None:
+            # Meldungen ohne Antworten und Text werden nicht eingebettet, sondern nur strukturell gerankt
+            texte = [query_text(o) for o in observations]
+            mit_text = [i for i, text in enumerate(texte) if text.strip()]
+            if mit_text:
+                queries = [None] * len(observations)
+                for i, vektor in zip(mit_text, self.embed([texte[i] for i in mit_text])):
+                    queries[i] = vektor
+        attribut_scores = self.katalog.scorer.scores_many([o["antworten"] for o in observations])
+        ids_liste = [self.kandidaten_ids(o["groesse"]) for o in observations]
+
+        positionen, scores = [None] * len(observations), [None] * len(observations)
+        if self.index is None or queries is None:
+            gruppen = [(list(range(len(observations))), None)]
+        else:
+            mit = [i for i in range(len(observations)) if queries[i] is not None]
+            ohne = [i for i in range(len(observations)) if queries[i] is None]
+            gruppen = [(mit, np.stack([queries[i] for i in mit]) if mit else None), (ohne, None)]
+        for zeilen, gruppen_queries in gruppen:
+            if not zeilen:
+                continue
+            gruppen_ids = [ids_liste[i] for i in zeilen]
+            p, s = rank_blended_many(
+                self.index, attribut_scores[zeilen], gruppen_queries, k,
+                ids_liste=gruppen_ids if any(ids is not None for ids in gruppen_ids) else None,
+            )
+            for i, zeile_p, zeile_s in zip(zeilen, p, s):
+                positionen[i], scores[i] = zeile_p, zeile_s
+        return [
+            {"id": o.get("id"), "treffer": self._treffer(p, s)}
+            for o, p, s in zip(observations, positionen, scores)
+        ]
+
+
+def lese_beobachtungen(path, batch_size=BATCH_SIZE):
+    # Liest CSV oder JSONL stückweise, damit auch sehr große Dateien nicht ganz im Speicher liegen
+    if path.endswith(".jsonl") or path.endswith(".json"):
+        batch = []
+        with open(path, encoding="utf-8") as f:
+            for nummer, zeile in enumerate(f):
+                if zeile.strip():
+                    try:
+                        daten = json.loads(zeile)
+                        if not isinstance(daten, dict):
+                            raise ValueError(f"JSON-Objekt erwartet, nicht {type(daten).__name__}")
+                        daten.setdefault("id", nummer)
+                    except ValueError as e:
+                        # Kaputte Zeilen landen als Fehlerzeile in der Ausgabe, statt den Lauf abzubrechen
+                        daten = {"id": nummer, "fehler": repr(e)}
+                    batch.append(daten)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+        return
+    import pandas as pd
+
+    start = 0
+    for chunk in pd.read_csv(path, chunksize=batch_size, dtype=str, keep_default_na=False):
+        zeilen = chunk.to_dict("records")
+        for nummer, zeile in enumerate(zeilen, start):
+            zeile.setdefault("id", nummer)
+        start += len(zeilen)
+        yield zeilen
+
+
+def bestimme_batch(engine: Engine, batch, k=TOP_K) -> list[dict]:
+    # Schlägt der Batch fehl, wird zeilenweise wiederholt, damit nur die fehlerhafte Meldung als Fehlerzeile endet
+    ergebnisse = [None] * len(batch)
+    gueltig = []
+    for i, zeile in enumerate(batch):
+        if "fehler" in zeile:
+            ergebnisse[i] = {"id": zeile.get("id"), "treffer": [], "fehler": zeile["fehler"]}
+        else:
+            gueltig.append(i)
+    try:
+        for i, ergebnis in zip(gueltig, engine.identify_many([batch[i] for i in gueltig], k)):
+            ergebnisse[i] = ergebnis
+    except Exception:
+        for i in gueltig:
+            try:
+                ergebnisse[i] = engine.identify_many([batch[i]], k)[0]
+            except Exception as e:
+                ergebnisse[i] = {"id": batch[i].get("id"), "treffer": [], "fehler": repr(e)}
+    return ergebnisse
+
+
+def schreibe_ergebnisse(f, ergebnisse, csv_format, k):
+    writer = csv.writer(f) if csv_format else None
+    for ergebnis in ergebnisse:
+        if csv_format:
+            felder = [ergebnis["id"]]
+            for rang in range(k):
+                treffer = ergebnis["treffer"][rang] if rang < len(ergebnis["treffer"]) else None
+                felder += [treffer["name"], treffer["score"]] if treffer else ["", ""]
+            writer.writerow(felder + [ergebnis.get("fehler", "")])
+        else:
+            f.write(json.dumps(ergebnis, ensure_ascii=False) + "\n")
+
+
+def identify_file(engine: Engine, path, output, workers=WORKERS, batch_size=BATCH_SIZE, k=TOP_K):
+    # Batches laufen parallel (Embedding-Requests warten auf das Netz, numpy gibt den GIL frei),
+    # geschrieben wird in Eingabereihenfolge und es sind höchstens 2 * workers Batches unterwegs
+    csv_format = output.endswith(".csv")
+    anzahl = 0
+    with open(output, "w", encoding="utf-8", newline="") as f, ThreadPoolExecutor(max_workers=workers) as pool:
+        if csv_format:
+            csv.writer(f).writerow(["id"] + [f"{feld}_{rang}" for rang in range(1, k + 1) for feld in ("name", "score")]
+                                   + ["fehler"])
+        unterwegs = deque()
+        for batch in lese_beobachtungen(path, batch_size):
+            unterwegs.append(pool.submit(bestimme_batch, engine, batch, k))
+            if len(unterwegs) >= 2 * workers:
+                ergebnisse = unterwegs.popleft().result()
+                schreibe_ergebnisse(f, ergebnisse, csv_format, k)
+                anzahl += len(ergebnisse)
+        while unterwegs:
+            ergebnisse = unterwegs.popleft().result()
+            schreibe_ergebnisse(f, ergebnisse, csv_format, k)
+            anzahl += len(ergebnisse)
+    return anzahl
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+
+    from llm_client import embedding_store_path, make_client
+
+    parser = argparse.ArgumentParser(description="Bestimmt alle Fangmeldungen einer CSV- oder JSONL-Datei.")
+    parser.add_argument("input", help="CSV oder JSONL mit den Merkmalen als Spalten bzw. Schlüsseln")
+    parser.add_argument("--output", default="ergebnisse.jsonl", help="JSONL, oder CSV bei Endung .csv")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--ohne-embeddings", action="store_true",
+                        help="Nur strukturell über die Antworten ranken, ohne API-Aufrufe")
+    args = parser.parse_args()
+
+    load_dotenv()
+    start = time.perf_counter()
+    client = None if args.ohne_embeddings else make_client()
+    engine = Engine.laden(client, store_path=embedding_store_path())
+    geladen = time.perf_counter() - start
+    anzahl = identify_file(engine, args.input, args.output, args.workers, args.batch_size, args.k)
+    dauer = time.perf_counter() - start - geladen
+    print(f"✅ {anzahl} Meldungen in {dauer:.1f}s bestimmt ({anzahl / max(dauer, 1e-9):.0f}/s, "
+          f"Laden {geladen:.1f}s) -> '{args.output}'")
@@ -0,0 +1,41 @@
+import queue
+import threading
+
+# Startet mehrere Chat-Completions gleichzeitig und liefert die Tokens, sobald sie ankommen.
+# Die Streamlit-Elemente werden nur im Haupt-Thread aktualisiert, die Worker schreiben in eine Queue.
+_FERTIG = object()
+
+
+def _stream_one(client, index, model, messages, results):
+    try:
+        stream = client.chat.completions.create(model=model, messages=messages, stream=True)
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                results.put((index, chunk.choices[0].delta.content))
+    except Exception as e:
+        results.put((index, e))
+    finally:
+        results.put((index, _FERTIG))
+
+
+def stream_parallel(client, message_lists, model="gpt-4"):
+    # Liefert (index, bisheriger_text) nach jedem neuen Token einer der Antworten
+    results = queue.Queue()
+    threads = [
+        threading.Thread(target=_stream_one, args=(client, index, model, messages, results), daemon=True)
+        for index, messages in enumerate(message_lists)
+    ]
+    for thread in threads:
+        thread.start()
+
+    texte = [""] * len(message_lists)
+    offen = len(message_lists)
+    while offen:
+        index, delta = results.get()
+        if delta is _FERTIG:
+            offen -= 1
+        elif isinstance(delta, Exception):
+            raise delta
+        else:
+            texte[index] += delta
+            yield index, texte[index]
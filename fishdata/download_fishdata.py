@@ -1,37 +1,105 @@
-import requests
+import argparse
+import asyncio
+import json
+import os
+import random
+
+import httpx
 import pandas as pd
 from tqdm import tqdm
 
-# Funktion: Daten aus FishBase REST API holen
-def fetch_data(endpoint, params=None):
-    base_url = "http://fishbase.ropensci.org/"
-    url = f"{base_url}{endpoint}"
-    response = requests.get(url, params=params)
-    if response.status_code == 200:
-        return response.json()["data"]
-    else:
-        print(f"Fehler bei {endpoint}")
-        return []
-
-# Schritt 1: Alle Fische, die in Deutschland vorkommen (Nord- & Ostsee)
-occurrences = fetch_data("occurrence", params={"Country": "Germany"})
-species_list = list({entry["Species"] for entry in occurrences if entry.get("Species")})
-
-print(f"{len(species_list)} Arten in deutschen Gewässern gefunden.")
-
-# Schritt 2: Hole Daten aus verschiedenen Tabellen
-species_data = []
-for sp in tqdm(species_list, desc="Lade FishBase-Daten"):
-    sp_clean = sp.replace(" ", "%20")
-    s_data = fetch_data(f"species/{sp_clean}")
-    m_data = fetch_data(f"morphdat/{sp_clean}")
-    e_data = fetch_data(f"ecology/{sp_clean}")
-    c_data = fetch_data(f"comnames/{sp_clean}")
+BASE_URL = os.getenv("FISHBASE_URL", "http://fishbase.ropensci.org/")
+ENDPOINTS = ["species", "morphdat", "ecology", "comnames"]
+CHECKPOINT_PATH = "fishbase_checkpoint.json"
+OUTPUT_PATH = "nord_ostsee_fische_fishbase.csv"
+
+MAX_CONCURRENCY = 8
+MAX_RETRIES = 5
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class Checkpoint:
+    # Speichert pro Art und Tabelle die Daten samt ETag/Last-Modified,
+    # damit ein erneuter Lauf fertige Arten überspringt und nur Geändertes neu lädt
+    def __init__(self, path=CHECKPOINT_PATH):
+        self.path = path
+        self.records = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.records = json.load(f)
+
+    def get(self, species, endpoint):
+        return self.records.get(species, {}).get(endpoint)
+
+    def put(self, species, endpoint, record):
+        self.records.setdefault(species, {})[endpoint] = record
+
+    def complete(self, species):
+        return all(endpoint in self.records.get(species, {}) for endpoint in ENDPOINTS)
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.records, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+async def fetch_data(client, endpoint, params=None, cached=None):
+    # Daten aus der FishBase REST API holen, mit Wiederholungen und Backoff.
+    # Liefert (record, geändert); bei 304 bleibt der gespeicherte Datensatz gültig, bei Fehlern ist record None.
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    for attempt in range(MAX_RETRIES):
+        try:
+            response = await client.get(endpoint, params=params, headers=headers)
+        except httpx.TransportError:
+            response = None
+        if response is not None and response.status_code == 304 and cached:
+            return cached, False
+        if response is not None and response.status_code == 200:
+            record = {
+                "data": response.json()["data"],
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+            return record, True
+        if response is not None and response.status_code not in RETRY_STATUS:
+            break
+        await asyncio.sleep(min(30, 2 ** attempt) + random.random())
+
+    print(f"Fehler bei {endpoint}")
+    return None, False
+
+
+async def fetch_species(client, semaphore, checkpoint, sp, refresh):
+    if checkpoint.complete(sp) and not refresh:
+        return 0
+    geaendert = 0
+    async with semaphore:
+        requests = [
+            fetch_data(client, f"{endpoint}/{sp}", cached=checkpoint.get(sp, endpoint))
+            for endpoint in ENDPOINTS
+        ]
+        for endpoint, (record, changed) in zip(ENDPOINTS, await asyncio.gather(*requests)):
+            # Fehlgeschlagene Tabellen nicht speichern, damit der nächste Lauf sie erneut versucht
+            if record is not None:
+                checkpoint.put(sp, endpoint, record)
+            geaendert += changed
+    return geaendert
+
+
+def build_row(sp, records):
+    s_data, m_data, e_data, c_data = (records.get(endpoint, {}).get("data", []) for endpoint in ENDPOINTS)
 
     # Deutsche Namen filtern
     german_name = next((c["ComName"] for c in c_data if c["Language"] == "German"), None)
 
-    row = {
+    return {
         "ScientificName": sp,
         "GermanName": german_name,
         "MaxLength": s_data[0]["Length"] if s_data else None,
@@ -39,10 +107,49 @@ for sp in tqdm(species_list, desc="Lade FishBase-Daten"):
         "DorsalFins": m_data[0].get("Dorsalsoft", None) if m_data else None,
         "FeedingType": e_data[0].get("FoodTroph", None) if e_data else None,
         "Environment": s_data[0].get("Fresh", "") + s_data[0].get("Brack", "") + s_data[0].get("Saltwater", "")
+        if s_data else None
     }
-    species_data.append(row)
 
-# Schritt 3: Speichern
-df = pd.DataFrame(species_data)
-df.to_csv("nord_ostsee_fische_fishbase.csv", index=False)
-print("✅ CSV gespeichert als 'nord_ostsee_fische_fishbase.csv'")
+
+async def download(base_url=BASE_URL, checkpoint_path=CHECKPOINT_PATH, concurrency=MAX_CONCURRENCY,
+                   refresh=False, transport=None):
+    # Ein gemeinsamer Client hält die Verbindungen offen, statt für jeden Aufruf neu zu verbinden
+    limits = httpx.Limits(max_connections=concurrency * len(ENDPOINTS), max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30, transport=transport) as client:
+        # Schritt 1: Alle Fische, die in Deutschland vorkommen (Nord- & Ostsee)
+        occurrences, _ = await fetch_data(client, "occurrence", params={"Country": "Germany"})
+        occurrences = occurrences["data"] if occurrences else []
+        species_list = sorted({entry["Species"] for entry in occurrences if entry.get("Species")})
+        print(f"{len(species_list)} Arten in deutschen Gewässern gefunden.")
+
+        # Schritt 2: Hole Daten aus verschiedenen Tabellen, mehrere Arten gleichzeitig
+        checkpoint = Checkpoint(checkpoint_path)
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = [fetch_species(client, semaphore, checkpoint, sp, refresh) for sp in species_list]
+        geaendert = 0
+        for i, task in enumerate(tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Lade FishBase-Daten")):
+            geaendert += await task
+            if i % 50 == 0:
+                checkpoint.save()
+        checkpoint.save()
+        print(f"{geaendert} Datensätze neu geladen.")
+
+    return [build_row(sp, checkpoint.records.get(sp, {})) for sp in species_list]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lädt die Fischdaten für deutsche Gewässer aus FishBase.")
+    parser.add_argument("--base-url", default=BASE_URL, help="z.B. ein lokaler Testserver")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--refresh", action="store_true",
+                        help="Auch fertige Arten prüfen und nur geänderte Datensätze neu laden")
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    args = parser.parse_args()
+
+    species_data = asyncio.run(download(args.base_url, args.checkpoint, args.concurrency, args.refresh))
+
+    # Schritt 3: Speichern
+    df = pd.DataFrame(species_data)
+    df.to_csv(args.output, index=False)
+    print(f"✅ CSV gespeichert als '{args.output}'")
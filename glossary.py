@@ -0,0 +1,49 @@
+import re
+
+# Fachbegriffe einfach erklärt (kann erweitert werden)
+ERKLAERUNGEN = {
+    "bauchständig": "Die Bauchflossen sitzen unter dem Bauch.",
+    "torpedoförmig": "Der Körper ist lang und spindelförmig wie ein Torpedo.",
+    "oberständig": "Das Maul zeigt schräg nach oben.",
+    "unterständig": "Das Maul zeigt nach unten.",
+    "endständig": "Das Maul ist vorne am Kopf und zeigt gerade nach vorne."
+}
+
+# Weitere Begriffe, die in den Optionen des Katalogs vorkommen
+GLOSSAR = {
+    **ERKLAERUNGEN,
+    "Süßwasser": "Flüsse, Bäche, Seen und Teiche – das Wasser schmeckt nicht salzig.",
+    "Salzwasser": "Nord- und Ostsee, also Meerwasser, das salzig schmeckt.",
+    "Raubfisch": "Frisst andere Fische, oft mit großem Maul und spitzen Zähnen.",
+    "Friedfisch": "Frisst Pflanzen, Plankton, Würmer oder Insektenlarven, aber kaum andere Fische.",
+    "Rückenflosse": "Die Flosse oben auf dem Rücken. Manche Fische haben zwei oder drei davon hintereinander.",
+    "Afterflosse": "Die Flosse unten am Bauch zwischen After und Schwanz.",
+    "Schwanzflosse": "Die Flosse ganz hinten am Körper, mit der der Fisch schwimmt.",
+    "stachelig": "Die Flosse wird von harten, spitzen Strahlen gestützt – Vorsicht beim Anfassen.",
+    "Flössel": "Kleine einzelne Flossenzipfel zwischen Rückenflosse und Schwanz, typisch für Makrelen.",
+    "Flossensaum": "Eine lange Flosse, die fast den ganzen Körperrand entlangläuft.",
+    "Querstreifen": "Dunkle Streifen, die vom Rücken senkrecht zum Bauch laufen.",
+    "glasig": "Das Auge wirkt trüb-durchsichtig wie Milchglas und reflektiert Licht.",
+    "eingebettet": "Die Schuppen liegen tief in der Haut und sind kaum zu sehen oder zu fühlen.",
+    "rau": "Streicht man vom Schwanz zum Kopf, fühlt sich die Haut wie Schleifpapier an.",
+    "glatt": "Die Haut fühlt sich in beide Richtungen glatt und schleimig an.",
+    "abfallend": "Die Schuppen lösen sich sehr leicht, z.B. wenn man den Fisch anfasst.",
+    "schuppenlos": "Es sind fast keine Schuppen zu erkennen.",
+    "schlangenförmig": "Sehr lang und dünn, fast wie eine Schlange.",
+    "stromlinienförmig": "Vorne spitz, in der Mitte am dicksten und hinten wieder schmal.",
+    "seitlich abgeflacht": "Von vorne gesehen ist der Fisch schmal, von der Seite hoch.",
+    "asymmetrisch": "Beide Körperseiten sehen unterschiedlich aus, z.B. liegen beide Augen auf einer Seite.",
+}
+
+
+# Nur ganze Wörter (mit Beugungsendung), sonst passt "rau" auch auf "Raubfisch", "grau" oder "braun"
+_MUSTER = {
+    begriff: re.compile(rf"\b{re.escape(begriff)}(?:e|en|er|es|n|s)?\b", re.IGNORECASE)
+    for begriff in GLOSSAR
+}
+
+
+def begriffe_in(optionen):
+    # Alle Glossar-Einträge, deren Begriff in einer der Optionen vorkommt
+    text = " ".join(optionen)
+    return [(begriff, erklaerung) for begriff, erklaerung in GLOSSAR.items() if _MUSTER[begriff].search(text)]
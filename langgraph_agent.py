@@ -1,4 +1,3 @@
-from langchain_openai import ChatOpenAI
 from langchain.schema import SystemMessage, HumanMessage
 from langgraph.graph import StateGraph, START, END
 from typing import TypedDict, Optional
@@ -6,6 +5,8 @@ from typing import TypedDict, Optional
 import os
 from dotenv import load_dotenv
 
+from llm_client import make_chat_model
+
 load_dotenv()
 
 
@@ -54,7 +55,7 @@ class FishState(TypedDict):
     final_result: Optional[str]
 
 # 2. LLM Initialisierung
-llm = ChatOpenAI(model="gpt-4", temperature=0.3)
+llm = make_chat_model(model="gpt-4", temperature=0.3)
 
 # 3. Einzelne Knoten (Steps)
 def ask_environment(state):
@@ -0,0 +1,295 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from embedding_store import store_path
+
+# Austauschbarer Client für Chat und Embeddings. Alle Apps holen sich ihren Client über make_client(),
+# damit Messungen ohne Netzwerk und ohne Kosten möglich sind:
+#   live       echter OpenAI-Client (Standard)
+#   record     echter Client, alle Antworten werden in der Kassette gespeichert
+#   replay     Antworten nur aus der Kassette, mit simulierter Latenz
+#   synthetic  deterministische Antworten und Embeddings ohne Kassette
+LLM_MODE = os.getenv("FINFINDER_LLM_MODE", "live")
+CASSETTE_PATH = os.getenv("FINFINDER_LLM_CASSETTE", "llm_cassette.jsonl")
+# Simulierte Latenz in Sekunden: bis zum ersten Chunk, pro weiterem Chunk und pro Embedding-Request
+LATENZ_ERSTES_TOKEN = float(os.getenv("FINFINDER_LLM_TTFT", "0.0"))
+LATENZ_PRO_CHUNK = float(os.getenv("FINFINDER_LLM_CHUNK_LATENCY", "0.0"))
+LATENZ_EMBEDDING = float(os.getenv("FINFINDER_LLM_EMBED_LATENCY", "0.0"))
+# Zeichen pro Stream-Chunk, OpenAI liefert etwa ein Token (ca. 4 Zeichen) pro Chunk
+CHUNK_ZEICHEN = int(os.getenv("FINFINDER_LLM_CHUNK_CHARS", "4"))
+SYNTHETIC_DIM = int(os.getenv("FINFINDER_LLM_SYNTHETIC_DIM", "1536"))
+SYNTHETIC_STORE_PATH = os.getenv("FINFINDER_SYNTHETIC_EMBEDDING_STORE", "fishdata/embeddings.synthetic.npz")
+
+# Parameter, die die Antwort beeinflussen und deshalb in den Schlüssel gehören
+_SCHLUESSEL_PARAMETER = ("temperature", "max_tokens", "top_p", "response_format")
+
+
+def chat_key(model, messages, **kwargs) -> str:
+    parameter = {name: kwargs[name] for name in _SCHLUESSEL_PARAMETER if kwargs.get(name) is not None}
+    nachrichten = [{"role": m["role"], "content": m["content"]} for m in messages]
+    inhalt = json.dumps(["chat", model, nachrichten, parameter], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(inhalt.encode("utf-8")).hexdigest()
+
+
+def embedding_key(model, text) -> str:
+    # Pro Text statt pro Request, damit eine andere Batchgröße beim Abspielen nicht stört
+    return hashlib.sha256(json.dumps(["embedding", model, text], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _completion(text, model):
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(index=0, message=SimpleNamespace(role="assistant", content=text), finish_reason="stop")],
+    )
+
+
+def _chunk(text, model):
+    return SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=text))])
+
+
+def _embeddings(vektoren, model):
+    return SimpleNamespace(
+        model=model,
+        data=[SimpleNamespace(index=i, embedding=list(map(float, v))) for i, v in enumerate(vektoren)],
+    )
+
+
+class Latenz:
+    def __init__(self, erstes_token=LATENZ_ERSTES_TOKEN, pro_chunk=LATENZ_PRO_CHUNK, embedding=LATENZ_EMBEDDING,
+                 chunk_zeichen=CHUNK_ZEICHEN):
+        self.erstes_token = erstes_token
+        self.pro_chunk = pro_chunk
+        self.embedding = embedding
+        self.chunk_zeichen = max(1, chunk_zeichen)
+
+    def stream(self, text, model):
+        time.sleep(self.erstes_token)
+        for start in range(0, len(text), self.chunk_zeichen):
+            if start:
+                time.sleep(self.pro_chunk)
+            yield _chunk(text[start:start + self.chunk_zeichen], model)
+
+    def antwort(self, text, model, stream):
+        if stream:
+            return self.stream(text, model)
+        # Ohne Stream wartet der Aufrufer auf die ganze Antwort
+        time.sleep(self.erstes_token + self.pro_chunk * max(0, len(text) // self.chunk_zeichen - 1))
+        return _completion(text, model)
+
+
+class Kassette:
+    # Aufgezeichnete Antworten: Schlüssel -> Text bzw. Embedding, auf der Platte als JSONL mit einer Zeile
+    # [schlüssel, wert] je Eintrag. Neue Einträge werden nur angehängt, statt die ganze Datei neu zu schreiben.
+    def __init__(self, path=CASSETTE_PATH):
+        self.path = path
+        self.eintraege = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            self._laden()
+
+    def _laden(self):
+        with open(self.path, encoding="utf-8") as f:
+            inhalt = f.read()
+        if inhalt.lstrip().startswith("{"):
+            # Ältere Kassette als ein JSON-Objekt: einmal ins Zeilenformat umschreiben
+            self.eintraege = json.loads(inhalt)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps([key, wert], ensure_ascii=False) + "\n" for key, wert in self.eintraege.items())
+            os.replace(tmp_path, self.path)
+            return
+        for zeile in inhalt.splitlines():
+            try:
+                key, wert = json.loads(zeile)
+            except ValueError:
+                # Unvollständige letzte Zeile nach einem Abbruch
+                continue
+            self.eintraege[key] = wert
+        if inhalt and not inhalt.endswith("\n"):
+            # Damit der nächste Eintrag nicht an die abgebrochene Zeile angehängt wird
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n")
+
+    def get(self, key):
+        return self.eintraege.get(key)
+
+    def put(self, neue: dict):
+        # Mehrere Einträge auf einmal, damit ein Embedding-Batch nur einmal schreibt
+        with self._lock:
+            neue = {key: wert for key, wert in neue.items() if self.eintraege.get(key) != wert}
+            if not neue:
+                return
+            self.eintraege.update(neue)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps([key, wert], ensure_ascii=False) + "\n" for key, wert in neue.items())
+
+
+def synthetic_text(model, messages) -> str:
+    # Deterministisch aus der letzten Nachricht, gleiche Anfrage ergibt immer den gleichen Text
+    letzte = " ".join(messages[-1]["content"].split()) if messages else ""
+    seed = int(chat_key(model, messages)[:8], 16)
+    return f"OK: Ja\nSynthetische Antwort {seed % 1000:03d} zu: {letzte[:200]}"
+
+
+def synthetic_embedding(text, dim=SYNTHETIC_DIM) -> np.ndarray:
+    # Feature Hashing: jedes Wort trägt einen festen Zufallsvektor bei, ähnliche Texte liegen nah beieinander
+    vektor = np.zeros(dim, dtype=np.float32)
+    for wort in text.lower().split():
+        seed = int.from_bytes(hashlib.sha256(wort.strip(".,:;!?").encode("utf-8")).digest()[:8], "little")
+        vektor += np.random.default_rng(seed).standard_normal(dim, dtype=np.float32)
+    norm = np.linalg.norm(vektor)
+    return vektor / norm if norm else vektor
+
+
+class _Completions:
+    def __init__(self, client):
+        self._client = client
+
+    def create(self, model, messages, stream=False, **kwargs):
+        return self._client._chat(model, messages, stream, **kwargs)
+
+
+class _Embeddings:
+    def __init__(self, client):
+        self._client = client
+
+    def create(self, input, model, **kwargs):
+        texte = [input] if isinstance(input, str) else list(input)
+        return _embeddings(self._client._embed(texte, model), model)
+
+
+class StandInClient:
+    # Gleiche Oberfläche wie openai.Client für chat.completions.create und embeddings.create.
+    # Antworten kommen aus der Kassette (replay), vom echten Client (record) oder werden erzeugt (synthetic).
+    def __init__(self, mode="synthetic", kassette=None, inner=None, latenz=None, fallback_synthetic=False):
+        if mode not in ("record", "replay", "synthetic"):
+            raise ValueError(f"Unbekannter LLM-Modus: {mode}")
+        if mode == "record" and inner is None:
+            raise ValueError("Für record wird ein echter Client benötigt")
+        self.mode = mode
+        self.kassette = kassette if kassette is not None or mode == "synthetic" else Kassette()
+        self.inner = inner
+        self.latenz = latenz or Latenz()
+        self.fallback_synthetic = fallback_synthetic
+        self.chat = SimpleNamespace(completions=_Completions(self))
+        self.embeddings = _Embeddings(self)
+
+    def _chat(self, model, messages, stream, **kwargs):
+        key = chat_key(model, messages, **kwargs)
+        if self.mode == "record":
+            return self._record_chat(key, model, messages, stream, **kwargs)
+        text = self.kassette.get(key) if self.kassette is not None else None
+        if text is None:
+            if self.mode == "replay" and not self.fallback_synthetic:
+                raise LookupError(f"Keine Aufnahme für diese Chat-Anfrage ({model}) in '{self.kassette.path}'")
+            text = synthetic_text(model, messages)
+        return self.latenz.antwort(text, model, stream)
+
+    def _record_chat(self, key, model, messages, stream, **kwargs):
+        response = self.inner.chat.completions.create(model=model, messages=messages, stream=stream, **kwargs)
+        if not stream:
+            self.kassette.put({key: response.choices[0].message.content})
+            return response
+
+        def weiterreichen():
+            # Chunks sofort weitergeben und erst am Ende des Streams speichern
+            teile = []
+            for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    teile.append(chunk.choices[0].delta.content)
+                yield chunk
+            self.kassette.put({key: "".join(teile)})
+
+        return weiterreichen()
+
+    def _embed(self, texte, model):
+        keys = [embedding_key(model, text) for text in texte]
+        if self.mode == "record":
+            response = self.inner.embeddings.create(input=texte, model=model)
+            vektoren = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            self.kassette.put({key: list(map(float, vektor)) for key, vektor in zip(keys, vektoren)})
+            return vektoren
+
+        time.sleep(self.latenz.embedding)
+        vektoren = []
+        for key, text in zip(keys, texte):
+            vektor = self.kassette.get(key) if self.kassette is not None else None
+            if vektor is None:
+                if self.mode == "replay" and not self.fallback_synthetic:
+                    raise LookupError(f"Keine Aufnahme für dieses Embedding ({model}) in '{self.kassette.path}'")
+                vektor = synthetic_embedding(text)
+            vektoren.append(vektor)
+        return vektoren
+
+
+def stream_text(stream):
+    # Nur die Textstücke eines Chat-Streams, für st.write_stream mit echtem wie mit Stand-in-Client
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+def _mode(mode=None):
+    # Erst beim Aufruf lesen, damit auch ein Wert aus der .env (load_dotenv nach dem Import) gilt
+    return mode or os.getenv("FINFINDER_LLM_MODE", LLM_MODE)
+
+
+def make_client(mode=None, api_key=None, **kwargs):
+    mode = _mode(mode)
+    if mode == "live":
+        import openai
+        return openai.Client(api_key=api_key or os.getenv("OPENAI_API_KEY"))
+    inner = None
+    if mode == "record":
+        import openai
+        inner = openai.Client(api_key=api_key or os.getenv("OPENAI_API_KEY"))
+    return StandInClient(mode, inner=inner, **kwargs)
+
+
+def needs_api_key(mode=None) -> bool:
+    return _mode(mode) in ("live", "record")
+
+
+def embedding_model_id(model, mode=None) -> str:
+    # Kennung der Embeddings in abgeleiteten Dateien, synthetische passen nie zu echten
+    return f"synthetic:{model}" if _mode(mode) == "synthetic" else model
+
+
+def embedding_store_path(mode=None):
+    # Synthetische Embeddings dürfen nie im echten Embedding-Speicher landen
+    if _mode(mode) == "synthetic":
+        return os.getenv("FINFINDER_SYNTHETIC_EMBEDDING_STORE", SYNTHETIC_STORE_PATH)
+    return store_path()
+
+
+class _ChatModelAdapter:
+    # Minimaler Ersatz für ChatOpenAI in den LangChain-Prototypen: llm([HumanMessage(...)]).content
+    _ROLLEN = {"human": "user", "ai": "assistant", "system": "system"}
+
+    def __init__(self, client, model, temperature):
+        self.client = client
+        self.model = model
+        self.temperature = temperature
+
+    def invoke(self, messages):
+        nachrichten = [{"role": self._ROLLEN.get(m.type, m.type), "content": m.content} for m in messages]
+        response = self.client.chat.completions.create(
+            model=self.model, messages=nachrichten, temperature=self.temperature
+        )
+        return SimpleNamespace(content=response.choices[0].message.content, type="ai")
+
+    __call__ = invoke
+
+
+def make_chat_model(model="gpt-4", temperature=0.3, mode=None):
+    mode = _mode(mode)
+    if mode == "live":
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(model=model, temperature=temperature)
+    return _ChatModelAdapter(make_client(mode), model, temperature)
@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import numpy as np
+
+from token_count import count_message_tokens, count_tokens
+
+# Messpunkte für Pipeline-Stufen, LLM-/Embedding-Aufrufe und Caches. Die letzten Ereignisse bleiben für das
+# Debug-Panel im Speicher; nur wenn FINFINDER_METRICS_LOG gesetzt ist, wird jedes Ereignis zusätzlich als eine
+# JSON-Zeile in diese Datei geschrieben. Auswertung des Logs: python metrics.py finfinder_metrics.jsonl
+METRICS_LOG = os.getenv("FINFINDER_METRICS_LOG", "")
+LOG_BEISPIEL = "finfinder_metrics.jsonl"
+# Ohne Angabe gilt FINFINDER_METRICS_LOG
+_AUS_ENV = object()
+MAX_EVENTS = int(os.getenv("FINFINDER_METRICS_EVENTS", "2000"))
+
+
+class Metrics:
+    def __init__(self, log_path=_AUS_ENV, max_events=MAX_EVENTS):
+        self._log_path = log_path
+        self.events = deque(maxlen=max_events)
+        self._lock = threading.Lock()
+
+    @property
+    def log_path(self):
+        # Erst beim Schreiben lesen, damit auch ein Wert aus der .env (load_dotenv nach dem Import) gilt
+        if self._log_path is _AUS_ENV:
+            return os.getenv("FINFINDER_METRICS_LOG", METRICS_LOG) or None
+        return self._log_path or None
+
+    def record(self, typ: str, name: str, **felder):
+        event = {"ts": round(time.time(), 3), "type": typ, "name": name, **felder}
+        log_path = self.log_path
+        with self._lock:
+            self.events.append(event)
+            if log_path:
+                with open(log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+        return event
+
+    @contextmanager
+    def stage(self, name: str, **labels):
+        # with METRICS.stage("similarity", session=...): ...
+        start = time.perf_counter()
+        fehler = None
+        try:
+            yield
+        except Exception as e:
+            fehler = repr(e)
+            raise
+        finally:
+            felder = {"seconds": time.perf_counter() - start, **labels}
+            if fehler:
+                felder["error"] = fehler
+            self.record("stage", name, **felder)
+
+    def cache(self, name: str, hits: int = 0, misses: int = 0, **labels):
+        self.record("cache", name, hits=hits, misses=misses, **labels)
+
+    def summary(self, events=None, **labels) -> list[dict]:
+        # Eine Zeile je (Typ, Name, Modell): Anzahl, p50/p99, Tokens und Trefferquote
+        gruppen = {}
+        for event in self.events if events is None else events:
+            if any(event.get(label) != wert for label, wert in labels.items()):
+                continue
+            key = (event["type"], event["name"], event.get("model"))
+            gruppen.setdefault(key, []).append(event)
+
+        zeilen = []
+        for (typ, name, model), gruppe in sorted(gruppen.items(), key=lambda item: tuple(map(str, item[0]))):
+            zeile = {"type": typ, "name": name, "model": model, "count": len(gruppe)}
+            sekunden = [event["seconds"] for event in gruppe if "seconds" in event]
+            if sekunden:
+                zeile["p50_ms"] = float(np.percentile(sekunden, 50) * 1000)
+                zeile["p99_ms"] = float(np.percentile(sekunden, 99) * 1000)
+                zeile["total_s"] = float(sum(sekunden))
+            erste_chunks = [event["ttft_s"] for event in gruppe if event.get("ttft_s") is not None]
+            if erste_chunks:
+                zeile["ttft_p50_ms"] = float(np.percentile(erste_chunks, 50) * 1000)
+            for feld in ("prompt_tokens", "completion_tokens", "tokens"):
+                if any(feld in event for event in gruppe):
+                    zeile[feld] = sum(event.get(feld, 0) for event in gruppe)
+            if typ == "cache":
+                hits = sum(event["hits"] for event in gruppe)
+                misses = sum(event["misses"] for event in gruppe)
+                zeile["hit_rate"] = hits / (hits + misses) if hits + misses else 0.0
+            zeilen.append(zeile)
+        return zeilen
+
+
+METRICS = Metrics()
+
+
+class InstrumentedClient:
+    # Misst jeden Chat- und Embedding-Aufruf eines Clients: Dauer, Zeit bis zum ersten Chunk, Modell, Tokens
+    def __init__(self, client, metrics=METRICS, **labels):
+        self.client = client
+        self.metrics = metrics
+        self.labels = labels
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.embeddings = SimpleNamespace(create=self._embed)
+
+    def _chat(self, model, messages, stream=False, **kwargs):
+        felder = {"model": model, "prompt_tokens": sum(count_message_tokens(m) for m in messages),
+                  "stream": stream, **self.labels}
+        start = time.perf_counter()
+        try:
+            response = self.client.chat.completions.create(model=model, messages=messages, stream=stream, **kwargs)
+        except Exception as e:
+            self.metrics.record("llm", "chat", seconds=time.perf_counter() - start, error=repr(e), **felder)
+            raise
+        if stream:
+            return self._stream(response, start, felder)
+
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            felder["prompt_tokens"] = usage.prompt_tokens
+            felder["completion_tokens"] = usage.completion_tokens
+        else:
+            felder["completion_tokens"] = count_tokens(response.choices[0].message.content or "")
+        self.metrics.record("llm", "chat", seconds=time.perf_counter() - start, **felder)
+        return response
+
+    def _stream(self, response, start, felder):
+        teile = []
+        erstes = None
+        try:
+            for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if erstes is None:
+                        erstes = time.perf_counter() - start
+                    teile.append(chunk.choices[0].delta.content)
+                yield chunk
+        finally:
+            # Auch ein abgebrochener Stream wird erfasst
+            self.metrics.record("llm", "chat", seconds=time.perf_counter() - start, ttft_s=erstes,
+                                completion_tokens=count_tokens("".join(teile)) if teile else 0, **felder)
+
+    def _embed(self, input, model, **kwargs):
+        texte = [input] if isinstance(input, str) else list(input)
+        start = time.perf_counter()
+        response = self.client.embeddings.create(input=input, model=model, **kwargs)
+        self.metrics.record("llm", "embedding", seconds=time.perf_counter() - start, model=model,
+                            texts=len(texte), tokens=sum(count_tokens(text) for text in texte), **self.labels)
+        return response
+
+
+def lade_log(path=LOG_BEISPIEL) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(zeile) for zeile in f if zeile.strip()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fasst das Metrik-Log zusammen (p50/p99 je Stufe und Aufruf).")
+    parser.add_argument("log", nargs="?", default=METRICS_LOG or LOG_BEISPIEL)
+    parser.add_argument("--json", action="store_true", help="Zusammenfassung als JSON ausgeben")
+    args = parser.parse_args()
+
+    zeilen = Metrics(log_path=None).summary(lade_log(args.log))
+    if args.json:
+        print(json.dumps(zeilen, indent=2, ensure_ascii=False))
+    else:
+        for zeile in zeilen:
+            teile = [f"{zeile['type']:<6}", f"{zeile['name']:<28}", f"{zeile['model'] or '-':<24}", f"n={zeile['count']:<5}"]
+            if "p50_ms" in zeile:
+                teile.append(f"p50={zeile['p50_ms']:9.1f}ms p99={zeile['p99_ms']:9.1f}ms")
+            if "ttft_p50_ms" in zeile:
+                teile.append(f"ttft_p50={zeile['ttft_p50_ms']:.1f}ms")
+            if "hit_rate" in zeile:
+                teile.append(f"hit_rate={zeile['hit_rate']:.0%}")
+            for feld in ("prompt_tokens", "completion_tokens", "tokens"):
+                if feld in zeile:
+                    teile.append(f"{feld}={zeile[feld]}")
+            print("  ".join(teile))
@@ -0,0 +1,181 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+
+from attribute_index import AttributIndex
+from catalog import CATALOG_CSV, MERKMALE, load_catalog
+from metrics import METRICS
+from question_planner import naechstes_merkmal
+
+# Vorab generierte Fragen und Hilfetexte je Merkmal und Optionsmenge. Die Apps lesen nur aus dieser Datei
+# und fragen GPT-4 ausschließlich bei Optionsmengen, die noch nicht enthalten sind.
+BANK_PATH = os.getenv("FINFINDER_QUESTION_BANK", "fishdata/question_bank.json")
+BANK_VERSION = 2
+BANK_MODEL = "gpt-4"
+
+NICHT_SICHER = "Ich bin nicht sicher"
+
+
+def bank_key(merkmal: str, optionen) -> str:
+    werte = sorted(option for option in optionen if option != NICHT_SICHER)
+    digest = hashlib.sha1(json.dumps(werte, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+    return f"{merkmal}|{digest}"
+
+
+class QuestionBank:
+    def __init__(self, path: str = BANK_PATH):
+        self.path = path
+        self.fragen = {}
+        self.hilfen = {}
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                bank = json.load(f)
+            # Eine Bank mit altem Format wird ignoriert, bis sie neu gebaut wurde
+            if bank.get("version") == BANK_VERSION:
+                self.fragen = bank["fragen"]
+                self.hilfen = bank["hilfen"]
+
+    def __len__(self):
+        return len(self.fragen) + len(self.hilfen)
+
+    def _lookup(self, eintraege, feld, merkmal, optionen, generate):
+        # generate(merkmal, optionen) ist der LLM-Fallback für fehlende Optionsmengen
+        key = bank_key(merkmal, optionen)
+        eintrag = eintraege.get(key)
+        if eintrag is not None:
+            self.hits += 1
+            METRICS.cache(f"question_bank.{feld}", hits=1, merkmal=merkmal)
+            return eintrag[feld]
+        self.misses += 1
+        METRICS.cache(f"question_bank.{feld}", misses=1, merkmal=merkmal)
+        werte = [option for option in optionen if option != NICHT_SICHER]
+        text = generate(merkmal, werte)
+        eintraege[key] = {"merkmal": merkmal, "optionen": sorted(werte), feld: text}
+        return text
+
+    def frage(self, merkmal: str, optionen, generate) -> str:
+        return self._lookup(self.fragen, "frage", merkmal, optionen, generate)
+
+    def hilfe(self, merkmal: str, optionen, generate) -> str:
+        return self._lookup(self.hilfen, "hilfe", merkmal, optionen, generate)
+
+    def save(self):
+        bank = {
+            "version": BANK_VERSION,
+            "model": BANK_MODEL,
+            "erstellt": datetime.datetime.now().isoformat(timespec="seconds"),
+            "fragen": self.fragen,
+            "hilfen": self.hilfen,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(bank, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def option_sets(df):
+    # Alle Optionsmengen, die in den Apps vorkommen können: V3 fragt immer den ganzen Katalog ab,
+    # V1 grenzt in fester Reihenfolge ein, V2 in der Reihenfolge des question_planner
+    index = AttributIndex(df, MERKMALE)
+    gesehen = set()
+
+    def add(merkmal, werte):
+        key = bank_key(merkmal, werte)
+        if werte and key not in gesehen:
+            gesehen.add(key)
+            yield merkmal, werte
+
+    for merkmal in MERKMALE:
+        yield from add(merkmal, index.optionen(index.alle, merkmal))
+
+    def walk(kandidaten, step):
+        if step >= len(MERKMALE) or index.anzahl(kandidaten) <= 1:
+            return
+        merkmal = MERKMALE[step]
+        werte = index.optionen(kandidaten, merkmal)
+        yield from add(merkmal, werte)
+        for wert in werte:
+            yield from walk(index.filtern(kandidaten, merkmal, wert), step + 1)
+
+    def walk_adaptiv(kandidaten, offen):
+        merkmal = naechstes_merkmal(index, kandidaten, offen)
+        if merkmal is None:
+            return
+        werte = index.optionen(kandidaten, merkmal)
+        yield from add(merkmal, werte)
+        rest = [m for m in offen if m != merkmal]
+        for wert in werte:
+            yield from walk_adaptiv(index.filtern(kandidaten, merkmal, wert), rest)
+
+    yield from walk(index.alle, 0)
+    yield from walk_adaptiv(index.alle, MERKMALE)
+
+
+def frage_mit_llm(client, merkmal, werte):
+    prompt = f"""
+    Du hilfst einem Laien, einen Fisch zu bestimmen. Erkenne das Merkmal \"{merkmal}\".
+    Formuliere eine klare, einfach verständliche Frage dazu und gib die folgenden Optionen als Auswahlmöglichkeiten:
+    {werte}
+    Gib auch eine zusätzliche Auswahl „{NICHT_SICHER}“, damit du Hilfe anbieten kannst.
+    Gib die Frage bitte in einer Zeile zurück.
+    """
+    response = client.chat.completions.create(
+        model=BANK_MODEL,
+        messages=[
+            {"role": "system", "content": "Du bist ein hilfsbereiter Fischbestimmungs-Assistent für Laien in deutschen Gewässern."},
+            {"role": "user", "content": prompt}
+        ]
+    )
+    return response.choices[0].message.content.strip()
+
+
+def hilfe_mit_llm(client, merkmal, werte):
+    prompt = f"""
+    Ein Nutzer ist sich beim Merkmal '{merkmal}' unsicher. Gib eine einfache, interaktive Erklärung,
+    damit er sich anschließend besser entscheiden kann. Nutze Vergleiche, Beispiele und einfache Sprache.
+    Mögliche Optionen: {werte}
+    """
+    response = client.chat.completions.create(
+        model=BANK_MODEL,
+        messages=[
+            {"role": "system",
+             "content": "Du bist ein geduldiger Fisch-Experte, der Anfängern hilft, "
+                        "Fischmerkmale zu verstehen um eine Einordnung des Merkmals passend zu dem "
+                        "Fisch vorzunehmen. Halt dich hierbei kurz und beachte immer, dass es sich um "
+                        "Fische und Gewässer handelt, die in Deutschland auch vorkommen."},
+            {"role": "user", "content": prompt}
+        ]
+    )
+    return response.choices[0].message.content.strip()
+
+
+if __name__ == "__main__":
+    # Fragenbank bauen bzw. ergänzen: python question_bank.py
+    from dotenv import load_dotenv
+
+    from llm_client import make_client
+
+    parser = argparse.ArgumentParser(description="Generiert Fragen und Hilfetexte für alle Merkmale und Optionsmengen.")
+    parser.add_argument("--catalog", default=CATALOG_CSV)
+    parser.add_argument("--rebuild", action="store_true", help="Vorhandene Fragen verwerfen und neu generieren")
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = make_client()
+    bank = QuestionBank()
+    if args.rebuild:
+        bank.fragen = {}
+        bank.hilfen = {}
+
+    df = load_catalog(args.catalog)
+    for merkmal, werte in option_sets(df):
+        bank.frage(merkmal, werte, lambda m, w: frage_mit_llm(client, m, w))
+        # Bei nur einer Option gibt es nichts zu unterscheiden
+        if len(werte) > 1:
+            bank.hilfe(merkmal, werte, lambda m, w: hilfe_mit_llm(client, m, w))
+    bank.save()
+    print(f"✅ {bank.misses} neue Texte generiert, {len(bank.fragen)} Fragen und {len(bank.hilfen)} Hilfen in '{bank.path}'")
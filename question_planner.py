@@ -0,0 +1,73 @@
+import math
+
+from attribute_index import AttributIndex
+from catalog import CATALOG_CSV, MERKMALE, load_catalog
+
+# Adaptive Reihenfolge der Fragen: als Nächstes wird das Merkmal gefragt, das die verbleibenden
+# Kandidaten am besten aufteilt (höchster erwarteter Informationsgewinn). Merkmale, bei denen alle
+# Kandidaten denselben Wert haben, werden übersprungen.
+
+
+def entropie(anzahlen) -> float:
+    gesamt = sum(anzahlen)
+    return -sum(n / gesamt * math.log2(n / gesamt) for n in anzahlen if n)
+
+
+def informationsgewinn(index: AttributIndex, kandidaten: int, merkmal: str) -> float:
+    # Bei gleichverteilten Kandidaten und eindeutigen Antworten entspricht der erwartete
+    # Informationsgewinn der Entropie der Aufteilung nach den Werten des Merkmals
+    return entropie(index.verteilung(kandidaten, merkmal))
+
+
+def naechstes_merkmal(index: AttributIndex, kandidaten: int, offen):
+    if index.anzahl(kandidaten) <= 1:
+        return None
+    gewinne = [(informationsgewinn(index, kandidaten, merkmal), merkmal) for merkmal in offen]
+    gewinne = [(gewinn, merkmal) for gewinn, merkmal in gewinne if gewinn > 0]
+    if not gewinne:
+        return None
+    # Bei Gleichstand gewinnt die Reihenfolge aus MERKMALE
+    return max(gewinne, key=lambda eintrag: (eintrag[0], -offen.index(eintrag[1])))[1]
+
+
+def _aufteilen(index: AttributIndex, kandidaten: int, merkmal: str):
+    gesamt = index.anzahl(kandidaten)
+    rest = kandidaten
+    for wert in index.optionen(kandidaten, merkmal):
+        gruppe = index.filtern(kandidaten, merkmal, wert)
+        rest &= ~gruppe
+        yield index.anzahl(gruppe) / gesamt, gruppe
+    if rest:
+        yield index.anzahl(rest) / gesamt, rest
+
+
+def erwartete_fragen_fest(index: AttributIndex, kandidaten: int, merkmale=MERKMALE) -> float:
+    # Feste Reihenfolge wie bisher: jedes Merkmal wird gefragt, bis nur noch ein Fisch übrig ist
+    if index.anzahl(kandidaten) <= 1 or not merkmale:
+        return 0.0
+    merkmal, rest = merkmale[0], merkmale[1:]
+    return 1 + sum(anteil * erwartete_fragen_fest(index, gruppe, rest)
+                   for anteil, gruppe in _aufteilen(index, kandidaten, merkmal))
+
+
+def erwartete_fragen_adaptiv(index: AttributIndex, kandidaten: int, offen=MERKMALE) -> float:
+    merkmal = naechstes_merkmal(index, kandidaten, list(offen))
+    if merkmal is None:
+        return 0.0
+    rest = [m for m in offen if m != merkmal]
+    return 1 + sum(anteil * erwartete_fragen_adaptiv(index, gruppe, rest)
+                   for anteil, gruppe in _aufteilen(index, kandidaten, merkmal))
+
+
+def ersparnis(index: AttributIndex, merkmale=MERKMALE):
+    # Erwartete Anzahl Fragen (und damit GPT-Aufrufe) fest vs. adaptiv
+    fest = erwartete_fragen_fest(index, index.alle, merkmale)
+    adaptiv = erwartete_fragen_adaptiv(index, index.alle, merkmale)
+    return fest, adaptiv, fest - adaptiv
+
+
+if __name__ == "__main__":
+    index = AttributIndex(load_catalog(CATALOG_CSV), MERKMALE)
+    fest, adaptiv, gespart = ersparnis(index)
+    print(f"{index.anzahl_fische} Fische: im Schnitt {adaptiv:.2f} statt {fest:.2f} Fragen ({gespart:.2f} gespart)")
+    print(f"Erste Frage: {naechstes_merkmal(index, index.alle, MERKMALE)}")
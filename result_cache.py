@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from metrics import METRICS
+from similarity import normalize_rows
+
+# Prozessweiter Cache fertiger Bestimmungen. Gleiche Antworten treffen exakt über den Schlüssel,
+# fast gleiche Beschreibungen über die Kosinus-Ähnlichkeit des Query-Embeddings. Ein Treffer spart
+# Embedding, Ähnlichkeitssuche und die GPT-Erklärungen.
+CACHE_SIZE = int(os.getenv("FINFINDER_RESULT_CACHE_SIZE", "1000"))
+CACHE_TTL = float(os.getenv("FINFINDER_RESULT_CACHE_TTL", "86400"))
+SIMILARITY_THRESHOLD = float(os.getenv("FINFINDER_RESULT_CACHE_THRESHOLD", "0.97"))
+
+
+def answer_key(antworten: dict, groesse=None, version="") -> str:
+    # Reihenfolge, Groß-/Kleinschreibung und Leerzeichen der Antworten spielen keine Rolle
+    normiert = sorted((merkmal, " ".join(str(antwort).lower().split())) for merkmal, antwort in antworten.items())
+    groesse = None if groesse is None else round(float(groesse))
+    inhalt = json.dumps([version, groesse, normiert], ensure_ascii=False)
+    return hashlib.sha256(inhalt.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class Ergebnis:
+    ids: tuple
+    scores: tuple
+    erklaerungen: tuple
+    embedding: Optional[np.ndarray] = None
+    # Nur Ergebnisse derselben Gruppe (z.B. Katalogversion und Kandidatenmenge) gelten als fast gleich
+    gruppe: object = None
+
+
+class ResultCache:
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL, threshold=SIMILARITY_THRESHOLD, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.clock = clock
+        self._eintraege = OrderedDict()
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._naechste_bereinigung = clock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._eintraege)
+
+    def _abgelaufen(self, zeit) -> bool:
+        return self.ttl is not None and self.clock() - zeit > self.ttl
+
+    def _entfernen(self, key):
+        del self._eintraege[key]
+        self._matrix = None
+
+    def _exakt(self, key) -> Optional[Ergebnis]:
+        eintrag = self._eintraege.get(key)
+        if eintrag is None or self._abgelaufen(eintrag[0]):
+            if eintrag is not None:
+                self._entfernen(key)
+            return None
+        self._eintraege.move_to_end(key)
+        return eintrag[1]
+
+    def _aehnlichkeits_matrix(self):
+        # Normierte Embeddings aller Einträge, wird nur nach Änderungen neu aufgebaut
+        if self._matrix is None:
+            keys = [key for key, (_, ergebnis) in self._eintraege.items() if ergebnis.embedding is not None]
+            vektoren = [self._eintraege[key][1].embedding for key in keys]
+            self._matrix = (keys, normalize_rows(np.stack(vektoren)) if vektoren else None)
+        return self._matrix
+
+    def _aehnlich(self, embedding, gruppe) -> Optional[Ergebnis]:
+        keys, matrix = self._aehnlichkeits_matrix()
+        if matrix is None:
+            return None
+        scores = matrix @ normalize_rows(embedding)
+        for position in np.argsort(-scores):
+            if scores[position] < self.threshold:
+                break
+            zeit, ergebnis = self._eintraege[keys[position]]
+            if ergebnis.gruppe == gruppe and not self._abgelaufen(zeit):
+                self._eintraege.move_to_end(keys[position])
+                return ergebnis
+        return None
+
+    def lookup(self, key, embed=None, gruppe=None):
+        # Erst exakt über den Antwortschlüssel, dann über das Embedding; embed() wird nur bei einem
+        # exakten Fehlschlag aufgerufen. Liefert (ergebnis oder None, embedding oder None, art).
+        # Ein fast gleiches Ergebnis (art "aehnlich") stammt von anderen Antworten: Ranking und Erklärungen
+        # gelten erst, wenn der Aufrufer mit den eigenen Antworten dieselben Treffer erhält (siehe uebernehmen).
+        with self._lock:
+            ergebnis = self._exakt(key)
+            if ergebnis is not None:
+                self.hits += 1
+                METRICS.cache("result_cache", hits=1, art="exakt")
+                return ergebnis, ergebnis.embedding, "exakt"
+        embedding = embed() if embed is not None else None
+        if embedding is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+            with self._lock:
+                ergebnis = self._aehnlich(embedding, gruppe)
+                if ergebnis is not None:
+                    self.near_hits += 1
+                    METRICS.cache("result_cache", hits=1, art="aehnlich")
+                    return ergebnis, embedding, "aehnlich"
+        with self._lock:
+            self.misses += 1
+        METRICS.cache("result_cache", misses=1)
+        return None, embedding, None
+
+    def put(self, key, ergebnis: Ergebnis):
+        with self._lock:
+            if key in self._eintraege:
+                self._entfernen(key)
+            self._eintraege[key] = (self.clock(), ergebnis)
+            if self._matrix is not None and ergebnis.embedding is not None:
+                # Neue Zeile anhängen statt die ganze Matrix neu zu normieren
+                keys, matrix = self._matrix
+                zeile = normalize_rows(np.asarray(ergebnis.embedding, dtype=np.float32)[None, :])
+                self._matrix = (keys + [key], zeile if matrix is None else np.vstack((matrix, zeile)))
+            # Abgelaufene Einträge höchstens alle ttl/10 Sekunden suchen, danach die am längsten nicht genutzten
+            if self.ttl is not None and self.clock() >= self._naechste_bereinigung:
+                for alt_key, (zeit, _) in list(self._eintraege.items()):
+                    if self._abgelaufen(zeit):
+                        self._entfernen(alt_key)
+                self._naechste_bereinigung = self.clock() + self.ttl / 10
+            while len(self._eintraege) > self.max_size:
+                self._entfernen(next(iter(self._eintraege)))
+
+    def uebernehmen(self, ergebnis: Ergebnis, ids, scores, embedding=None) -> Optional[Ergebnis]:
+        # Fast gleiches Ergebnis nur übernehmen, wenn das neu berechnete Ranking dieselben Treffer liefert;
+        # die Scores kommen dann aus dem eigenen Ranking. Sonst zählt der Lookup als Fehlschlag.
+        if tuple(int(i) for i in ids) != tuple(ergebnis.ids):
+            with self._lock:
+                self.near_hits -= 1
+                self.misses += 1
+            METRICS.cache("result_cache", hits=-1, misses=1, art="aehnlich_verworfen")
+            return None
+        return Ergebnis(ids=tuple(ergebnis.ids), scores=tuple(float(score) for score in scores),
+                        erklaerungen=ergebnis.erklaerungen,
+                        embedding=ergebnis.embedding if embedding is None else embedding, gruppe=ergebnis.gruppe)
+
+    @property
+    def hit_rate(self) -> float:
+        anfragen = self.hits + self.near_hits + self.misses
+        return (self.hits + self.near_hits) / anfragen if anfragen else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "eintraege": len(self._eintraege),
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
@@ -0,0 +1,48 @@
+import numpy as np
+
+
+def normalize_rows(matrix) -> np.ndarray:
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    # argpartition statt vollständiger Sortierung, nur die k Besten werden danach sortiert
+    k = min(k, scores.shape[-1])
+    if k <= 0:
+        empty = np.empty(scores.shape[:-1] + (0,))
+        return empty.astype(np.intp), empty.astype(np.float32)
+    if k < scores.shape[-1]:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[-1]), scores.shape).copy()
+    candidate_scores = np.take_along_axis(scores, candidates, axis=-1)
+    order = np.argsort(-candidate_scores, axis=-1, kind="stable")
+    indices = np.take_along_axis(candidates, order, axis=-1)
+    return indices, np.take_along_axis(candidate_scores, order, axis=-1)
+
+
+class SimilarityIndex:
+    # Kosinus-Ähnlichkeit über eine zusammenhängende float32-Matrix vorab normierter Embeddings
+    def __init__(self, embeddings, normalized=False):
+        # Bereits normierte Embeddings (z.B. memory-mapped aus dem Katalog) werden nicht kopiert
+        self.matrix = np.asarray(embeddings, dtype=np.float32) if normalized else normalize_rows(embeddings)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def scores(self, query) -> np.ndarray:
+        return self.matrix @ normalize_rows(query)
+
+    def scores_for(self, query, ids) -> np.ndarray:
+        return self.matrix[ids] @ normalize_rows(query)
+
+    def search(self, query, k: int = 3) -> tuple[np.ndarray, np.ndarray]:
+        return top_k(self.scores(query), k)
+
+    def search_many(self, queries, k: int = 3) -> tuple[np.ndarray, np.ndarray]:
+        # Ein Matrixprodukt für alle Anfragen: (m, d) @ (d, n) -> (m, n)
+        scores = normalize_rows(queries) @ self.matrix.T
+        return top_k(scores, k)
@@ -0,0 +1,38 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+from catalog import Katalog
+
+# Kompakter Zustand einer Bestimmung: Kandidaten als Bitset, gegebene Antworten und Schrittzähler.
+# Der Katalog selbst liegt einmal pro Prozess im Speicher und wird hier nie kopiert.
+
+
+@dataclass
+class Sitzung:
+    kandidaten: int
+    antworten: dict = field(default_factory=dict)
+    step: int = 0
+    unsicher: bool = False
+    groesse: Optional[float] = None
+    groesse_gefragt: bool = False
+
+    @classmethod
+    def neu(cls, katalog: Katalog) -> "Sitzung":
+        return cls(kandidaten=katalog.index.alle)
+
+    def beantworten(self, katalog: Katalog, merkmal: str, antwort: str, filtern: bool = True):
+        self.antworten[merkmal] = antwort
+        if filtern:
+            self.kandidaten = katalog.index.filtern(self.kandidaten, merkmal, antwort)
+        self.step += 1
+        self.unsicher = False
+
+    def groesse_angeben(self, katalog: Katalog, groesse: Optional[float]):
+        # Größe in cm oder None für "weiß ich nicht"; grenzt die Kandidaten über den Intervallindex ein
+        self.groesse = groesse
+        self.groesse_gefragt = True
+        if groesse is not None and katalog.groessen is not None:
+            self.kandidaten &= katalog.groessen.bitset(groesse)
+
+    def anzahl(self) -> int:
+        return self.kandidaten.bit_count()
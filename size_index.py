@@ -0,0 +1,44 @@
+import re
+
+import numpy as np
+
+# Intervallindex über die Größenangaben ("40-150" -> [40, 150]). Eine geschätzte Länge schließt
+# alle Fische aus, deren Größenbereich nicht passt, bevor Embeddings oder GPT ins Spiel kommen.
+TOLERANZ = 0.25
+
+_EINHEITEN = {"mm": 0.1, "cm": 1.0, "dm": 10.0, "m": 100.0, "meter": 100.0, "zentimeter": 1.0}
+
+
+def groesse_aus_text(text: str):
+    # Erste Längenangabe aus Freitext in cm, z.B. "etwa 40 cm lang" -> 40.0, "0,5 m" -> 50.0
+    treffer = re.search(r"(\d+(?:[.,]\d+)?)\s*(mm|cm|dm|meter|zentimeter|m)\b", text.lower())
+    if not treffer:
+        return None
+    return float(treffer.group(1).replace(",", ".")) * _EINHEITEN[treffer.group(2)]
+
+
+class GroessenIndex:
+    def __init__(self, minima, maxima):
+        minima = np.asarray(minima, dtype=np.float32)
+        maxima = np.asarray(maxima, dtype=np.float32)
+        self.anzahl_fische = len(minima)
+        bekannt = ~(np.isnan(minima) | np.isnan(maxima))
+        # Fische ohne Größenangabe werden nie ausgeschlossen
+        self.ohne_angabe = np.flatnonzero(~bekannt)
+        ids = np.flatnonzero(bekannt)
+        order = np.argsort(minima[ids], kind="stable")
+        self.ids = ids[order]
+        self.starts = minima[self.ids]
+        self.ends = maxima[self.ids]
+
+    def ids_fuer(self, groesse: float, toleranz: float = TOLERANZ) -> np.ndarray:
+        # Alle Intervalle, die sich mit [groesse*(1-t), groesse*(1+t)] überschneiden
+        von, bis = groesse * (1 - toleranz), groesse * (1 + toleranz)
+        ende = np.searchsorted(self.starts, bis, side="right")
+        passend = self.ids[:ende][self.ends[:ende] >= von]
+        return np.sort(np.concatenate([passend, self.ohne_angabe]))
+
+    def bitset(self, groesse: float, toleranz: float = TOLERANZ) -> int:
+        bits = np.zeros(self.anzahl_fische, dtype=np.uint8)
+        bits[self.ids_fuer(groesse, toleranz)] = 1
+        return int.from_bytes(np.packbits(bits, bitorder="little").tobytes(), "little")
@@ -0,0 +1,404 @@
+import argparse
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from metrics import METRICS
+
+# Spracheingabe als Strom statt fester Aufnahmedauer: das Mikrofon (oder eine WAV-Datei) liefert kurze Frames,
+# eine Sprachaktivitätserkennung (VAD) erkennt Anfang und Ende einer Äußerung, und schon während gesprochen wird,
+# gehen fertige Abschnitte als numpy-Array an Whisper. Nach dem Ende der Äußerung muss nur noch der letzte
+# Abschnitt dekodiert werden. Test mit aufgenommenen Dateien:
+#   python speech_stream.py aufnahme1.wav aufnahme2.wav --backend faster-whisper --model base
+# Das Modell kommt aus dem gemeinsamen Pool in stt_backends.py.
+SAMPLE_RATE = 16000  # Whisper erwartet 16 kHz mono
+FRAME_MS = int(os.getenv("FINFINDER_VAD_FRAME_MS", "30"))
+# Pegel über dem Grundrauschen (dB), ab dem ein Frame als Sprache zählt, und absolute Untergrenze (dBFS)
+VAD_ABSTAND_DB = float(os.getenv("FINFINDER_VAD_MARGIN_DB", "12"))
+VAD_MIN_DBFS = float(os.getenv("FINFINDER_VAD_MIN_DBFS", "-50"))
+# So lange Stille beendet eine Äußerung, kürzere Sprachstücke werden verworfen (ms)
+STILLE_MS = int(os.getenv("FINFINDER_VAD_SILENCE_MS", "600"))
+MIN_SPRACHE_MS = int(os.getenv("FINFINDER_VAD_MIN_SPEECH_MS", "200"))
+# Audio vor dem erkannten Sprachbeginn, damit der erste Laut nicht abgeschnitten wird (ms)
+VORLAUF_MS = int(os.getenv("FINFINDER_VAD_PREROLL_MS", "300"))
+# Ab dieser Länge wird ein Abschnitt schon während des Sprechens transkribiert (s)
+ABSCHNITT_S = float(os.getenv("FINFINDER_STT_CHUNK_S", "4"))
+MAX_AEUSSERUNG_S = float(os.getenv("FINFINDER_STT_MAX_S", "30"))
+
+
+class RingBuffer:
+    # Feste Kapazität, schreibt im Kreis und hält immer die letzten Samples
+    def __init__(self, kapazitaet: int):
+        self.daten = np.zeros(kapazitaet, dtype=np.float32)
+        self.kapazitaet = kapazitaet
+        self.position = 0
+        self.fuellstand = 0
+
+    def __len__(self):
+        return self.fuellstand
+
+    def write(self, samples: np.ndarray):
+        samples = samples[-self.kapazitaet:]
+        ende = self.position + len(samples)
+        if ende <= self.kapazitaet:
+            self.daten[self.position:ende] = samples
+        else:
+            geteilt = self.kapazitaet - self.position
+            self.daten[self.position:] = samples[:geteilt]
+            self.daten[:ende - self.kapazitaet] = samples[geteilt:]
+        self.position = ende % self.kapazitaet
+        self.fuellstand = min(self.kapazitaet, self.fuellstand + len(samples))
+
+    def read(self) -> np.ndarray:
+        # Inhalt in zeitlicher Reihenfolge (Kopie)
+        if self.fuellstand < self.kapazitaet:
+            return self.daten[self.position - self.fuellstand:self.position].copy()
+        return np.concatenate((self.daten[self.position:], self.daten[:self.position]))
+
+    def clear(self):
+        self.position = 0
+        self.fuellstand = 0
+
+
+def pegel_dbfs(frame: np.ndarray) -> float:
+    rms = float(np.sqrt(np.mean(np.square(frame, dtype=np.float64)))) if len(frame) else 0.0
+    return 20 * np.log10(max(rms, 1e-10))
+
+
+class EnergieVAD:
+    # Energie-basierte Erkennung mit mitlaufendem Grundrauschen: Sprache ist, was deutlich lauter als die Stille ist
+    def __init__(self, abstand_db=VAD_ABSTAND_DB, min_dbfs=VAD_MIN_DBFS, anpassung=0.05):
+        self.abstand_db = abstand_db
+        self.min_dbfs = min_dbfs
+        self.anpassung = anpassung
+        self.rauschen = None
+
+    def ist_sprache(self, frame: np.ndarray) -> bool:
+        pegel = pegel_dbfs(frame)
+        if self.rauschen is None:
+            self.rauschen = pegel
+        sprache = pegel > max(self.min_dbfs, self.rauschen + self.abstand_db)
+        if not sprache:
+            # Nur in Pausen nachführen, sonst würde lange Sprache als neues Grundrauschen gelten
+            self.rauschen += self.anpassung * (pegel - self.rauschen)
+        return sprache
+
+
+class StreamingTranscriber:
+    # Nimmt Frames entgegen und liefert je Äußerung {"text", "audio_s", "latenz_s"}.
+    # Abschnitte werden in einem Hintergrund-Thread transkribiert, damit die Aufnahme nicht stockt.
+    # max_gesamt_s begrenzt alles Audio seit der letzten Äußerung, auch die Stille vor dem Sprachbeginn;
+    # danach ist abgelaufen gesetzt und der Aufrufer sollte aufhören (None = unbegrenzt).
+    def __init__(self, transcribe, sample_rate=SAMPLE_RATE, vad=None, stille_ms=STILLE_MS,
+                 min_sprache_ms=MIN_SPRACHE_MS, vorlauf_ms=VORLAUF_MS, abschnitt_s=ABSCHNITT_S,
+                 max_s=MAX_AEUSSERUNG_S, max_gesamt_s=None, bei_teiltext=None):
+        self.transcribe = transcribe
+        self.sample_rate = sample_rate
+        self.vad = vad or EnergieVAD()
+        self.stille_samples = int(stille_ms * sample_rate / 1000)
+        self.min_sprache_samples = int(min_sprache_ms * sample_rate / 1000)
+        self.abschnitt_samples = int(abschnitt_s * sample_rate)
+        self.max_samples = int(max_s * sample_rate)
+        self.max_gesamt_samples = None if max_gesamt_s is None else int(max_gesamt_s * sample_rate)
+        self.abgelaufen = False
+        self.vorlauf = RingBuffer(int(vorlauf_ms * sample_rate / 1000))
+        self.bei_teiltext = bei_teiltext
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="finfinder-stt")
+        self._reset()
+
+    def _reset(self):
+        self.aktiv = False
+        self.empfangen = 0      # Samples seit der letzten Äußerung, mit der Stille davor
+        self.frames = []        # noch nicht abgegebenes Audio der laufenden Äußerung
+        self.pegel = []         # Sprache ja/nein je Frame, für den Schnitt an einer Pause
+        self.offen = 0          # Samples in self.frames
+        self.gesamt = 0         # Samples der ganzen Äußerung
+        self.sprache = 0
+        self.stille = 0         # Samples seit dem letzten Sprach-Frame
+        self.abschnitte = []    # Futures der Abschnitte in Reihenfolge
+        self.texte = []
+
+    def _abgeben(self, audio: np.ndarray):
+        # Abschnitte laufen nacheinander im selben Thread, der vorige Text dient als Prompt für den nächsten
+        def arbeit():
+            text = self.transcribe(audio, " ".join(self.texte) or None)
+            self.texte.append(text)
+            if self.bei_teiltext:
+                self.bei_teiltext(" ".join(t for t in self.texte if t))
+            return text
+
+        self.abschnitte.append(self._pool.submit(arbeit))
+
+    def _abschnitt_schneiden(self):
+        # Möglichst an der letzten Pause schneiden, damit kein Wort zerteilt wird
+        schnitt = len(self.frames)
+        for i in range(len(self.frames) - 1, len(self.frames) // 2, -1):
+            if not self.pegel[i]:
+                schnitt = i + 1
+                break
+        self._abgeben(np.concatenate(self.frames[:schnitt]))
+        self.frames, self.pegel = self.frames[schnitt:], self.pegel[schnitt:]
+        self.offen = sum(len(frame) for frame in self.frames)
+
+    def feed(self, frame: np.ndarray):
+        # Gibt das Ergebnis zurück, sobald eine Äußerung abgeschlossen ist, sonst None
+        frame = np.asarray(frame, dtype=np.float32).reshape(-1)
+        self.abgelaufen = False
+        self.empfangen += len(frame)
+        if self.max_gesamt_samples is not None and self.empfangen >= self.max_gesamt_samples:
+            # Auch ohne erkannte Sprache (stilles Mikrofon, falsche VAD-Schwelle) ist hier Schluss
+            ergebnis = self.beenden() if self.aktiv else None
+            self._reset()
+            self.vorlauf.clear()
+            self.abgelaufen = True
+            return ergebnis
+        sprache = self.vad.ist_sprache(frame)
+        if not self.aktiv:
+            if not sprache:
+                self.vorlauf.write(frame)
+                return None
+            self.aktiv = True
+            if len(self.vorlauf):
+                vorlauf = self.vorlauf.read()
+                self.frames.append(vorlauf)
+                self.pegel.append(False)
+                self.offen = self.gesamt = len(vorlauf)
+            self.vorlauf.clear()
+
+        self.frames.append(frame)
+        self.pegel.append(sprache)
+        self.offen += len(frame)
+        self.gesamt += len(frame)
+        if sprache:
+            self.sprache += len(frame)
+            self.stille = 0
+        else:
+            self.stille += len(frame)
+
+        if self.stille >= self.stille_samples or self.gesamt >= self.max_samples:
+            return self.beenden()
+        if self.offen >= self.abschnitt_samples:
+            self._abschnitt_schneiden()
+        return None
+
+    def beenden(self):
+        # Schließt die laufende Äußerung ab (auch bei Ende des Stroms) und wartet auf den letzten Abschnitt.
+        # Die Latenz zählt ab dem letzten Sprach-Frame: Nachlauf der VAD (in Audiozeit, beim Mikrofon gleich
+        # der Wartezeit) plus das Warten auf Whisper danach.
+        if not self.aktiv:
+            return None
+        ende = time.perf_counter()
+        if self.sprache < self.min_sprache_samples:
+            # Nur ein Knacken oder Räuspern
+            for future in self.abschnitte:
+                future.cancel()
+            self._reset()
+            return None
+        # Die Stille am Ende muss Whisper nicht mehr sehen
+        rest = self.frames[:len(self.frames) - self._stille_frames()] or self.frames
+        if rest:
+            self._abgeben(np.concatenate(rest))
+        for future in self.abschnitte:
+            future.result()
+        dekodieren = time.perf_counter() - ende
+        nachlauf = self.stille / self.sample_rate
+        ergebnis = {
+            "text": " ".join(t for t in self.texte if t),
+            "audio_s": self.gesamt / self.sample_rate,
+            "abschnitte": len(self.abschnitte),
+            "nachlauf_s": nachlauf,
+            "dekodieren_s": dekodieren,
+            "latenz_s": nachlauf + dekodieren,
+        }
+        METRICS.record("stt", "utterance", seconds=ergebnis["latenz_s"], decode_s=dekodieren, audio_s=ergebnis["audio_s"],
+                       chunks=ergebnis["abschnitte"])
+        self._reset()
+        return ergebnis
+
+    def _stille_frames(self) -> int:
+        anzahl = 0
+        for sprache in reversed(self.pegel):
+            if sprache:
+                break
+            anzahl += 1
+        return anzahl
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+def frames_aus_audio(audio: np.ndarray, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS):
+    laenge = int(sample_rate * frame_ms / 1000)
+    for start in range(0, len(audio), laenge):
+        yield audio[start:start + laenge]
+
+
+def lade_wav(path, sample_rate=SAMPLE_RATE) -> np.ndarray:
+    # WAV als float32 mono in der Abtastrate von Whisper
+    import scipy.io.wavfile
+    from scipy.signal import resample_poly
+
+    rate, audio = scipy.io.wavfile.read(path)
+    if audio.dtype == np.uint8:
+        # 8-Bit-WAV ist vorzeichenlos mit Nullpunkt 128
+        audio = (audio.astype(np.float32) - 128) / 128
+    elif np.issubdtype(audio.dtype, np.integer):
+        audio = audio.astype(np.float32) / -np.iinfo(audio.dtype).min
+    audio = audio.astype(np.float32)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    if rate != sample_rate:
+        teiler = np.gcd(rate, sample_rate)
+        audio = resample_poly(audio, sample_rate // teiler, rate // teiler).astype(np.float32)
+    return audio
+
+
+def wav_frames(path, frame_ms=FRAME_MS, echtzeit=False, nachlauf_ms=STILLE_MS):
+    # Aufgenommene Datei als Frame-Strom; mit echtzeit=True im Tempo eines Mikrofons.
+    # Am Ende etwas Stille, damit auch eine bis zum Schluss besprochene Datei eine Äußerung abschließt.
+    audio = np.concatenate((lade_wav(path), np.zeros(int(SAMPLE_RATE * nachlauf_ms / 1000), dtype=np.float32)))
+    dauer = frame_ms / 1000
+    for frame in frames_aus_audio(audio, SAMPLE_RATE, frame_ms):
+        if echtzeit:
+            time.sleep(dauer)
+        yield frame
+
+
+def mikrofon_frames(stop: threading.Event = None, frame_ms=FRAME_MS, device=None):
+    # Frames vom Mikrofon, bis stop gesetzt ist oder der Verbraucher aufhört
+    import sounddevice as sd
+
+    frames = queue.Queue()
+
+    def callback(indata, anzahl, zeit, status):
+        frames.put(indata[:, 0].copy())
+
+    with sd.InputStream(samplerate=SAMPLE_RATE, channels=1, dtype="float32", device=device,
+                        blocksize=int(SAMPLE_RATE * frame_ms / 1000), callback=callback):
+        while stop is None or not stop.is_set():
+            try:
+                yield frames.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+
+def transcribe_stream(frames, transcriber: StreamingTranscriber, eine=False):
+    # Ergebnis je Äußerung; mit eine=True endet der Strom nach der ersten, bei abgelaufener Höchstdauer sofort
+    for frame in frames:
+        ergebnis = transcriber.feed(frame)
+        if ergebnis:
+            yield ergebnis
+            if eine:
+                return
+        if transcriber.abgelaufen:
+            return
+    ergebnis = transcriber.beenden()
+    if ergebnis:
+        yield ergebnis
+
+
+def selbsttest():
+    # Prüft Segmentierung und Latenz an erzeugten WAV-Fixtures (Ton, Pause, Ton) mit einer Attrappe statt Whisper
+    import tempfile
+
+    import scipy.io.wavfile
+
+    rng = np.random.default_rng(0)
+
+    def rauschen(sekunden):
+        return rng.normal(0, 0.002, int(sekunden * SAMPLE_RATE))
+
+    def ton(sekunden):
+        zeit = np.arange(int(sekunden * SAMPLE_RATE)) / SAMPLE_RATE
+        return 0.3 * np.sin(2 * np.pi * 220 * zeit) + rauschen(sekunden)
+
+    audio = np.concatenate((rauschen(0.5), ton(1.5), rauschen(1.0), ton(0.8), rauschen(0.2))).astype(np.float32)
+    abschnitte = []
+
+    def attrappe(clip, prompt=None):
+        abschnitte.append(len(clip) / SAMPLE_RATE)
+        return f"[{len(clip) / SAMPLE_RATE:.1f}s]"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixtures = {
+            "int16": (audio * 32767).astype(np.int16),
+            "uint8": np.round(audio * 127 + 128).astype(np.uint8),
+            "float32": audio,
+        }
+        for name, daten in fixtures.items():
+            path = os.path.join(tmp, f"{name}.wav")
+            scipy.io.wavfile.write(path, SAMPLE_RATE, daten)
+            geladen = lade_wav(path)
+            assert np.abs(geladen - audio).max() < 0.02, f"{name}: Pegel falsch skaliert"
+
+            abschnitte.clear()
+            stt = StreamingTranscriber(attrappe)
+            try:
+                ergebnisse = list(transcribe_stream(wav_frames(path), stt))
+            finally:
+                stt.close()
+            assert len(ergebnisse) == 2, f"{name}: {len(ergebnisse)} statt 2 Äußerungen"
+            # Ton plus Vorlauf, ohne die Stille am Ende
+            assert abs(abschnitte[0] - 1.5 - VORLAUF_MS / 1000) < 0.1, f"{name}: erster Abschnitt {abschnitte[0]:.2f}s"
+            assert abs(abschnitte[1] - 0.8 - VORLAUF_MS / 1000) < 0.1, f"{name}: zweiter Abschnitt {abschnitte[1]:.2f}s"
+            for ergebnis in ergebnisse:
+                assert abs(ergebnis["nachlauf_s"] - STILLE_MS / 1000) < 0.05, f"{name}: Nachlauf {ergebnis['nachlauf_s']:.2f}s"
+                assert ergebnis["latenz_s"] >= ergebnis["nachlauf_s"]
+            latenzen = ", ".join(f"{e['latenz_s'] * 1000:.0f} ms" for e in ergebnisse)
+            print(f"✅ {name}: {' | '.join(e['text'] for e in ergebnisse)}, Latenz {latenzen}")
+
+    # Ohne erkannte Sprache (nur Rauschen, VAD-Schwelle zu hoch) endet der Strom nach der Höchstdauer
+    for name, vad in (("stille", None), ("schwelle", EnergieVAD(min_dbfs=0))):
+        quelle = np.concatenate((rauschen(0.5), ton(4.5))) if vad else rauschen(5.0)
+        frames = frames_aus_audio(quelle.astype(np.float32))
+        gelesen = 0
+
+        def zaehlen():
+            nonlocal gelesen
+            for frame in frames:
+                gelesen += len(frame)
+                yield frame
+
+        stt = StreamingTranscriber(attrappe, vad=vad, max_gesamt_s=2.0)
+        try:
+            ergebnisse = list(transcribe_stream(zaehlen(), stt))
+        finally:
+            stt.close()
+        assert not ergebnisse and stt.abgelaufen, f"{name}: {ergebnisse}"
+        assert abs(gelesen / SAMPLE_RATE - 2.0) < 0.05, f"{name}: {gelesen / SAMPLE_RATE:.2f}s gelesen"
+        print(f"✅ {name}: nach {gelesen / SAMPLE_RATE:.1f}s ohne Sprache beendet")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming-Transkription mit Sprachaktivitätserkennung.")
+    parser.add_argument("wav", nargs="*", help="Aufgenommene WAV-Dateien, ohne Angabe das Mikrofon")
+    parser.add_argument("--backend", help="whisper oder faster-whisper (Standard: FINFINDER_STT_BACKEND)")
+    parser.add_argument("--model", help="Modellgröße: tiny, base, small, medium, large (Standard: FINFINDER_STT_MODEL)")
+    parser.add_argument("--language", help="Sprache der Aufnahmen (Standard: FINFINDER_STT_LANGUAGE, de)")
+    parser.add_argument("--echtzeit", action="store_true", help="Dateien im Tempo eines Mikrofons abspielen")
+    parser.add_argument("--selbsttest", action="store_true", help="VAD und Segmentierung an erzeugten Fixtures prüfen")
+    args = parser.parse_args()
+    if args.selbsttest:
+        selbsttest()
+        raise SystemExit(0)
+
+    from stt_backends import POOL
+
+    POOL.warm(args.backend, args.model, language=args.language)
+    stt = StreamingTranscriber(POOL.transcriber(args.backend, args.model, args.language))
+    quellen = [(path, wav_frames(path, echtzeit=args.echtzeit)) for path in args.wav] or [("mikrofon", mikrofon_frames())]
+    try:
+        for name, frames in quellen:
+            for ergebnis in transcribe_stream(frames, stt):
+                print(f"{name}: {ergebnis['text']}")
+                print(f"   {ergebnis['audio_s']:.1f}s Audio, {ergebnis['abschnitte']} Abschnitte, "
+                      f"Latenz nach Sprechende {ergebnis['latenz_s'] * 1000:.0f} ms "
+                      f"(Nachlauf {ergebnis['nachlauf_s'] * 1000:.0f} ms, Whisper {ergebnis['dekodieren_s'] * 1000:.0f} ms)")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stt.close()
@@ -0,0 +1,197 @@
+import argparse
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+
+# Kaltstart der App: alles, was FinFinderV3.py vor der ersten Seite braucht, kommt aus einer Datei
+# (kompilierter Katalog mit Embeddings) und wird einmal pro Prozess geladen. Mit
+#   python startup.py serve
+# läuft das Aufwärmen schon beim Serverstart statt beim ersten Request. Weitere Befehle:
+#   python startup.py build    Katalog samt Embeddings kompilieren
+#   python startup.py report   Kaltstart in einem frischen Prozess messen
+APP_SCRIPT = "FinFinderV3.py"
+
+# Dauer der einzelnen Startphasen in Sekunden, z.B. für das Debug-Panel
+TIMINGS = {}
+
+_lock = threading.RLock()
+_client = None
+_engine = None
+_bank = None
+
+
+def _timed(name, funktion):
+    from metrics import METRICS
+
+    start = time.perf_counter()
+    with METRICS.stage(f"startup.{name}"):
+        ergebnis = funktion()
+    TIMINGS[name] = time.perf_counter() - start
+    return ergebnis
+
+
+def get_client(api_key=None):
+    global _client
+    with _lock:
+        if _client is None:
+            from llm_client import make_client
+            _client = _timed("client", lambda: make_client(api_key=api_key))
+        return _client
+
+
+def artifact_path():
+    # Erst beim Aufruf lesen, damit "serve --catalog" und die .env gelten
+    from catalog import CATALOG_ARROW
+
+    return os.getenv("FINFINDER_CATALOG", CATALOG_ARROW)
+
+
+def _load_engine(client):
+    from ann_index import make_index
+    from catalog import Katalog, _arrow_aktuell, load_artifact, load_catalog
+    from embedding_ingest import EMBEDDING_MODEL
+    from engine import Engine, embedding_index
+    from llm_client import embedding_model_id, embedding_store_path
+
+    embeddings, meta = None, {}
+    pfad = artifact_path()
+    if _arrow_aktuell(pfad):
+        df, embeddings, meta = _timed("artifact", lambda: load_artifact(pfad))
+    else:
+        df = _timed("catalog_csv", load_catalog)
+    katalog = _timed("katalog", lambda: Katalog(df))
+
+    if embeddings is not None and meta.get("embedding_model") == embedding_model_id(EMBEDDING_MODEL):
+        # Die Embeddings stehen normiert in derselben Datei, kein Embedding-Speicher und kein API-Aufruf
+        index = _timed("index", lambda: make_index(embeddings, meta.get("embedding_fingerprint", ""), normalized=True))
+    else:
+        index = _timed("embeddings", lambda: embedding_index(
+            katalog, client or get_client(), store_path=embedding_store_path()))
+    return Engine(katalog, index)
+
+
+def get_engine(client=None):
+    # Wartet ggf. auf ein laufendes Aufwärmen, statt doppelt zu laden
+    global _engine
+    with _lock:
+        if _engine is None:
+            _engine = _load_engine(client)
+        return _engine
+
+
+def get_question_bank():
+    global _bank
+    with _lock:
+        if _bank is None:
+            from question_bank import QuestionBank
+            _bank = _timed("question_bank", QuestionBank)
+        return _bank
+
+
+def warm_up():
+    start = time.perf_counter()
+    get_client()
+    get_engine()
+    get_question_bank()
+    # Module, die die App erst im Ergebnisschritt braucht
+    _timed("imports", lambda: [importlib.import_module(m) for m in ("explanations", "result_cache", "glossary")])
+    TIMINGS["warm_up"] = time.perf_counter() - start
+
+
+def warm_up_async() -> threading.Thread:
+    thread = threading.Thread(target=warm_up, name="finfinder-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def build(csv_path=None, arrow_path=None):
+    # Katalog kompilieren und die normierten Embeddings aller Beschreibungen mit hineinschreiben
+    from catalog import CATALOG_CSV, compile_catalog, load_catalog
+    from embedding_ingest import EMBEDDING_MODEL, embed_batched
+    from embedding_store import EmbeddingStore, catalog_fingerprint
+    from llm_client import embedding_model_id, embedding_store_path
+    from similarity import normalize_rows
+
+    csv_path = csv_path or CATALOG_CSV
+    arrow_path = arrow_path or artifact_path()
+    texte = load_catalog(csv_path)["Beschreibung"].tolist()
+    embeddings = EmbeddingStore(embedding_store_path()).embed(texte, EMBEDDING_MODEL, embed_batched(get_client()))
+    meta = {
+        "embedding_model": embedding_model_id(EMBEDDING_MODEL),
+        "embedding_fingerprint": catalog_fingerprint(texte, EMBEDDING_MODEL),
+    }
+    return compile_catalog(csv_path, arrow_path, normalize_rows(embeddings), meta)
+
+
+def _kaltstart():
+    # Läuft in einem frischen Prozess: Importzeiten der schweren Module, dann das Aufwärmen
+    importe = {}
+    for modul in ("numpy", "pandas", "pyarrow", "scipy.sparse", "openai", "streamlit"):
+        start = time.perf_counter()
+        try:
+            importlib.import_module(modul)
+            importe[modul] = time.perf_counter() - start
+        except ImportError:
+            importe[modul] = None
+    warm_up()
+    return {"imports": importe, "phases": dict(TIMINGS)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kaltstart von FinFinderV3: Artefakt bauen, aufwärmen, messen.")
+    sub = parser.add_subparsers(dest="befehl", required=True)
+    sub_build = sub.add_parser("build", help="Katalog mit Embeddings kompilieren")
+    sub_build.add_argument("--csv")
+    sub_build.add_argument("--output")
+    sub_serve = sub.add_parser("serve", help="Aufwärmen und die Streamlit-App im selben Prozess starten")
+    sub_serve.add_argument("--catalog", help="Kompilierter Katalog (Standard: FINFINDER_CATALOG)")
+    sub_serve.add_argument("script", nargs="?", default=APP_SCRIPT)
+    sub_serve.add_argument("streamlit_args", nargs=argparse.REMAINDER)
+    sub_report = sub.add_parser("report", help="Kaltstart in einem frischen Prozess messen")
+    sub_report.add_argument("--catalog", help="Kompilierter Katalog (Standard: FINFINDER_CATALOG)")
+    sub_report.add_argument("--output", help="Ergebnis zusätzlich als JSON speichern")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    if getattr(args, "catalog", None):
+        os.environ["FINFINDER_CATALOG"] = args.catalog
+
+    # Dieses Skript läuft als __main__; die App importiert "startup" und muss dieselben Singletons sehen
+    import startup
+
+    if args.befehl == "build":
+        start = time.perf_counter()
+        df = startup.build(args.csv, args.output)
+        print(f"✅ {len(df)} Fische samt Embeddings in {time.perf_counter() - start:.1f}s kompiliert")
+        if args.output and os.path.abspath(args.output) != os.path.abspath(startup.artifact_path()):
+            print(f"   Start damit: FINFINDER_CATALOG={args.output} oder python startup.py serve --catalog {args.output}")
+
+    elif args.befehl == "serve":
+        # Das Aufwärmen läuft parallel zum Start des Servers, der erste Request wartet höchstens auf den Rest
+        startup.warm_up_async()
+        from streamlit.web import cli as stcli
+
+        sys.argv = ["streamlit", "run", args.script, *args.streamlit_args]
+        sys.exit(stcli.main())
+
+    elif args.befehl == "report":
+        from concurrent.futures import ProcessPoolExecutor
+        from multiprocessing import get_context
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+            report = pool.submit(startup._kaltstart).result()
+        report["total"] = time.perf_counter() - start
+        for modul, sekunden in report["imports"].items():
+            print(f"import {modul:<14} {'fehlt' if sekunden is None else f'{sekunden * 1000:8.0f} ms'}")
+        for phase, sekunden in report["phases"].items():
+            print(f"{phase:<21} {sekunden * 1000:8.0f} ms")
+        print(f"{'gesamt (Prozess)':<21} {report['total'] * 1000:8.0f} ms")
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
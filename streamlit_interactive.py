@@ -1,12 +1,13 @@
 # fisch_wizard.py
 import streamlit as st
-from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage
 from dotenv import load_dotenv
 import os
 
+from llm_client import make_chat_model
+
 load_dotenv()
-llm = ChatOpenAI(model="gpt-4", temperature=0.3)
+llm = make_chat_model(model="gpt-4", temperature=0.3)
 
 st.set_page_config(page_title="Fischbestimmung", page_icon="🐟")
 st.title("🐟 Fischbestimmungs-Assistent")
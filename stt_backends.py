@@ -0,0 +1,199 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# Austauschbare Spracherkennung. Alle Backends haben dieselbe Oberfläche:
+#   transcribe(audio, prompt=None) -> str        ein Clip (float32, 16 kHz mono)
+#   transcribe_batch(clips) -> list[str]         mehrere Clips in einem Durchlauf
+#   whisper         Referenzmodell (openai-whisper, PyTorch)
+#   faster-whisper  CTranslate2, auf der CPU int8-quantisiert (pip install faster-whisper)
+# Die geladenen Modelle liegen in einem Pool pro Prozess, den sich alle Sitzungen teilen.
+STT_BACKEND = os.getenv("FINFINDER_STT_BACKEND", "whisper")
+STT_MODEL = os.getenv("FINFINDER_STT_MODEL", "base")
+STT_LANGUAGE = os.getenv("FINFINDER_STT_LANGUAGE", "de")
+COMPUTE_TYPE = os.getenv("FINFINDER_STT_COMPUTE_TYPE", "int8")
+CPU_THREADS = int(os.getenv("FINFINDER_STT_THREADS", "0"))  # 0 = Standard der Bibliothek
+# Modellinstanzen je (Backend, Modell, Sprache): so viele Sitzungen können gleichzeitig transkribieren
+POOL_SIZE = int(os.getenv("FINFINDER_STT_POOL_SIZE", "1"))
+
+SAMPLE_RATE = 16000
+MAX_CLIP_S = 30  # Whisper arbeitet in Fenstern von 30 s
+
+
+class WhisperBackend:
+    name = "whisper"
+
+    def __init__(self, model=STT_MODEL, language=STT_LANGUAGE):
+        import whisper
+
+        self.whisper = whisper
+        self.model_name = model
+        self.language = language
+        self.model = whisper.load_model(model, device="cpu")
+
+    def transcribe(self, audio: np.ndarray, prompt=None) -> str:
+        result = self.model.transcribe(np.asarray(audio, dtype=np.float32), language=self.language, fp16=False,
+                                       initial_prompt=prompt, condition_on_previous_text=False)
+        return result["text"].strip()
+
+    def transcribe_batch(self, clips) -> list[str]:
+        # Clips bis 30 s gehen als ein Batch von Mel-Spektrogrammen durch den Decoder, längere einzeln
+        import torch
+
+        texte = [None] * len(clips)
+        kurz = [i for i, clip in enumerate(clips) if len(clip) <= MAX_CLIP_S * SAMPLE_RATE]
+        if kurz:
+            mel = torch.stack([
+                self.whisper.log_mel_spectrogram(
+                    self.whisper.pad_or_trim(np.asarray(clips[i], dtype=np.float32)), self.model.dims.n_mels
+                )
+                for i in kurz
+            ])
+            optionen = self.whisper.DecodingOptions(language=self.language, fp16=False, without_timestamps=True)
+            for i, result in zip(kurz, self.whisper.decode(self.model, mel, optionen)):
+                texte[i] = result.text.strip()
+        for i, text in enumerate(texte):
+            if text is None:
+                texte[i] = self.transcribe(clips[i])
+        return texte
+
+
+class FasterWhisperBackend:
+    name = "faster-whisper"
+
+    def __init__(self, model=STT_MODEL, language=STT_LANGUAGE, compute_type=COMPUTE_TYPE, cpu_threads=CPU_THREADS):
+        from faster_whisper import WhisperModel
+
+        self.model_name = model
+        self.language = language
+        self.model = WhisperModel(model, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+        try:
+            from faster_whisper import BatchedInferencePipeline
+            self.batched = BatchedInferencePipeline(model=self.model)
+        except ImportError:
+            # Ältere Versionen ohne Batch-Pipeline
+            self.batched = None
+
+    def transcribe(self, audio: np.ndarray, prompt=None) -> str:
+        segmente, _ = self.model.transcribe(np.asarray(audio, dtype=np.float32), language=self.language,
+                                            initial_prompt=prompt, condition_on_previous_text=False,
+                                            beam_size=5, without_timestamps=True)
+        return "".join(segment.text for segment in segmente).strip()
+
+    def transcribe_batch(self, clips) -> list[str]:
+        # Die Clips werden mit etwas Stille dazwischen aneinandergehängt und als feste Abschnitte
+        # (clip_timestamps) gemeinsam dekodiert; die Segmente werden über ihre Startzeit zurück zugeordnet
+        kurz = [i for i, clip in enumerate(clips) if len(clip) <= MAX_CLIP_S * SAMPLE_RATE]
+        texte = [None] * len(clips)
+        if self.batched is not None and len(kurz) > 1:
+            pause = np.zeros(SAMPLE_RATE // 2, dtype=np.float32)
+            teile, grenzen, start = [], [], 0
+            for i in kurz:
+                clip = np.asarray(clips[i], dtype=np.float32)
+                teile += [clip, pause]
+                grenzen.append({"start": start / SAMPLE_RATE, "end": (start + len(clip)) / SAMPLE_RATE})
+                start += len(clip) + len(pause)
+            segmente, _ = self.batched.transcribe(np.concatenate(teile), language=self.language,
+                                                  batch_size=len(kurz), clip_timestamps=grenzen,
+                                                  vad_filter=False, without_timestamps=True)
+            anfaenge = np.array([grenze["start"] for grenze in grenzen])
+            gesammelt = {i: [] for i in kurz}
+            for segment in segmente:
+                position = int(np.searchsorted(anfaenge, segment.start + 1e-3, side="right")) - 1
+                gesammelt[kurz[max(position, 0)]].append(segment.text)
+            for i, teile_text in gesammelt.items():
+                texte[i] = "".join(teile_text).strip()
+        for i, text in enumerate(texte):
+            if text is None:
+                texte[i] = self.transcribe(clips[i])
+        return texte
+
+
+BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+
+def make_backend(name=None, model=None, **kwargs):
+    name = name or os.getenv("FINFINDER_STT_BACKEND", STT_BACKEND)
+    if name not in BACKENDS:
+        raise ValueError(f"Unbekanntes STT-Backend: {name} (verfügbar: {', '.join(BACKENDS)})")
+    return BACKENDS[name](model or os.getenv("FINFINDER_STT_MODEL", STT_MODEL), **kwargs)
+
+
+class ModelPool:
+    # Geladene Modelle je (Backend, Modell, Sprache), bis zu size Instanzen. Eine Sitzung leiht sich eine Instanz
+    # für einen Aufruf; sind alle belegt, wird gewartet statt ein weiteres Modell zu laden.
+    def __init__(self, size=POOL_SIZE, factory=make_backend):
+        self.size = max(1, size)
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._frei = {}
+        self._geladen = {}
+        self.ladezeiten = {}
+
+    def _key(self, name, model, language=None):
+        return (name or os.getenv("FINFINDER_STT_BACKEND", STT_BACKEND), model or os.getenv("FINFINDER_STT_MODEL", STT_MODEL),
+                language or os.getenv("FINFINDER_STT_LANGUAGE", STT_LANGUAGE))
+
+    def _neu(self, key):
+        start = time.perf_counter()
+        name, model, language = key
+        backend = self.factory(name, model, language=language)
+        self.ladezeiten.setdefault(key, []).append(time.perf_counter() - start)
+        return backend
+
+    @contextmanager
+    def model(self, name=None, model=None, language=None):
+        key = self._key(name, model, language)
+        with self._lock:
+            frei = self._frei.setdefault(key, queue.Queue())
+            laden = frei.empty() and self._geladen.get(key, 0) < self.size
+            if laden:
+                # Platz reservieren, geladen wird außerhalb der Sperre
+                self._geladen[key] = self._geladen.get(key, 0) + 1
+        if laden:
+            try:
+                backend = self._neu(key)
+            except Exception:
+                with self._lock:
+                    self._geladen[key] -= 1
+                raise
+        else:
+            backend = frei.get()
+        try:
+            yield backend
+        finally:
+            frei.put(backend)
+
+    def warm(self, name=None, model=None, anzahl=1, language=None):
+        # Lädt Instanzen vorab, z.B. beim Serverstart
+        key = self._key(name, model, language)
+        with self._lock:
+            frei = self._frei.setdefault(key, queue.Queue())
+            anzahl = min(anzahl, self.size - self._geladen.get(key, 0))
+            self._geladen[key] = self._geladen.get(key, 0) + max(0, anzahl)
+        for geladen in range(max(0, anzahl)):
+            try:
+                frei.put(self._neu(key))
+            except Exception:
+                # Reservierte, aber nicht geladene Plätze freigeben, sonst wartet model() ewig
+                with self._lock:
+                    self._geladen[key] -= anzahl - geladen
+                raise
+
+    def transcriber(self, name=None, model=None, language=None):
+        # transcribe(audio, prompt) für speech_stream.StreamingTranscriber, leiht sich das Modell je Abschnitt
+        def transcribe(audio, prompt=None) -> str:
+            with self.model(name, model, language) as backend:
+                return backend.transcribe(audio, prompt)
+
+        return transcribe
+
+
+POOL = ModelPool()
@@ -0,0 +1,138 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import re
+import time
+
+import numpy as np
+
+from benchmark import peak_rss_mb
+from speech_stream import lade_wav
+from stt_backends import SAMPLE_RATE, make_backend
+
+# Echtzeitfaktor (RTF = Rechenzeit / Audiodauer) und Wortfehlerrate (WER) je Backend und Modell auf einem
+# festen Satz deutscher Aufnahmen. Ein Fixture ist eine WAV-Datei mit gleichnamiger .txt-Referenz:
+#   fishdata/stt_fixtures/frage_01.wav, fishdata/stt_fixtures/frage_01.txt
+# Beispiel: python stt_benchmark.py --backends whisper:base faster-whisper:base faster-whisper:small --max-wer 0.15
+FIXTURES = os.getenv("FINFINDER_STT_FIXTURES", "fishdata/stt_fixtures")
+BACKENDS = ["whisper:base", "faster-whisper:base"]
+
+
+def normalisieren(text: str) -> list[str]:
+    # Groß-/Kleinschreibung und Satzzeichen zählen nicht als Fehler
+    return re.sub(r"[^\wäöüß\s-]", " ", text.lower()).replace("-", " ").split()
+
+
+def wer(referenz: str, hypothese: str) -> float:
+    # Levenshtein-Distanz über Wörter, geteilt durch die Zahl der Referenzwörter
+    ref, hyp = normalisieren(referenz), normalisieren(hypothese)
+    if not ref:
+        return float(len(hyp) > 0)
+    zeile = np.arange(len(hyp) + 1)
+    for i, wort in enumerate(ref, 1):
+        vorher = zeile.copy()
+        zeile[0] = i
+        for j in range(1, len(hyp) + 1):
+            zeile[j] = min(vorher[j] + 1, zeile[j - 1] + 1, vorher[j - 1] + (wort != hyp[j - 1]))
+    return float(zeile[-1] / len(ref))
+
+
+def lade_fixtures(verzeichnis=FIXTURES) -> list[dict]:
+    fixtures = []
+    for wav in sorted(glob.glob(os.path.join(verzeichnis, "*.wav"))):
+        txt = os.path.splitext(wav)[0] + ".txt"
+        if not os.path.exists(txt):
+            continue
+        with open(txt, encoding="utf-8") as f:
+            fixtures.append({"name": os.path.basename(wav), "audio": lade_wav(wav), "text": f.read().strip()})
+    return fixtures
+
+
+def run_backend(name: str, model: str, fixtures: list[dict], batch_size: int) -> dict:
+    start = time.perf_counter()
+    backend = make_backend(name, model)
+    ergebnis = {"backend": name, "model": model, "load_s": time.perf_counter() - start}
+    audio_s = sum(len(f["audio"]) for f in fixtures) / SAMPLE_RATE
+
+    # Aufwärmen, damit das erste Fixture nicht die Initialisierung mitbezahlt
+    backend.transcribe(fixtures[0]["audio"])
+
+    start = time.perf_counter()
+    einzeln = [backend.transcribe(f["audio"]) for f in fixtures]
+    einzeln_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = []
+    for i in range(0, len(fixtures), batch_size):
+        batch += backend.transcribe_batch([f["audio"] for f in fixtures[i:i + batch_size]])
+    batch_s = time.perf_counter() - start
+
+    fehler = [wer(f["text"], text) for f, text in zip(fixtures, einzeln)]
+    ergebnis.update({
+        "clips": len(fixtures),
+        "audio_s": audio_s,
+        "rtf": einzeln_s / audio_s,
+        "rtf_batch": batch_s / audio_s,
+        "wer": float(np.mean(fehler)),
+        "wer_batch": float(np.mean([wer(f["text"], text) for f, text in zip(fixtures, batch)])),
+        "peak_rss_mb": peak_rss_mb(),
+        "transcripts": [{"name": f["name"], "text": text, "wer": w} for f, text, w in zip(fixtures, einzeln, fehler)],
+    })
+    return ergebnis
+
+
+def empfehlung(ergebnisse: list[dict], max_wer: float):
+    # Das schnellste Backend, das genau genug ist; einzeln und Batch werden je mit ihrer eigenen WER geprüft
+    passend = [(e[rtf], e) for e in ergebnisse if "rtf" in e
+               for rtf, fehler in (("rtf", "wer"), ("rtf_batch", "wer_batch")) if e[fehler] <= max_wer]
+    return min(passend, key=lambda paar: paar[0])[1] if passend else None
+
+
+if __name__ == "__main__":
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+
+    parser = argparse.ArgumentParser(description="Echtzeitfaktor und Wortfehlerrate der STT-Backends.")
+    parser.add_argument("--fixtures", default=FIXTURES, help="Verzeichnis mit WAV-Dateien und .txt-Referenzen")
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, help="backend:modell, z.B. faster-whisper:small")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--max-wer", type=float, default=0.15, help="Höchste akzeptable Wortfehlerrate")
+    parser.add_argument("--output", default="benchmark_stt.json")
+    args = parser.parse_args()
+
+    fixtures = lade_fixtures(args.fixtures)
+    if not fixtures:
+        raise SystemExit(f"Keine Fixtures (WAV + .txt) in '{args.fixtures}'")
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "fixtures": args.fixtures,
+            "batch_size": args.batch_size,
+        },
+        "results": [],
+    }
+    for angabe in args.backends:
+        name, _, model = angabe.partition(":")
+        # Ein frischer Prozess je Backend, damit Speicher-Peak und Threads nicht ineinanderlaufen
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                lauf = pool.submit(run_backend, name, model or "base", fixtures, args.batch_size).result()
+            print(f"{angabe:<28} RTF {lauf['rtf']:.3f} (Batch {lauf['rtf_batch']:.3f})  "
+                  f"WER {lauf['wer']:.1%}  Laden {lauf['load_s']:.1f}s  Peak {lauf['peak_rss_mb']:.0f} MB")
+        except Exception as e:
+            lauf = {"backend": name, "model": model, "error": repr(e)}
+            print(f"{angabe:<28} Fehler {e!r}")
+        report["results"].append(lauf)
+
+    beste = empfehlung(report["results"], args.max_wer)
+    report["recommendation"] = f"{beste['backend']}:{beste['model']}" if beste else None
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Empfehlung (WER <= {args.max_wer:.0%}): {report['recommendation'] or 'keins'}")
+    print(f"✅ Ergebnis in '{args.output}'")
@@ -1,38 +1,60 @@
 import streamlit as st
-import whisper
-import sounddevice as sd
-import numpy as np
-import tempfile
-import scipy.io.wavfile
+
+from speech_stream import StreamingTranscriber, lade_wav, frames_aus_audio, mikrofon_frames
+from stt_backends import POOL
 
 # Titel
 st.title("🎤 Whisper Speech-to-Text (lokal)")
-st.write("Sprich ins Mikrofon – Whisper transkribiert den Text offline.")
+st.write("Sprich ins Mikrofon – Whisper transkribiert den Text offline, die Aufnahme endet automatisch nach einer Pause.")
 
-# Whisper-Modell laden (cache für Performance)
+# Whisper-Modell einmal pro Prozess laden, alle Sitzungen teilen sich den Pool.
+# Backend und Größe über FINFINDER_STT_BACKEND (whisper, faster-whisper) und FINFINDER_STT_MODEL (tiny, base, small, ...)
 @st.cache_resource
 def load_model():
-    return whisper.load_model("base")  # Alternativen: tiny, small, medium, large
-
-model = load_model()
-
-# Config how long to record
-duration = st.slider("Aufnahmedauer (Sekunden)", 3, 20, 5)
-
+    POOL.warm()
+    return POOL.transcriber()
+
+transcribe = load_model()
+
+# Obergrenze, falls keine Pause erkannt wird
+max_duration = st.slider("Maximale Aufnahmedauer (Sekunden)", 5, 60, 30)
+upload = st.file_uploader("…oder eine WAV-Datei transkribieren", type=["wav"])
+
+def transkribieren(frames):
+    teiltext = {"text": ""}
+    # Die Höchstdauer gilt auch, wenn nie Sprache erkannt wird
+    stt = StreamingTranscriber(transcribe, max_s=max_duration, max_gesamt_s=max_duration,
+                               bei_teiltext=lambda text: teiltext.update(text=text))
+    anzeige = st.empty()
+    ergebnis = None
+    try:
+        # Whisper läuft schon während des Sprechens, hier wird nur der Zwischenstand angezeigt
+        for frame in frames:
+            ergebnis = stt.feed(frame)
+            if ergebnis or stt.abgelaufen:
+                break
+            if teiltext["text"]:
+                anzeige.caption(f"… {teiltext['text']}")
+        ergebnis = ergebnis or stt.beenden()
+    finally:
+        # Schließt auch den Mikrofon-Stream
+        frames.close()
+        stt.close()
+    anzeige.empty()
+    return ergebnis
+
+ergebnis = None
 if st.button("🎙️ Aufnahme starten"):
-    st.info("Aufnahme läuft...")
-    fs = 16000  # Whisper bevorzugt 16 kHz
-    audio = sd.rec(int(duration * fs), samplerate=fs, channels=1, dtype='float32')
-    sd.wait()
-
-    # Save as local temp wave file
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as f:
-        scipy.io.wavfile.write(f.name, fs, (audio * 32767).astype(np.int16))
-        audio_path = f.name
-
-    st.success("✅ Aufnahme abgeschlossen. Transkribiere...")
-
-    # transcribe audio with whisper
-    result = model.transcribe(audio_path, language="de")  # language is optional it will autodetect
+    st.info("Aufnahme läuft... sprich jetzt, nach einer kurzen Pause wird automatisch beendet.")
+    ergebnis = transkribieren(mikrofon_frames())
+    if ergebnis is None:
+        st.warning("Keine Sprache erkannt.")
+elif upload is not None and st.button("📄 Datei transkribieren"):
+    ergebnis = transkribieren(frames_aus_audio(lade_wav(upload)))
+    if ergebnis is None:
+        st.warning("Keine Sprache erkannt.")
+
+if ergebnis:
+    st.success(f"✅ {ergebnis['audio_s']:.1f}s Sprache, Transkript {ergebnis['latenz_s'] * 1000:.0f} ms nach dem Sprechende.")
     st.subheader("📝 Transkribierter Text:")
-    st.text_area("Ergebnis:", result["text"])
+    st.text_area("Ergebnis:", ergebnis["text"])
@@ -1,27 +1,19 @@
-from TTS.api import TTS
-from TTS.utils.manage import ModelManager
-import simpleaudio as sa
-import torch
+import time
 
-# since PyTorch 2-6 wee need to allow pickle import explicit and load the german model
-from TTS.utils.radam import RAdam
-with torch.serialization.safe_globals({RAdam}):
-    tts = TTS(model_name="tts_models/de/thorsten/tacotron2-DDC", progress_bar=False, gpu=False)
+from tts_cache import TTSService
 
+# Modell, Sprecher und Cache-Verzeichnis über FINFINDER_TTS_MODEL, FINFINDER_TTS_SPEAKER und FINFINDER_TTS_CACHE_DIR.
+# Verfügbare Modelle: tts --list_models
+tts = TTSService()
 
-# wave file output path
-output_path = "output.wav"
+text = ("Guten Morgen! Ich bin dein Sprachassistent. "
+        "Ich kann dir Fragen zu den Fischen stellen, und dir das Ergebniss des Agenten ansagen!")
 
-# list all available models
-manager = ModelManager()
-models = manager.list_models()
-for m in models:
-    print(m)
+# Beim ersten Mal wird synthetisiert, danach kommt das Audio aus dem Cache
+for durchlauf in range(2):
+    start = time.perf_counter()
+    wave_obj = tts.play(text)
+    print(f"Durchlauf {durchlauf + 1}: Wiedergabe nach {(time.perf_counter() - start) * 1000:.0f} ms")
+    wave_obj.wait_done()
 
-# convert text to speech
-tts.tts_to_file(text="Guten Morgen! Ich bin dein Sprachassistent. "
-                     "Ich kann dir Fragen zu den Fischen stellen, und dir das Ergebniss des Agenten ansagen!", file_path=output_path)
-
-# play the wavefile
-wave_obj = sa.WaveObject.from_wave_file(output_path)
-wave_obj.play().wait_done()
\ No newline at end of file
+print(tts.cache.stats())
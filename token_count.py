@@ -0,0 +1,36 @@
+import threading
+
+_encoding = None
+_geladen = False
+_lock = threading.Lock()
+
+# Zusätzliche Tokens, die die Chat-API pro Nachricht für Rolle und Trennzeichen berechnet
+TOKENS_PRO_NACHRICHT = 4
+
+
+def _get_encoding():
+    # Erst beim ersten Zählen laden, tiktoken braucht dafür spürbar Zeit (und beim ersten Mal das Netz)
+    # Gleichzeitige Aufrufer warten auf das Laden, statt so lange zu schätzen
+    global _encoding, _geladen
+    if not _geladen:
+        with _lock:
+            if not _geladen:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except ImportError:
+                    _encoding = None
+                _geladen = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # Grobe Schätzung ohne tiktoken: etwa 4 Zeichen pro Token
+    return max(1, len(text) // 4)
+
+
+def count_message_tokens(message) -> int:
+    return count_tokens(message["content"]) + TOKENS_PRO_NACHRICHT
@@ -0,0 +1,239 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import METRICS
+
+# Sprachausgabe mit Cache: synthetisiertes PCM (int16 mono) wird unter einem Hash aus Text, Modell und Sprecher
+# abgelegt, auf der Platte mit Größenlimit (LRU) und die zuletzt gespielten Texte zusätzlich im Speicher.
+# Fragen und Hilfetexte der Apps kommen aus der Fragenbank und können vorab gerendert werden:
+#   python tts_cache.py prerender
+TTS_MODEL = os.getenv("FINFINDER_TTS_MODEL", "tts_models/de/thorsten/tacotron2-DDC")
+TTS_SPEAKER = os.getenv("FINFINDER_TTS_SPEAKER") or None
+CACHE_DIR = os.getenv("FINFINDER_TTS_CACHE_DIR", "fishdata/tts_cache")
+CACHE_MB = float(os.getenv("FINFINDER_TTS_CACHE_MB", "200"))
+HOT_MB = float(os.getenv("FINFINDER_TTS_HOT_MB", "32"))
+
+
+def audio_key(text: str, model=TTS_MODEL, speaker=TTS_SPEAKER) -> str:
+    # Zeilenumbrüche und doppelte Leerzeichen ändern die Aussprache nicht
+    inhalt = json.dumps([" ".join(text.split()), model, speaker], ensure_ascii=False)
+    return hashlib.sha256(inhalt.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    # Zwei Stufen: OrderedDict im Speicher (hot) und je Eintrag eine Datei <key>.npz auf der Platte.
+    # Beide werden nach Bytes begrenzt und verdrängen den am längsten nicht gespielten Eintrag.
+    def __init__(self, verzeichnis=CACHE_DIR, max_bytes=int(CACHE_MB * 1024 * 1024), hot_bytes=int(HOT_MB * 1024 * 1024)):
+        self.verzeichnis = verzeichnis
+        self.max_bytes = max_bytes
+        self.hot_bytes = hot_bytes
+        self._hot = OrderedDict()
+        self._hot_groesse = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        os.makedirs(verzeichnis, exist_ok=True)
+        # Zugriffsreihenfolge der Platte aus der Änderungszeit, die bei jedem Treffer aktualisiert wird
+        dateien = []
+        for eintrag in os.scandir(verzeichnis):
+            if eintrag.name.endswith(".npz"):
+                stat = eintrag.stat()
+                dateien.append((stat.st_mtime, eintrag.name[:-4], stat.st_size))
+        self._disk = OrderedDict((key, groesse) for _, key, groesse in sorted(dateien))
+        self._disk_groesse = sum(self._disk.values())
+
+    def __len__(self):
+        return len(self._disk)
+
+    def __contains__(self, key):
+        return key in self._hot or key in self._disk
+
+    def _pfad(self, key):
+        return os.path.join(self.verzeichnis, f"{key}.npz")
+
+    def _hot_put(self, key, pcm, rate):
+        if pcm.nbytes > self.hot_bytes:
+            return
+        if key in self._hot:
+            self._hot_groesse -= self._hot.pop(key)[0].nbytes
+        self._hot[key] = (pcm, rate)
+        self._hot_groesse += pcm.nbytes
+        while self._hot_groesse > self.hot_bytes:
+            _, (alt, _) = self._hot.popitem(last=False)
+            self._hot_groesse -= alt.nbytes
+
+    def get(self, key):
+        # (pcm, rate) oder None
+        with self._lock:
+            eintrag = self._hot.get(key)
+            if eintrag is not None:
+                self._hot.move_to_end(key)
+                self.hits += 1
+                METRICS.cache("tts.hot", hits=1)
+                return eintrag
+            if key not in self._disk:
+                self.misses += 1
+                METRICS.cache("tts.hot", misses=1)
+                METRICS.cache("tts.disk", misses=1)
+                return None
+            self._disk.move_to_end(key)
+        try:
+            with np.load(self._pfad(key)) as daten:
+                pcm, rate = daten["pcm"], int(daten["rate"])
+            os.utime(self._pfad(key))
+        except (OSError, KeyError, ValueError):
+            # Von außen gelöscht oder unvollständig, wird neu synthetisiert
+            with self._lock:
+                self._disk_groesse -= self._disk.pop(key, 0)
+                self.misses += 1
+            METRICS.cache("tts.disk", misses=1)
+            return None
+        with self._lock:
+            self._hot_put(key, pcm, rate)
+            self.hits += 1
+            self.disk_hits += 1
+        METRICS.cache("tts.hot", misses=1)
+        METRICS.cache("tts.disk", hits=1)
+        return pcm, rate
+
+    def put(self, key, pcm: np.ndarray, rate: int):
+        pcm = np.ascontiguousarray(pcm, dtype=np.int16)
+        pfad = self._pfad(key)
+        tmp_path = f"{pfad}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, pcm=pcm, rate=np.int32(rate))
+        os.replace(tmp_path, pfad)
+        groesse = os.path.getsize(pfad)
+        with self._lock:
+            self._hot_put(key, pcm, rate)
+            self._disk_groesse += groesse - self._disk.pop(key, 0)
+            self._disk[key] = groesse
+            while self._disk_groesse > self.max_bytes and len(self._disk) > 1:
+                alt, alt_groesse = self._disk.popitem(last=False)
+                self._disk_groesse -= alt_groesse
+                self._hot_groesse -= self._hot.pop(alt, (np.empty(0, np.int16), 0))[0].nbytes
+                try:
+                    os.remove(self._pfad(alt))
+                except FileNotFoundError:
+                    pass
+
+    def stats(self) -> dict:
+        anfragen = self.hits + self.misses
+        return {
+            "eintraege": len(self._disk),
+            "disk_mb": self._disk_groesse / (1024 * 1024),
+            "hot_eintraege": len(self._hot),
+            "hot_mb": self._hot_groesse / (1024 * 1024),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / anfragen if anfragen else 0.0,
+        }
+
+
+def load_tts(model=TTS_MODEL):
+    from TTS.api import TTS
+    import torch
+
+    # since PyTorch 2-6 wee need to allow pickle import explicit and load the german model
+    from TTS.utils.radam import RAdam
+    with torch.serialization.safe_globals({RAdam}):
+        return TTS(model_name=model, progress_bar=False, gpu=False)
+
+
+class TTSService:
+    # Das Modell wird erst geladen, wenn ein Text wirklich synthetisiert werden muss
+    def __init__(self, model=TTS_MODEL, speaker=TTS_SPEAKER, cache=None):
+        self.model = model
+        self.speaker = speaker
+        self.cache = cache if cache is not None else AudioCache()
+        self._tts = None
+        # Das TTS-Modell ist nicht für parallele Aufrufe gedacht
+        self._lock = threading.Lock()
+
+    @property
+    def tts(self):
+        with self._lock:
+            if self._tts is None:
+                self._tts = load_tts(self.model)
+            return self._tts
+
+    def _synthesize(self, text):
+        tts = self.tts
+        with self._lock, METRICS.stage("tts.synthesize", model=self.model, chars=len(text)):
+            wav = tts.tts(text=text, speaker=self.speaker)
+        rate = tts.synthesizer.output_sample_rate
+        pcm = (np.clip(np.asarray(wav, dtype=np.float32), -1.0, 1.0) * 32767).astype(np.int16)
+        return pcm, rate
+
+    def synthesize(self, text: str):
+        # (pcm int16, rate), aus dem Cache oder neu synthetisiert
+        key = audio_key(text, self.model, self.speaker)
+        eintrag = self.cache.get(key)
+        if eintrag is None:
+            eintrag = self._synthesize(text)
+            self.cache.put(key, *eintrag)
+        return eintrag
+
+    def play(self, text: str):
+        # Spielt direkt aus dem Speicher, ohne Umweg über eine WAV-Datei; gibt das PlayObject zurück
+        import simpleaudio as sa
+
+        pcm, rate = self.synthesize(text)
+        return sa.play_buffer(pcm.tobytes(), 1, 2, rate)
+
+    def prerender(self, texte, fortschritt=None) -> int:
+        # Synthetisiert alle noch fehlenden Texte, gibt deren Anzahl zurück
+        neu = 0
+        for text in dict.fromkeys(" ".join(text.split()) for text in texte if text and text.strip()):
+            if audio_key(text, self.model, self.speaker) in self.cache:
+                continue
+            self.synthesize(text)
+            neu += 1
+            if fortschritt:
+                fortschritt(neu, text)
+        return neu
+
+
+def bank_texte(bank=None) -> list[str]:
+    # Alle Fragen und Hilfetexte der Fragenbank
+    if bank is None:
+        from question_bank import QuestionBank
+        bank = QuestionBank()
+    return [eintrag["frage"] for eintrag in bank.fragen.values()] + [eintrag["hilfe"] for eintrag in bank.hilfen.values()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sprachausgabe mit Cache für die Texte der Apps.")
+    sub = parser.add_subparsers(dest="befehl", required=True)
+    sub_prerender = sub.add_parser("prerender", help="Alle Fragen und Hilfetexte der Fragenbank vorab synthetisieren")
+    sub_prerender.add_argument("--bank", help="Pfad der Fragenbank (Standard: FINFINDER_QUESTION_BANK)")
+    sub_say = sub.add_parser("say", help="Einen Text sprechen")
+    sub_say.add_argument("text")
+    sub.add_parser("stats", help="Größe des Caches")
+    args = parser.parse_args()
+
+    service = TTSService()
+    if args.befehl == "prerender":
+        from question_bank import QuestionBank
+
+        texte = bank_texte(QuestionBank(args.bank) if args.bank else None)
+        start = time.perf_counter()
+        neu = service.prerender(texte, lambda anzahl, text: print(f"{anzahl:4d} {text[:70]}"))
+        print(f"✅ {neu} von {len(set(texte))} Texten neu synthetisiert in {time.perf_counter() - start:.1f}s, "
+              f"Cache {service.cache.stats()['disk_mb']:.1f} MB in '{service.cache.verzeichnis}'")
+    elif args.befehl == "say":
+        start = time.perf_counter()
+        wiedergabe = service.play(args.text)
+        print(f"Wiedergabe nach {(time.perf_counter() - start) * 1000:.0f} ms")
+        wiedergabe.wait_done()
+    else:
+        print(json.dumps(service.cache.stats(), indent=2))